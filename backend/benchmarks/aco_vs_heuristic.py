@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+蚁群求解器与默认求解器对比（无需数据库）
+在 res/road_modified.csv 路网上随机选取起终点，分别以两种求解器规划模式1、2，输出优化比值与耗时（JSON）
+
+用法：
+    python benchmarks/aco_vs_heuristic.py --pairs 10 --seconds 5 --processes 0
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from routes.ant_colony import AntColonyConfig
+from routes.graph_engine import RoadGraph
+from routes.routeplanning import JoggingPathPlanner, RouteParams, ConstraintMode
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'res', 'road_modified.csv')
+
+
+def solve_heuristic(planner: JoggingPathPlanner, start_node: int, end_node: int, params: RouteParams) -> float:
+    """默认求解器：双源搜索 -> 筛选有效节点 -> 指标与比值，返回最优比值（无解时为nan）"""
+    search = planner.search_endpoints(start_node, end_node, params.constraint_mode, params.preference_mode)
+    min_value, max_value = planner.get_constraint_bounds(params)
+    valid_nodes = planner._filter_valid_nodes_in_memory(start_node, end_node, params.constraint_mode,
+                                                         min_value, max_value, search)
+    if not valid_nodes:
+        return float('nan')
+    metrics = planner.calculate_path_metrics(start_node, end_node, valid_nodes, params, search=search)
+    return metrics.best()['ratio'] if len(metrics) else float('nan')
+
+
+def make_params(graph: RoadGraph, start: int, end: int, mode: ConstraintMode) -> RouteParams:
+    """目标值取起终点间最短距离（或最少路段数）的1.5倍（不经搜索树缓存，避免影响计时）"""
+    if mode == ConstraintMode.DISTANCE_WITH_END:
+        shortest = float(graph.dijkstra(start, graph.edge_column('dis_ori')).dist[end])
+        return RouteParams(start_lat=0, start_lon=0, end_lat=0, end_lon=0, constraint_mode=mode,
+                           target_distance=1.5 * shortest, distance_tolerance=400)
+    shortest = float(graph.bfs(start).dist[end])
+    return RouteParams(start_lat=0, start_lon=0, end_lat=0, end_lon=0, constraint_mode=mode,
+                       target_segments=int(1.5 * shortest), segments_tolerance=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--pairs', type=int, default=10, help='每种模式的起终点对数')
+    parser.add_argument('--seconds', type=float, default=5.0, help='蚁群算法每次求解的时间预算')
+    parser.add_argument('--iterations', type=int, default=80)
+    parser.add_argument('--ants', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    graph = RoadGraph.from_csv(args.csv)
+    planner = JoggingPathPlanner('memory')
+    planner.graph = graph
+    planner.snapper = graph.snapper
+    rng = np.random.default_rng(args.seed)
+
+    results = []
+    for mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END]:
+        done = 0
+        while done < args.pairs:
+            start, end = rng.choice(graph.num_nodes, 2, replace=False)
+            if not np.isfinite(graph.bfs(int(start)).dist[end]):
+                continue
+            done += 1
+            start_node, end_node = int(graph.node_ids[start]), int(graph.node_ids[end])
+            params = make_params(graph, int(start), int(end), mode)
+
+            started = time.perf_counter()
+            heuristic_ratio = solve_heuristic(planner, start_node, end_node, params)
+            heuristic_seconds = time.perf_counter() - started
+
+            config = AntColonyConfig(num_ants=args.ants, max_iter=args.iterations, max_seconds=args.seconds,
+                                     processes=args.processes, seed=int(rng.integers(2 ** 31)))
+            started = time.perf_counter()
+            try:
+                metric, _ = planner.solve_ant_colony(start_node, end_node, params, config)
+                aco_ratio = metric['ratio']
+            except ValueError:
+                aco_ratio = float('nan')
+            aco_seconds = time.perf_counter() - started
+
+            results.append({
+                'constraint_mode': mode.value,
+                'start_node': start_node,
+                'end_node': end_node,
+                'heuristic_ratio': heuristic_ratio,
+                'heuristic_seconds': heuristic_seconds,
+                'aco_ratio': aco_ratio,
+                'aco_seconds': aco_seconds
+            })
+
+    summary = {}
+    for mode in [1, 2]:
+        rows = [r for r in results if r['constraint_mode'] == mode]
+        both = [r for r in rows if np.isfinite(r['heuristic_ratio']) and np.isfinite(r['aco_ratio'])]
+        summary[f'mode_{mode}'] = {
+            'pairs': len(rows),
+            'heuristic_solved': int(sum(np.isfinite(r['heuristic_ratio']) for r in rows)),
+            'aco_solved': int(sum(np.isfinite(r['aco_ratio']) for r in rows)),
+            'aco_better': sum(r['aco_ratio'] > r['heuristic_ratio'] for r in both),
+            'mean_ratio_gain': float(np.mean([r['aco_ratio'] / r['heuristic_ratio'] - 1 for r in both])) if both else None,
+            'heuristic_seconds_p50': float(np.median([r['heuristic_seconds'] for r in rows])),
+            'aco_seconds_p50': float(np.median([r['aco_seconds'] for r in rows]))
+        }
+    print(json.dumps({'summary': summary, 'runs': results}, indent=2, default=float))
+
+
+if __name__ == '__main__':
+    main()
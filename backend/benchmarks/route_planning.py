@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+路径规划基准测试（无需数据库）
+在合成网格/随机几何图路网（见synthetic_network.py）与 res/road_modified.csv 上，按引擎逐一计时
+全部 约束模式 × 偏好模式 组合，输出每种组合的p50/p95延迟与单次规划的峰值内存（JSON），便于跟踪性能回退
+
+引擎：
+    memory     内存引擎（模式5、6使用A*）
+    memory-ch  内存引擎，模式5、6使用进程内构建的收缩层次（只计时模式5、6，构建耗时单独记录）
+    database   数据库引擎，只在 --database 时对数据库中的edgesmodified计时
+
+用法：
+    python benchmarks/route_planning.py --sizes 1000,10000,100000,500000 --queries 5 --out bench.json
+    python benchmarks/route_planning.py --networks csv --engines memory,memory-ch
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import json
+import logging
+import platform
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不记录进程峰值内存
+    resource = None
+
+from routes import routeplanning
+from routes.contraction import CONTRACTION_KINDS, ContractionHierarchy
+from routes.edge_store import EdgeAttributeStore
+from routes.graph_engine import RoadGraph, TreeCache
+from routes.routeplanning import JoggingPathPlanner, RouteParams, ConstraintMode, PreferenceMode, route_cache
+from synthetic_network import NETWORK_KINDS, SyntheticNetwork, generate_network
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'res', 'road_modified.csv')
+
+ENGINES = ['memory', 'memory-ch', 'database']
+POINT_TO_POINT_MODES = [ConstraintMode.SHORTEST_PATH, ConstraintMode.MIN_SEGMENTS_PATH]
+
+
+def sample_pairs(graph: RoadGraph, count: int, rng: np.random.Generator) -> List[Tuple[int, int, float, float]]:
+    """随机选取连通的起终点（节点下标），并给出两者间的最短距离与最少路段数（不经搜索树缓存）"""
+    pairs = []
+    while len(pairs) < count:
+        start = int(rng.integers(graph.num_nodes))
+        hops = graph.bfs(start).dist
+        candidates = np.flatnonzero(np.isfinite(hops) & (hops >= 2))
+        if not candidates.size:
+            continue
+        end = int(rng.choice(candidates))
+        distance = float(graph.dijkstra(start, graph.edge_column('dis_ori')).dist[end])
+        pairs.append((start, end, distance, float(hops[end])))
+    return pairs
+
+
+def make_params(graph: RoadGraph, pair: Tuple[int, int, float, float], constraint_mode: ConstraintMode,
+                preference_mode: PreferenceMode) -> RouteParams:
+    """目标距离/路段数取起终点间最短值的1.5倍（环线取2倍），容差为目标值的15%"""
+    start, end, distance, hops = pair
+    scale = 2.0 if constraint_mode == ConstraintMode.LOOP else 1.5
+    target_distance = scale * distance
+    target_segments = int(scale * hops) + 1
+    return RouteParams(
+        start_lat=float(graph.node_y[start]), start_lon=float(graph.node_x[start]),
+        end_lat=float(graph.node_y[end]), end_lon=float(graph.node_x[end]),
+        constraint_mode=constraint_mode, preference_mode=preference_mode,
+        target_distance=target_distance, distance_tolerance=max(200.0, 0.15 * target_distance),
+        target_segments=target_segments, segments_tolerance=max(2, int(0.15 * target_segments))
+    )
+
+
+def make_planner(network: SyntheticNetwork, engine: str) -> JoggingPathPlanner:
+    """按引擎准备规划器；内存引擎直接使用给定路网与路段属性"""
+    if engine == 'database':
+        planner = JoggingPathPlanner('database')
+        planner.connect()
+        return planner
+    planner = JoggingPathPlanner('memory')
+    planner.graph = network.graph
+    planner.snapper = network.graph.snapper
+    planner.edge_store = network.edge_store
+    return planner
+
+
+def build_hierarchies(graph: RoadGraph) -> Dict[str, float]:
+    """在进程内为各代价类型构建收缩层次（不写文件），返回各类型耗时（秒）"""
+    timings = {}
+    for kind in CONTRACTION_KINDS:
+        started = time.perf_counter()
+        graph.hierarchies[kind] = ContractionHierarchy.build(graph.num_nodes, graph.edge_source, graph.edge_target,
+                                                             graph.contraction_weights(kind))
+        timings[kind] = time.perf_counter() - started
+    return timings
+
+
+def time_combination(planner: JoggingPathPlanner, params_list: List[RouteParams]) -> Dict:
+    """逐条规划并计时（冷搜索树缓存），再单独测量一次规划的峰值内存"""
+    graph = planner.graph
+    if graph is not None:
+        graph.tree_cache = TreeCache(graph.tree_cache.max_bytes)
+
+    latencies, failures, error = [], 0, None
+    for params in params_list:
+        started = time.perf_counter()
+        try:
+            planner.plan_route(params)
+        except ValueError as e:   # 约束内无解等
+            failures += 1
+            error = str(e)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    if graph is not None:
+        graph.tree_cache = TreeCache(graph.tree_cache.max_bytes)
+    tracemalloc.start()
+    try:
+        planner.plan_route(params_list[0])
+    except ValueError:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'queries': len(latencies),
+        'failures': failures,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'mean_ms': float(np.mean(latencies)),
+        'peak_memory_mb': peak / 1024 / 1024
+    }
+    if error is not None:
+        result['last_error'] = error
+    return result
+
+
+def run_network(network: SyntheticNetwork, engines: List[str], constraint_modes: List[ConstraintMode],
+                preference_modes: List[PreferenceMode], queries: int, rng: np.random.Generator) -> Dict:
+    """在一个路网上计时全部 引擎 × 约束模式 × 偏好模式 组合"""
+    graph = network.graph
+    pairs = sample_pairs(graph, queries, rng)
+    report = {'network': network.name, 'nodes': graph.num_nodes, 'edges': graph.num_edges, 'results': []}
+
+    for engine in engines:
+        if engine == 'database' and network.name != 'edgesmodified':
+            continue
+        modes = constraint_modes
+        # 内存引擎不读取预处理文件，模式5、6固定使用A*；memory-ch只比较模式5、6
+        graph.hierarchies = {kind: None for kind in CONTRACTION_KINDS}
+        if engine == 'memory-ch':
+            modes = [mode for mode in constraint_modes if mode in POINT_TO_POINT_MODES]
+            if not modes:
+                continue
+            report['contraction_seconds'] = build_hierarchies(graph)
+        elif engine == 'database':
+            modes = [mode for mode in constraint_modes if mode != ConstraintMode.LOOP]   # 环线需要内存引擎
+
+        planner = make_planner(network, engine)
+        try:
+            for constraint_mode in modes:
+                for preference_mode in preference_modes:
+                    params_list = [make_params(graph, pair, constraint_mode, preference_mode) for pair in pairs]
+                    result = time_combination(planner, params_list)
+                    result.update(engine=engine, constraint_mode=constraint_mode.name,
+                                  preference_mode=preference_mode.name)
+                    report['results'].append(result)
+                    print(f"{network.name} {engine} {constraint_mode.name} {preference_mode.name}: "
+                          f"p50 {result['p50_ms']:.1f}ms p95 {result['p95_ms']:.1f}ms", file=sys.stderr)
+        finally:
+            if engine == 'database':
+                planner.disconnect()
+        graph.hierarchies = {kind: None for kind in CONTRACTION_KINDS}
+    return report
+
+
+def load_networks(kinds: List[str], sizes: List[int], csv_path: str, database: bool, seed: int):
+    """依次生成/加载待测路网（逐个返回，避免大路网同时驻留内存），附带构建耗时"""
+    for kind in kinds:
+        if kind == 'csv':
+            started = time.perf_counter()
+            network = SyntheticNetwork('road_modified', RoadGraph.from_csv(csv_path),
+                                       EdgeAttributeStore.from_csv(csv_path))
+            yield network, time.perf_counter() - started
+            continue
+        for size in sizes:
+            started = time.perf_counter()
+            network = generate_network(kind, size, seed)
+            yield network, time.perf_counter() - started
+    if database:
+        from routes.db_pool import get_connection
+        from routes.edge_store import get_edge_store
+        from routes.graph_engine import get_road_graph
+        started = time.perf_counter()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                network = SyntheticNetwork('edgesmodified', get_road_graph(cursor), get_edge_store(cursor))
+            finally:
+                cursor.close()
+        yield network, time.perf_counter() - started
+
+
+def max_rss_mb() -> Optional[float]:
+    """进程峰值常驻内存（MB），平台不支持时为None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024   # macOS单位为字节，Linux为KB
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--networks', default=','.join(NETWORK_KINDS + ['csv']),
+                        help='路网类型：grid、rgg、csv，逗号分隔')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='合成路网的路段数，逗号分隔')
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--engines', default='memory', help=f"引擎：{'、'.join(ENGINES)}，逗号分隔")
+    parser.add_argument('--database', action='store_true', help='同时测试数据库中的edgesmodified（需要PostgreSQL）')
+    parser.add_argument('--constraint-modes', default='1,2,3,4,5,6,7')
+    parser.add_argument('--preference-modes', default='1,2,3,4,5,6,7')
+    parser.add_argument('--queries', type=int, default=5, help='每种组合的规划次数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='结果JSON路径（默认输出到标准输出）')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)   # routeplanning的INFO日志会显著影响计时
+    engines = args.engines.split(',')
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"未知引擎: {', '.join(sorted(unknown))}")
+
+    # 计时每一次完整规划：关闭结果缓存与GeoJSON归档
+    route_cache.max_entries = 0
+    routeplanning.get_route_archive = lambda: None
+
+    rng = np.random.default_rng(args.seed)
+    reports = []
+    for network, build_seconds in load_networks(args.networks.split(','), [int(s) for s in args.sizes.split(',')],
+                                                args.csv, args.database, args.seed):
+        report = run_network(network, engines,
+                             [ConstraintMode(int(m)) for m in args.constraint_modes.split(',')],
+                             [PreferenceMode(int(m)) for m in args.preference_modes.split(',')],
+                             args.queries, rng)
+        report['build_seconds'] = build_seconds
+        reports.append(report)
+        del network
+
+    output = json.dumps({
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'queries_per_combination': args.queries,
+        'seed': args.seed,
+        'networks': reports,
+        'max_rss_mb': max_rss_mb()
+    }, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
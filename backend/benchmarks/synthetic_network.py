@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+合成路网生成（无需数据库）
+生成规则网格路网与随机几何图（RGG）路网，路段带有edgesmodified的全部属性列，
+返回内存路网与常驻路段属性，可直接交给JoggingPathPlanner规划
+
+用法：
+    python benchmarks/synthetic_network.py --kind rgg --edges 100000 --csv out.csv
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+from dataclasses import dataclass
+from typing import Dict
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # 随机几何图需要scipy
+    cKDTree = None
+
+from routes.edge_store import EDGE_DETAIL_COLUMNS, INTEGER_DETAIL_COLUMNS, EdgeAttributeStore
+from routes.graph_engine import MTOTAL_COLUMNS, RoadGraph
+from routes.node_snapper import haversine_distance
+
+# 路网中心（杭州）与网格间距（度，约100米）
+ORIGIN_LON, ORIGIN_LAT = 120.15, 30.25
+GRID_SPACING = 0.001
+
+# 评价列为NULL的比例，覆盖NULL按0处理的分支
+NULL_FRACTION = 0.05
+
+# 随机几何图的目标平均度
+RGG_MEAN_DEGREE = 3.0
+
+NETWORK_KINDS = ['grid', 'rgg']
+
+
+@dataclass
+class SyntheticNetwork:
+    """合成路网：内存路网与同一批路段的常驻属性"""
+    name: str
+    graph: RoadGraph
+    edge_store: EdgeAttributeStore
+
+
+def grid_edges(num_edges: int, rng: np.random.Generator):
+    """近似正方形的网格，返回 (节点经度, 节点纬度, 路段起点下标, 路段终点下标)"""
+    side = max(2, int(np.ceil((1 + np.sqrt(1 + 2 * num_edges)) / 2)))   # 2n(n-1) >= num_edges
+    rows, cols = np.divmod(np.arange(side * side), side)
+    node_x = ORIGIN_LON + cols * GRID_SPACING + rng.normal(0, GRID_SPACING * 0.05, side * side)
+    node_y = ORIGIN_LAT + rows * GRID_SPACING + rng.normal(0, GRID_SPACING * 0.05, side * side)
+
+    ids = np.arange(side * side).reshape(side, side)
+    horizontal = np.column_stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()])
+    vertical = np.column_stack([ids[:-1, :].ravel(), ids[1:, :].ravel()])
+    pairs = np.vstack([horizontal, vertical])
+    pairs = pairs[rng.permutation(len(pairs))[:num_edges]]
+    return node_x, node_y, pairs[:, 0], pairs[:, 1]
+
+
+def rgg_edges(num_edges: int, rng: np.random.Generator):
+    """随机几何图：节点均匀分布，距离小于半径的节点对相连（平均度约RGG_MEAN_DEGREE）"""
+    if cKDTree is None:
+        raise RuntimeError("生成随机几何图需要安装scipy")
+    num_nodes = max(2, int(2 * num_edges / RGG_MEAN_DEGREE))
+    extent = np.sqrt(num_nodes) * GRID_SPACING   # 与网格相近的节点密度
+    points = rng.uniform(0, extent, size=(num_nodes, 2))
+    radius = np.sqrt(RGG_MEAN_DEGREE * extent * extent / (np.pi * num_nodes))
+    pairs = cKDTree(points).query_pairs(radius, output_type='ndarray')
+    while len(pairs) < num_edges:   # 边界效应使边数偏少时略增大半径
+        radius *= 1.05
+        pairs = cKDTree(points).query_pairs(radius, output_type='ndarray')
+    pairs = pairs[rng.permutation(len(pairs))[:num_edges]]
+    return ORIGIN_LON + points[:, 0], ORIGIN_LAT + points[:, 1], pairs[:, 0], pairs[:, 1]
+
+
+def edge_attributes(node_x: np.ndarray, node_y: np.ndarray, source: np.ndarray, target: np.ndarray,
+                    rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """生成edgesmodified的全部属性列（含*_mtotal），长度由端点球面距离加随机绕行系数得到"""
+    num_edges = len(source)
+    length = haversine_distance(node_y[source], node_x[source], node_y[target], node_x[target])
+    length = length * rng.uniform(1.0, 1.3, num_edges)
+
+    def nullable(values: np.ndarray) -> np.ndarray:
+        values = values.astype(np.float64)
+        values[rng.random(num_edges) < NULL_FRACTION] = np.nan
+        return values
+
+    columns = {}
+    for name in EDGE_DETAIL_COLUMNS:
+        if name in INTEGER_DETAIL_COLUMNS:
+            columns[name] = rng.integers(0, 50, num_edges).astype(np.float64)
+        else:
+            columns[name] = rng.random(num_edges)
+    columns.update({
+        'fid': np.arange(num_edges, dtype=np.float64),
+        'shape_leng': length, 'origlen': length, 'distance': length, 'dis_ori': length,
+        'startx': node_x[source], 'starty': node_y[source], 'endx': node_x[target], 'endy': node_y[target],
+        'total': nullable(rng.gamma(4.0, 2.5, num_edges)),
+        'score': nullable(rng.gamma(2.0, 1.5, num_edges)),
+    })
+    for name in MTOTAL_COLUMNS:
+        columns[name] = nullable(rng.random(num_edges))
+    return columns
+
+
+def generate_network(kind: str, num_edges: int, seed: int = 0) -> SyntheticNetwork:
+    """生成指定类型与路段数的合成路网（节点与路段ID均从1开始）"""
+    if kind not in NETWORK_KINDS:
+        raise ValueError(f"路网类型必须为{'、'.join(NETWORK_KINDS)}之一")
+    rng = np.random.default_rng(seed)
+    node_x, node_y, source, target = (grid_edges if kind == 'grid' else rgg_edges)(num_edges, rng)
+    columns = edge_attributes(node_x, node_y, source, target, rng)
+
+    node_ids = np.arange(1, len(node_x) + 1)
+    edge_ids = np.arange(1, len(source) + 1)
+    graph = RoadGraph(node_ids, node_x, node_y, edge_ids, node_ids[source], node_ids[target],
+                      {name: columns[name] for name in ['dis_ori', 'total', 'score'] + MTOTAL_COLUMNS})
+    geometries = [{'type': 'LineString', 'coordinates': [[x1, y1], [x2, y2]]}
+                  for x1, y1, x2, y2 in zip(node_x[source].tolist(), node_y[source].tolist(),
+                                            node_x[target].tolist(), node_y[target].tolist())]
+    store = EdgeAttributeStore(edge_ids, {name: columns[name] for name in EDGE_DETAIL_COLUMNS}, geometries)
+    return SyntheticNetwork(name=f'{kind}_{len(edge_ids)}', graph=graph, edge_store=store)
+
+
+def write_csv(network: SyntheticNetwork, path: str):
+    """按res/road_modified.csv的格式写出（可供RoadGraph.from_csv与contraction.py --csv使用）"""
+    names = EDGE_DETAIL_COLUMNS + MTOTAL_COLUMNS
+    columns = dict(network.graph.edge_values, **network.edge_store.columns)   # 两者均按路段ID排列
+    data = np.column_stack([columns[name] for name in names])
+    np.savetxt(path, data, delimiter=',', header=','.join(names), comments='', fmt='%.10g')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kind', choices=NETWORK_KINDS, default='grid')
+    parser.add_argument('--edges', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', required=True, help='输出CSV路径')
+    args = parser.parse_args()
+
+    network = generate_network(args.kind, args.edges, args.seed)
+    write_csv(network, args.csv)
+    print(f"{network.name}: {network.graph.num_nodes} 个节点, {network.graph.num_edges} 条路段 -> {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+# 改进蚁群算法求解器（res/antroadUpgrade.m 的NumPy移植）
+# 信息素与启发式因子按CSR邻接位置稀疏存储（每条路段两个方向各一个位置），不再使用N x N矩阵；
+# 同一迭代内全部蚂蚁同步逐步前进，选择、回退与约束检查均按蚂蚁向量化
+# 时间预算可通过环境变量 ACO_MAX_SECONDS（默认10秒）调整
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ACO_MAX_SECONDS = float(os.getenv('ACO_MAX_SECONDS', '10'))
+
+
+@dataclass
+class AntColonyConfig:
+    """蚁群参数，默认值与antroadUpgrade.m一致"""
+    num_ants: int = 20                  # 蚂蚁数量
+    max_iter: int = 80                  # 最大迭代次数
+    alpha: Optional[float] = None       # 信息素重要程度，None时按权重模式取值（长度权重6.5，路段数权重2.5）
+    beta: float = 1.0                   # 启发因子重要程度
+    rho: float = 0.3                    # 初始信息素挥发率（w1=0时为0.1）
+    decay: float = 0.98                 # 每次迭代 rho = max(decay * rho, rho_min)（.m中的lambda）
+    rho_min: float = 0.05
+    max_backoff: int = 50               # 连续回退超过该步数则该蚂蚁重新出发
+    patience: Optional[int] = None      # 全局最优连续多少次迭代不变即提前结束（.m中的limit/maxtime），None为不启用
+    max_seconds: float = ACO_MAX_SECONDS
+    processes: int = 0                  # >1时按蚂蚁分批在多个进程中行走
+    seed: Optional[int] = None
+
+
+@dataclass
+class AntProblem:
+    """
+    蚂蚁行走所需的全部数组（可pickle，多进程时每个进程只传一次）
+    数组按RoadGraph的节点下标、路段下标与CSR邻接位置（slot）寻址
+    """
+    indptr: np.ndarray           # CSR行指针 (N+1,)
+    indices: np.ndarray          # 邻接位置 -> 相邻节点 (S,)
+    slot_edges: np.ndarray       # 邻接位置 -> 路段下标 (S,)
+    heuristic: np.ndarray        # 邻接位置的启发式因子（路段偏好评分，.m中的totalMat）(S,)
+    step_cost: np.ndarray        # 路段的约束量：距离约束为dis_ori，路段数约束为1 (E,)
+    to_end: np.ndarray           # 各节点到终点的最小约束量，用于前瞻剪枝 (N,)
+    allowed: np.ndarray          # 可通行节点掩码（剔除死端与超出约束范围的节点）(N,)
+    start: int
+    end: int
+    min_value: float = -np.inf
+    max_value: float = np.inf
+
+
+@dataclass
+class AntColonyResult:
+    """蚁群求解结果"""
+    path_nodes: List[int]                       # 节点下标序列
+    path_edges: List[int]                       # 路段下标序列
+    ratio: float                                # 最优joggability（与启发式求解器的优化比值同口径）
+    iterations: int
+    elapsed: float
+    completed_ants: int                         # 成功到达终点的蚂蚁总数
+    history: List[float] = field(default_factory=list)   # 每次迭代后的全局最优比值
+
+
+def prune_dead_ends(indptr: np.ndarray, indices: np.ndarray, allowed: np.ndarray, keep: List[int]) -> np.ndarray:
+    """迭代剔除度为1的节点（.m中的“迭代剔除逻辑”），keep中的节点始终保留"""
+    allowed = allowed.copy()
+    heads = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    while True:
+        live = allowed[heads] & allowed[indices]
+        degree = np.bincount(heads[live], minlength=len(allowed))
+        dead = allowed & (degree <= 1)
+        dead[keep] = False
+        if not dead.any():
+            return allowed
+        allowed &= ~dead
+
+
+def walk_ants(problem: AntProblem, pheromone: np.ndarray, num_ants: int, alpha: float, beta: float,
+              rng: np.random.Generator, max_backoff: int, deadline: float) -> List[np.ndarray]:
+    """
+    一次迭代中全部蚂蚁同步行走，返回成功到达终点的蚂蚁路径（邻接位置序列）
+    .m中蚂蚁会无限重试，这里每次迭代最多走 10 x 可通行节点数 步，未到达终点的蚂蚁本次迭代作废
+    - 按 信息素^alpha * 启发式^beta 的概率选择未访问的相邻节点
+    - 无路可走时将当前节点设为临时障碍并回退一步，回退过多则重新出发
+    - 每走一步检查约束：超出上限，或加上到终点的最小约束量仍超出上限时撤回该步并把该节点设为障碍；
+      未达下限就到达终点时只撤回该步（终点不设为障碍）
+    """
+    num_nodes = len(problem.indptr) - 1
+    weight = pheromone ** alpha * problem.heuristic ** beta
+    max_len = int(problem.allowed.sum()) + 1
+
+    current = np.full(num_ants, problem.start, dtype=np.int64)
+    path_slots = np.zeros((num_ants, max_len), dtype=np.int64)
+    path_nodes = np.zeros((num_ants, max_len + 1), dtype=np.int64)
+    path_nodes[:, 0] = problem.start
+    length = np.zeros(num_ants, dtype=np.int64)
+    cost = np.zeros(num_ants)
+    backoff = np.zeros(num_ants, dtype=np.int64)
+    blocked = np.zeros((num_ants, num_nodes), dtype=bool)
+    blocked[:, problem.start] = True
+    blocked[:, ~problem.allowed] = True
+    done = np.zeros(num_ants, dtype=bool)
+
+    def restart(ants: np.ndarray):
+        current[ants] = problem.start
+        length[ants] = 0
+        cost[ants] = 0.0
+        backoff[ants] = 0
+        blocked[ants] = ~problem.allowed
+        blocked[ants, problem.start] = True
+
+    for _ in range(10 * max_len):
+        if done.all() or time.perf_counter() >= deadline:
+            break
+        ants = np.flatnonzero(~done)
+        nodes = current[ants]
+        begins = problem.indptr[nodes]
+        counts = problem.indptr[nodes + 1] - begins
+        ends = np.cumsum(counts)
+        offsets = np.repeat(begins - ends + counts, counts) + np.arange(int(ends[-1]) if len(ends) else 0)
+        owners = np.repeat(np.arange(len(ants)), counts)
+        neighbors = problem.indices[offsets]
+
+        open_ = ~blocked[ants[owners], neighbors]
+        w = np.where(open_, weight[offsets] + 1e-12, 0.0)
+        cumulative = np.concatenate([[0.0], np.cumsum(w)])
+        totals = cumulative[ends] - cumulative[ends - counts]
+        stuck = totals <= 0
+
+        # 无路可走：回退一步，或重新出发
+        if stuck.any():
+            stuck_ants = ants[stuck]
+            give_up = (length[stuck_ants] == 0) | (backoff[stuck_ants] > max_backoff)
+            restart(stuck_ants[give_up])
+            back = stuck_ants[~give_up]
+            if back.size:
+                length[back] -= 1
+                cost[back] -= problem.step_cost[problem.slot_edges[path_slots[back, length[back]]]]
+                current[back] = path_nodes[back, length[back]]
+                backoff[back] += 1
+
+        # 按概率选择下一步
+        moving = ~stuck
+        if not moving.any():
+            continue
+        targets = cumulative[(ends - counts)[moving]] + rng.random(int(moving.sum())) * totals[moving]
+        picks = np.searchsorted(cumulative, targets, side='right') - 1
+        picks = np.clip(picks, (ends - counts)[moving], ends[moving] - 1)
+        movers = ants[moving]
+        slots = offsets[picks]
+        nxt = neighbors[picks]
+        new_cost = cost[movers] + problem.step_cost[problem.slot_edges[slots]]
+
+        at_end = nxt == problem.end
+        overshoot = (new_cost > problem.max_value) | (new_cost + problem.to_end[nxt] > problem.max_value)
+        too_short = at_end & (new_cost < problem.min_value)
+        blocked[movers[overshoot], nxt[overshoot]] = True
+        backoff[movers[overshoot | too_short]] += 1
+
+        ok = ~(overshoot | too_short)
+        movers, slots, nxt = movers[ok], slots[ok], nxt[ok]
+        path_slots[movers, length[movers]] = slots
+        length[movers] += 1
+        path_nodes[movers, length[movers]] = nxt
+        cost[movers] = new_cost[ok]
+        current[movers] = nxt
+        blocked[movers, nxt] = True
+        backoff[movers] = 0
+        done[movers[at_end[ok]]] = True
+
+    return [path_slots[a, :length[a]].copy() for a in np.flatnonzero(done)]
+
+
+# 多进程行走时各进程常驻的问题数据
+_worker_problem: Optional[AntProblem] = None
+
+
+def _init_worker(problem: AntProblem):
+    global _worker_problem
+    _worker_problem = problem
+
+
+def _walk_batch(pheromone: np.ndarray, num_ants: int, alpha: float, beta: float, seed: int,
+                max_backoff: int, seconds: float) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return walk_ants(_worker_problem, pheromone, num_ants, alpha, beta, rng, max_backoff,
+                     time.perf_counter() + seconds)
+
+
+class AntColonySolver:
+    """
+    改进蚁群求解器
+    评价函数与启发式求解器的优化比值一致：w2>0时为 偏好总分^w1 / 偏好代价^w2，否则为 偏好总分^w1 / 路段数^w3
+    信息素更新沿用antroadUpgrade.m：全局挥发后，全局最优路径上按平均得分增加，w1>0时其余路段各加1
+    """
+
+    def __init__(self, problem: AntProblem, edge_score: np.ndarray, edge_cost: np.ndarray,
+                 config: Optional[AntColonyConfig] = None):
+        self.problem = problem
+        self.edge_score = edge_score    # 路段偏好评分 (E,)
+        self.edge_cost = edge_cost      # 路段偏好代价 (E,)
+        self.config = config or AntColonyConfig()
+
+    def path_metrics(self, paths: List[np.ndarray]) -> Dict[str, np.ndarray]:
+        """各蚂蚁路径的偏好总分、偏好代价与路段数（按路径拼接后分段求和）"""
+        lengths = np.array([len(p) for p in paths], dtype=np.int64)
+        edges = self.problem.slot_edges[np.concatenate(paths)]
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        return {
+            'total': np.add.reduceat(self.edge_score[edges], starts),
+            'cost': np.add.reduceat(self.edge_cost[edges], starts),
+            'segments': lengths.astype(np.float64)
+        }
+
+    def solve(self, w1: float, w2: float, w3: float) -> AntColonyResult:
+        config = self.config
+        problem = self.problem
+        alpha = config.alpha if config.alpha is not None else (6.5 if w2 > 0 and w1 != 0 else 2.5)
+        rho = config.rho if w1 != 0 else 0.1
+        total_mean = float(self.edge_score.mean())
+        cost_mean = float(self.edge_cost.mean())
+        rng = np.random.default_rng(config.seed)
+
+        pheromone = np.ones(len(problem.slot_edges))
+        best_ratio = -np.inf
+        best_slots: Optional[np.ndarray] = None
+        best_values = None
+        history: List[float] = []
+        completed = 0
+        unchanged = 0
+        started = time.perf_counter()
+        deadline = started + config.max_seconds
+
+        executor = None
+        if config.processes > 1:
+            executor = ProcessPoolExecutor(max_workers=config.processes, initializer=_init_worker,
+                                           initargs=(problem,))
+        try:
+            for iteration in range(1, config.max_iter + 1):
+                if time.perf_counter() >= deadline:
+                    break
+                rho = max(config.decay * rho, config.rho_min)
+                paths = self._walk(executor, pheromone, alpha, rng, deadline)
+                completed += len(paths)
+
+                if paths:
+                    metrics = self.path_metrics(paths)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        numerator = metrics['total'] ** w1
+                        ratio = numerator / metrics['cost'] ** w2 if w2 > 0 else numerator / metrics['segments'] ** w3
+                    ratio = np.where(np.isfinite(ratio), ratio, -np.inf)
+                    i = int(np.argmax(ratio))
+                    if ratio[i] > best_ratio:
+                        best_ratio = float(ratio[i])
+                        best_slots = paths[i]
+                        best_values = {name: float(values[i]) for name, values in metrics.items()}
+                        unchanged = 0
+                    else:
+                        unchanged += 1
+                else:
+                    unchanged += 1
+                history.append(best_ratio)
+
+                # 信息素更新
+                pheromone *= 1 - rho
+                if best_slots is not None:
+                    on_best = np.zeros(len(pheromone), dtype=bool)
+                    on_best[best_slots] = True
+                    if w1 == 0:
+                        delta = best_ratio
+                    elif w2 > 0:
+                        delta = cost_mean * (best_values['total'] / best_values['cost']) / total_mean
+                    else:
+                        delta = (best_values['total'] / best_values['segments']) / total_mean
+                    pheromone[on_best] += delta
+                    if w1 != 0:
+                        pheromone[~on_best] += 1
+
+                if config.patience is not None and unchanged >= config.patience:
+                    logger.info(f"蚁群算法连续{unchanged}次迭代未改进，提前结束")
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - started
+        if best_slots is None:
+            raise ValueError("蚁群算法在预算内没有找到满足约束的路径，请调整约束参数或增加时间预算")
+
+        path_edges = problem.slot_edges[best_slots].tolist()
+        path_nodes = [problem.start] + problem.indices[best_slots].tolist()
+        logger.info(f"蚁群算法完成: {len(history)}次迭代，{completed}只蚂蚁到达终点，"
+                    f"最优比值 {best_ratio:.4f}，耗时 {elapsed:.2f}s")
+        return AntColonyResult(path_nodes=path_nodes, path_edges=path_edges, ratio=best_ratio,
+                               iterations=len(history), elapsed=elapsed, completed_ants=completed,
+                               history=history)
+
+    def _walk(self, executor: Optional[ProcessPoolExecutor], pheromone: np.ndarray, alpha: float,
+              rng: np.random.Generator, deadline: float) -> List[np.ndarray]:
+        config = self.config
+        if executor is None:
+            return walk_ants(self.problem, pheromone, config.num_ants, alpha, config.beta, rng,
+                             config.max_backoff, deadline)
+        # 蚂蚁分批交给各进程，批内仍为向量化行走
+        batches = [len(b) for b in np.array_split(np.arange(config.num_ants), config.processes) if len(b)]
+        seconds = max(deadline - time.perf_counter(), 0.0)
+        futures = [
+            executor.submit(_walk_batch, pheromone, size, alpha, config.beta, int(rng.integers(2 ** 32)),
+                            config.max_backoff, seconds)
+            for size in batches
+        ]
+        return [path for future in futures for path in future.result()]
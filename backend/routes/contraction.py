@@ -0,0 +1,349 @@
+# 收缩层次（Contraction Hierarchies）
+# 离线按节点重要度逐个收缩路网并添加捷径，请求时只在“向上”的边上做双向搜索，
+# 点到点查询（模式5、6）只访问极少数节点，不再需要整棵最短路径树
+# 每种代价类型（preference_1~7与单位代价hops）一个文件，保存在 CONTRACTION_DIR（默认 backend/res/ch）
+#
+# 离线预处理：
+#     python routes/contraction.py                         # 从数据库加载路网
+#     python routes/contraction.py --csv res/road_modified.csv
+import argparse
+import hashlib
+import heapq
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CONTRACTION_DIR = os.getenv('CONTRACTION_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '../res/ch')))
+
+# 预处理的代价类型：7种偏好代价与单位代价
+CONTRACTION_KINDS = [f'preference_{i}' for i in range(1, 8)] + ['hops']
+
+# 见证搜索（判断捷径是否必要）最多确定的节点数，超过即保守地添加捷径
+WITNESS_SETTLE_LIMIT = 200
+
+
+def graph_fingerprint(edge_source: np.ndarray, edge_target: np.ndarray, weights: np.ndarray) -> str:
+    """路网拓扑与代价的指纹，路网或评分更新后旧的预处理文件自动失效"""
+    digest = hashlib.sha1()
+    for array in (edge_source, edge_target, weights):
+        digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class ContractionHierarchy:
+    """
+    收缩层次（无向图）
+    弧（arc）为原始路段或捷径：捷径记录中间节点与两段子弧，查询结果据此展开为原始路段序列
+    每个节点只保存通往更高层级节点的弧（CSR），双向搜索均沿这些弧向上
+    """
+
+    def __init__(self, rank: np.ndarray, up_indptr: np.ndarray, up_arcs: np.ndarray,
+                 arc_a: np.ndarray, arc_b: np.ndarray, arc_weight: np.ndarray, arc_edge: np.ndarray,
+                 arc_mid: np.ndarray, arc_c1: np.ndarray, arc_c2: np.ndarray, fingerprint: str = ''):
+        self.rank = rank                # 节点收缩次序（层级）
+        self.up_indptr = up_indptr      # 向上弧CSR行指针 (N+1,)
+        self.up_arcs = up_arcs          # 向上弧编号
+        self.arc_a = arc_a              # 弧端点a
+        self.arc_b = arc_b              # 弧端点b
+        self.arc_weight = arc_weight
+        self.arc_edge = arc_edge        # 原始路段下标，捷径为-1
+        self.arc_mid = arc_mid          # 捷径中间节点，原始路段为-1
+        self.arc_c1 = arc_c1            # 捷径子弧（a-中间节点）
+        self.arc_c2 = arc_c2            # 捷径子弧（中间节点-b）
+        self.fingerprint = fingerprint
+
+        # 查询在Python中逐节点展开，使用列表访问更快
+        self._up_indptr = up_indptr.tolist()
+        self._up_arcs = up_arcs.tolist()
+        self._arc_a = arc_a.tolist()
+        self._arc_b = arc_b.tolist()
+        self._arc_weight = arc_weight.tolist()
+        self._arc_edge = arc_edge.tolist()
+        self._arc_mid = arc_mid.tolist()
+        self._arc_c1 = arc_c1.tolist()
+        self._arc_c2 = arc_c2.tolist()
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.rank)
+
+    @property
+    def num_shortcuts(self) -> int:
+        return int((self.arc_edge < 0).sum())
+
+    @classmethod
+    def build(cls, num_nodes: int, edge_source: np.ndarray, edge_target: np.ndarray,
+              weights: np.ndarray) -> 'ContractionHierarchy':
+        """
+        按“边差 + 已收缩邻居数”的优先级逐个收缩节点（惰性更新优先级）
+        Args:
+            edge_source, edge_target: 路段端点的节点下标
+            weights: 路段的非负代价
+        """
+        fingerprint = graph_fingerprint(edge_source, edge_target, weights)
+        arc_a, arc_b, arc_weight, arc_edge, arc_mid, arc_c1, arc_c2 = [], [], [], [], [], [], []
+
+        def add_arc(a: int, b: int, weight: float, edge: int = -1, mid: int = -1, c1: int = -1, c2: int = -1) -> int:
+            arc_a.append(a)
+            arc_b.append(b)
+            arc_weight.append(weight)
+            arc_edge.append(edge)
+            arc_mid.append(mid)
+            arc_c1.append(c1)
+            arc_c2.append(c2)
+            return len(arc_a) - 1
+
+        # 剩余图的邻接表：相邻节点 -> (代价, 弧编号)，平行路段只保留代价最小的一条
+        adjacency: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(num_nodes)]
+        costs = np.nan_to_num(np.asarray(weights, dtype=np.float64), nan=0.0).tolist()
+        for e, (a, b) in enumerate(zip(edge_source.tolist(), edge_target.tolist())):
+            if a == b or (b in adjacency[a] and adjacency[a][b][0] <= costs[e]):
+                continue
+            arc = add_arc(a, b, costs[e], edge=e)
+            adjacency[a][b] = (costs[e], arc)
+            adjacency[b][a] = (costs[e], arc)
+
+        def witness_distances(source: int, excluded: int, limit: float) -> Dict[int, float]:
+            """不经过excluded、代价不超过limit的有限Dijkstra"""
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap and settled < WITNESS_SETTLE_LIMIT:
+                d, u = heapq.heappop(heap)
+                if d > limit:
+                    break
+                if d > dist[u]:
+                    continue
+                settled += 1
+                for v, (w, _) in adjacency[u].items():
+                    nd = d + w
+                    if v != excluded and nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def needed_shortcuts(v: int) -> List[Tuple[int, int, float, int, int]]:
+            """收缩v需要添加的捷径 (u, w, 代价, 弧u-v, 弧v-w)"""
+            neighbors = list(adjacency[v].items())
+            shortcuts = []
+            for i, (u, (wu, arc_u)) in enumerate(neighbors[:-1]):
+                rest = neighbors[i + 1:]
+                limit = wu + max(wx for _, (wx, _) in rest)
+                dist = witness_distances(u, v, limit)
+                for x, (wx, arc_x) in rest:
+                    if dist.get(x, float('inf')) > wu + wx:
+                        shortcuts.append((u, x, wu + wx, arc_u, arc_x))
+            return shortcuts
+
+        deleted_neighbors = [0] * num_nodes
+
+        def priority(v: int) -> Tuple[int, List]:
+            shortcuts = needed_shortcuts(v)
+            return len(shortcuts) - len(adjacency[v]) + deleted_neighbors[v], shortcuts
+
+        heap = [(priority(v)[0], v) for v in range(num_nodes)]
+        heapq.heapify(heap)
+        rank = np.full(num_nodes, -1, dtype=np.int64)
+        up_lists: List[List[int]] = [[] for _ in range(num_nodes)]
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if rank[v] >= 0:
+                continue
+            current, shortcuts = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            rank[v] = order
+            order += 1
+            for u, (_, arc) in adjacency[v].items():
+                up_lists[v].append(arc)
+                del adjacency[u][v]
+                deleted_neighbors[u] += 1
+            adjacency[v] = {}
+            for u, x, weight, arc_u, arc_x in shortcuts:
+                if x in adjacency[u] and adjacency[u][x][0] <= weight:
+                    continue
+                # 子弧方向统一为 u-中间节点、中间节点-x
+                arc = add_arc(u, x, weight, mid=v, c1=arc_u, c2=arc_x)
+                adjacency[u][x] = (weight, arc)
+                adjacency[x][u] = (weight, arc)
+
+        counts = np.array([len(arcs) for arcs in up_lists], dtype=np.int64)
+        return cls(
+            rank=rank,
+            up_indptr=np.concatenate([[0], np.cumsum(counts)]),
+            up_arcs=np.array([arc for arcs in up_lists for arc in arcs], dtype=np.int64),
+            arc_a=np.array(arc_a, dtype=np.int64),
+            arc_b=np.array(arc_b, dtype=np.int64),
+            arc_weight=np.array(arc_weight, dtype=np.float64),
+            arc_edge=np.array(arc_edge, dtype=np.int64),
+            arc_mid=np.array(arc_mid, dtype=np.int64),
+            arc_c1=np.array(arc_c1, dtype=np.int64),
+            arc_c2=np.array(arc_c2, dtype=np.int64),
+            fingerprint=fingerprint
+        )
+
+    def save(self, path: str):
+        """保存为npz（先写临时文件再替换）"""
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, rank=self.rank, up_indptr=self.up_indptr, up_arcs=self.up_arcs,
+                            arc_a=self.arc_a, arc_b=self.arc_b, arc_weight=self.arc_weight,
+                            arc_edge=self.arc_edge, arc_mid=self.arc_mid, arc_c1=self.arc_c1,
+                            arc_c2=self.arc_c2, fingerprint=np.array(self.fingerprint))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ContractionHierarchy':
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        fingerprint = str(arrays.pop('fingerprint'))
+        return cls(fingerprint=fingerprint, **arrays)
+
+    def query(self, source: int, target: int) -> Tuple[float, List[int], List[int], int]:
+        """
+        双向向上搜索，返回 (代价, 节点下标序列, 路段下标序列, 扩展节点数)；不可达时代价为inf、序列为空
+        """
+        if source == target:
+            return 0.0, [source], [], 0
+        up_indptr, up_arcs = self._up_indptr, self._up_arcs
+        arc_a, arc_b, arc_weight = self._arc_a, self._arc_b, self._arc_weight
+
+        dist = ({source: 0.0}, {target: 0.0})
+        pred = ({source: -1}, {target: -1})     # 节点 -> 到达该节点的弧
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meet = float('inf'), -1
+        expanded = 0
+        while True:
+            # 每次推进堆顶较小的方向；两个方向的堆顶都不小于当前最优时结束
+            active = [s for s in (0, 1) if heaps[s] and heaps[s][0][0] < best]
+            if not active:
+                break
+            side = active[0] if len(active) == 1 else min(active, key=lambda s: heaps[s][0][0])
+            d, u = heapq.heappop(heaps[side])
+            if d > dist[side][u]:
+                continue
+            expanded += 1
+            other = dist[1 - side].get(u)
+            if other is not None and d + other < best:
+                best, meet = d + other, u
+            for k in range(up_indptr[u], up_indptr[u + 1]):
+                arc = up_arcs[k]
+                v = arc_b[arc] if arc_a[arc] == u else arc_a[arc]
+                nd = d + arc_weight[arc]
+                if nd < dist[side].get(v, float('inf')):
+                    dist[side][v] = nd
+                    pred[side][v] = arc
+                    heapq.heappush(heaps[side], (nd, v))
+
+        if meet < 0:
+            return float('inf'), [], [], expanded
+
+        # 起点一侧的弧从相遇点回溯后反转，终点一侧的弧从相遇点顺序走到终点
+        forward = []
+        node = meet
+        while pred[0][node] >= 0:
+            arc = pred[0][node]
+            forward.append(arc)
+            node = arc_b[arc] if arc_a[arc] == node else arc_a[arc]
+        forward.reverse()
+        backward = []
+        node = meet
+        while pred[1][node] >= 0:
+            arc = pred[1][node]
+            backward.append(arc)
+            node = arc_b[arc] if arc_a[arc] == node else arc_a[arc]
+
+        nodes, edges = [source], []
+        for arc in forward + backward:
+            self._unpack(arc, nodes, edges)
+        return best, nodes, edges, expanded
+
+    def _unpack(self, arc: int, nodes: List[int], edges: List[int]):
+        """从nodes[-1]出发沿弧展开为原始路段，追加到nodes与edges"""
+        stack = [(arc, nodes[-1])]
+        while stack:
+            arc, start = stack.pop()
+            a, b = self._arc_a[arc], self._arc_b[arc]
+            edge = self._arc_edge[arc]
+            if edge >= 0:
+                edges.append(edge)
+                nodes.append(b if start == a else a)
+                continue
+            mid = self._arc_mid[arc]
+            # 栈后进先出：先压入后走的子弧
+            if start == a:
+                stack.append((self._arc_c2[arc], mid))
+                stack.append((self._arc_c1[arc], a))
+            else:
+                stack.append((self._arc_c1[arc], mid))
+                stack.append((self._arc_c2[arc], b))
+
+
+def hierarchy_path(folder: str, kind: str) -> str:
+    return os.path.join(folder, f'ch_{kind}.npz')
+
+
+def load_hierarchy(folder: str, kind: str, fingerprint: str) -> Optional[ContractionHierarchy]:
+    """读取预处理文件；文件不存在或与当前路网指纹不一致时返回None（调用方退回单源搜索）"""
+    path = hierarchy_path(folder, kind)
+    if not os.path.exists(path):
+        return None
+    try:
+        hierarchy = ContractionHierarchy.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"读取收缩层次失败: {path}: {e}")
+        return None
+    if hierarchy.fingerprint != fingerprint:
+        logger.warning(f"收缩层次与当前路网不一致，已忽略（请重新预处理）: {path}")
+        return None
+    logger.info(f"已加载收缩层次 {kind}: {hierarchy.num_nodes}个节点，{hierarchy.num_shortcuts}条捷径")
+    return hierarchy
+
+
+def build_all(graph, folder: str = CONTRACTION_DIR, kinds: Optional[List[str]] = None) -> Dict[str, float]:
+    """为路网的各代价类型构建收缩层次并保存，返回各类型耗时（秒）"""
+    os.makedirs(folder, exist_ok=True)
+    timings = {}
+    for kind in kinds or CONTRACTION_KINDS:
+        started = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(graph.num_nodes, graph.edge_source, graph.edge_target,
+                                               graph.contraction_weights(kind))
+        hierarchy.save(hierarchy_path(folder, kind))
+        timings[kind] = time.perf_counter() - started
+        logger.info(f"收缩层次 {kind}: {hierarchy.num_shortcuts}条捷径，耗时 {timings[kind]:.1f}s")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线构建收缩层次（模式5、6点到点查询）')
+    parser.add_argument('--csv', help='由路网CSV构建（默认从数据库加载edgesmodified/nodesmodified）')
+    parser.add_argument('--out', default=CONTRACTION_DIR, help='输出目录')
+    parser.add_argument('--kinds', nargs='*', default=CONTRACTION_KINDS, help='代价类型')
+    args = parser.parse_args()
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    from routes.graph_engine import RoadGraph
+    if args.csv:
+        graph = RoadGraph.from_csv(args.csv)
+    else:
+        from routes.db_pool import get_connection
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                graph = RoadGraph.from_cursor(cursor)
+            finally:
+                cursor.close()
+    build_all(graph, args.out, args.kinds)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
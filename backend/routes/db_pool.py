@@ -0,0 +1,204 @@
+# 数据库连接池（所有蓝图共用）
+# 修改DB_CONFIG为自己的数据库信息；连接池大小可通过环境变量 DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT 调整
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# 数据库配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'joy_run_db',
+    'user': 'postgres',
+    # 'password': 'postgres1'
+    'password': 'zzq12'
+}
+
+POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))            # 常驻连接数
+POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))           # 最大连接数
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # 连接耗尽时的最长等待时间（秒）
+POOL_RETRIES = int(os.getenv('DB_POOL_RETRIES', '3'))     # 健康检查失败后重新获取连接的次数
+
+
+class ConnectionPool:
+    """
+    线程安全连接池，封装psycopg2 ThreadedConnectionPool
+    - 连接耗尽时阻塞等待（最长timeout秒），而不是立即抛出PoolError
+    - 取出连接时做健康检查，断开的连接丢弃后重新获取（新连接同样检查，最多重试retries次）
+    - 统计等待时间与耗尽次数
+    """
+
+    def __init__(self, config: Dict, minconn: int = POOL_MIN, maxconn: int = POOL_MAX,
+                 timeout: float = POOL_TIMEOUT, health_check: bool = True, retries: int = POOL_RETRIES):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("连接池大小配置错误，需满足 0 <= min <= max 且 max >= 1")
+        self.config = dict(config)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check = health_check
+        self.retries = max(retries, 0)
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats = {
+            'checkouts': 0,              # 成功取出次数
+            'waits': 0,                  # 需要等待空闲连接的次数
+            'wait_seconds_total': 0.0,   # 累计等待时间
+            'wait_seconds_max': 0.0,     # 最长一次等待时间
+            'exhausted': 0,              # 等待超时（连接池耗尽）次数
+            'health_check_failures': 0,  # 健康检查失败而被丢弃的连接数
+            'in_use': 0                  # 当前借出的连接数
+        }
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        # 首次使用时才建立连接，导入模块不触发数据库访问
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, **self.config)
+                    logger.info(f"数据库连接池已创建: {self.config.get('database')} "
+                                f"(min={self.minconn}, max={self.maxconn})")
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """取出一个可用连接，超时未取得或重试后仍无健康连接时抛出PoolError"""
+        started = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            acquired = self._slots.acquire(timeout=self.timeout)
+            waited = time.perf_counter() - started
+            with self._lock:
+                self._stats['waits'] += 1
+                self._stats['wait_seconds_total'] += waited
+                self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+                if not acquired:
+                    self._stats['exhausted'] += 1
+            if not acquired:
+                logger.warning(f"数据库连接池耗尽，等待 {waited:.2f}s 未取得连接")
+                raise PoolError(f"数据库连接池耗尽（max={self.maxconn}）")
+
+        try:
+            pool = self._get_pool()
+            for attempt in range(self.retries + 1):
+                conn = pool.getconn()
+                if self._is_healthy(conn):
+                    break
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                logger.warning(f"丢弃失效的数据库连接并重新建立（第{attempt + 1}次）")
+                pool.putconn(conn, close=True)
+            else:
+                raise PoolError(f"重试{self.retries}次后仍未取得可用的数据库连接")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """归还连接，未结束的事务回滚后再放回池中"""
+        try:
+            if not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            close = True
+        try:
+            self._get_pool().putconn(conn, close=close or bool(conn.closed))
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: ... 结束时自动归还"""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> Dict:
+        """连接池统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'database': self.config.get('database'),
+            'min': self.minconn,
+            'max': self.maxconn,
+            'wait_seconds_avg': stats['wait_seconds_total'] / stats['waits'] if stats['waits'] else 0.0
+        })
+        return stats
+
+    def closeall(self):
+        """关闭池中全部连接"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+# 按数据库名区分的进程级连接池
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database: Optional[str] = None) -> ConnectionPool:
+    """获取指定数据库的连接池，默认使用DB_CONFIG中的数据库"""
+    database = database or DB_CONFIG['database']
+    pool = _pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database)
+            if pool is None:
+                pool = ConnectionPool(dict(DB_CONFIG, database=database))
+                _pools[database] = pool
+    return pool
+
+
+@contextmanager
+def get_connection(database: Optional[str] = None):
+    """从连接池借出连接，with语句结束时归还"""
+    with get_pool(database).connection() as conn:
+        yield conn
+
+
+def get_pool_stats() -> Dict[str, Dict]:
+    """全部连接池的统计信息"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.config['database']: pool.stats() for pool in pools}
+
+
+def close_all_pools():
+    """关闭全部连接池（进程退出或测试时使用）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
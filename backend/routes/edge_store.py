@@ -0,0 +1,134 @@
+# 路段属性常驻存储
+# 将edgesmodified的详细属性与几何一次性读入内存并按路段ID建立下标，规划结果的路段详情直接按下标取值，
+# 不再每次请求用 IN (...) ORDER BY array_position(...) 查询并逐条解析ST_AsGeoJSON
+import json
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    from routes.route_serializer import round_geometry
+except ImportError:  # 在routes目录下直接运行时
+    from route_serializer import round_geometry
+
+logger = logging.getLogger(__name__)
+
+# 路段详情的数值属性列，顺序即接口返回的字段顺序（edge_id与geometry分别位于首尾）
+EDGE_DETAIL_COLUMNS = [
+    'fid', 'water', 'bh', 'shape_leng', 'frequency', 'slope', 'buildng', 'ndvi', 'winding',
+    'sport', 'life', 'education', 'finance', 'traffic', 'public', 'scenery', 'food', 'poi', 'svi', 'gvi',
+    'vw', 'vei', 'light', 'poiden', 'origlen', 'score', 'startx', 'starty', 'endx', 'endy', 'total',
+    'dij_w1', 'distance', 'score_ori', 'dis_ori', 'toatl_ori1', 'toatl_ori2'
+]
+
+# edgesmodified中为INTEGER的列，返回时保持整数
+INTEGER_DETAIL_COLUMNS = {'fid', 'bh', 'frequency', 'winding', 'sport', 'life', 'education', 'finance',
+                          'traffic', 'public', 'scenery', 'food'}
+
+# 路段详情的输出格式：'rows' 每条路段一个字典（默认），'columns' 每个属性一个数组
+EDGE_FORMATS = ['rows', 'columns']
+
+
+class EdgeAttributeStore:
+    """按路段ID寻址的列式路段属性，NULL保存为NaN（几何为None）"""
+
+    def __init__(self, edge_ids: np.ndarray, columns: Dict[str, np.ndarray], geometries: List[Optional[Dict]]):
+        order = np.argsort(edge_ids)
+        self.edge_ids = np.asarray(edge_ids, dtype=np.int64)[order]
+        self.columns = {name: np.asarray(values, dtype=np.float64)[order] for name, values in columns.items()}
+        self.geometries = [geometries[i] for i in order.tolist()]
+
+    @classmethod
+    def from_cursor(cls, cursor) -> 'EdgeAttributeStore':
+        """从数据库读取全部路段属性，几何只在加载时解析一次（并按ROUTE_COORD_PRECISION截断坐标）"""
+        cursor.execute(
+            "SELECT id, " + ", ".join(EDGE_DETAIL_COLUMNS) + ", ST_AsGeoJSON(geom) FROM edgesmodified;"
+        )
+        rows = cursor.fetchall()
+        values = np.array([row[:-1] for row in rows], dtype=np.float64).reshape(-1, 1 + len(EDGE_DETAIL_COLUMNS))
+        store = cls(
+            edge_ids=values[:, 0].astype(np.int64),
+            columns={name: values[:, 1 + i] for i, name in enumerate(EDGE_DETAIL_COLUMNS)},
+            geometries=[round_geometry(json.loads(row[-1])) if row[-1] else None for row in rows]
+        )
+        logger.info(f"路段属性加载完成: {len(store.edge_ids)} 条路段")
+        return store
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'EdgeAttributeStore':
+        """
+        由路网CSV（如res/road_modified.csv）读取路段属性，路段ID为行号（与RoadGraph.from_csv一致）
+        CSV中缺少的列按NULL处理，几何为起终点连线
+        """
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            header = [name.strip().lower() for name in f.readline().split(',')]
+            data = np.loadtxt(f, delimiter=',', ndmin=2)
+        column = {name: data[:, i] for i, name in enumerate(header)}
+        num_edges = len(data)
+        geometries = [{'type': 'LineString', 'coordinates': [[x1, y1], [x2, y2]]}
+                      for x1, y1, x2, y2 in zip(*(column[name].tolist() for name in ('startx', 'starty', 'endx', 'endy')))]
+        return cls(
+            edge_ids=np.arange(1, num_edges + 1),
+            columns={name: column.get(name, np.full(num_edges, np.nan)) for name in EDGE_DETAIL_COLUMNS},
+            geometries=[round_geometry(geometry) for geometry in geometries]
+        )
+
+    def positions(self, edge_ids: List[int]) -> np.ndarray:
+        """路段ID转下标，按输入顺序返回，不存在的路段被跳过（与SQL的IN查询一致）"""
+        ids = np.asarray(edge_ids, dtype=np.int64)
+        if not len(self.edge_ids):
+            return np.empty(0, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.edge_ids, ids), 0, len(self.edge_ids) - 1)
+        return pos[self.edge_ids[pos] == ids]
+
+    def column_values(self, name: str, pos: np.ndarray) -> List:
+        """按下标取一列，NaN转为None，整数列转为int"""
+        values = self.columns[name][pos]
+        missing = np.isnan(values)
+        if name in INTEGER_DETAIL_COLUMNS:
+            result = np.where(missing, 0, values).astype(np.int64).tolist()
+        else:
+            result = values.tolist()
+        if missing.any():
+            for i in np.flatnonzero(missing).tolist():
+                result[i] = None
+        return result
+
+    def columnar(self, edge_ids: List[int]) -> Dict[str, List]:
+        """按路径顺序返回路段详情，每个属性一个数组"""
+        pos = self.positions(edge_ids)
+        details = {'edge_id': self.edge_ids[pos].tolist()}
+        for name in EDGE_DETAIL_COLUMNS:
+            details[name] = self.column_values(name, pos)
+        details['geometry'] = [self.geometries[i] for i in pos.tolist()]
+        return details
+
+    def rows(self, edge_ids: List[int]) -> List[Dict]:
+        """按路径顺序返回路段详情，每条路段一个字典"""
+        details = self.columnar(edge_ids)
+        keys = list(details)
+        return [dict(zip(keys, values)) for values in zip(*details.values())]
+
+
+# 进程级常驻路段属性（首次使用时从数据库加载）
+_edge_store: Optional[EdgeAttributeStore] = None
+_edge_store_lock = threading.Lock()
+
+
+def get_edge_store(cursor) -> EdgeAttributeStore:
+    """获取进程内常驻路段属性，首次调用时从数据库加载"""
+    global _edge_store
+    if _edge_store is None:
+        with _edge_store_lock:
+            if _edge_store is None:
+                _edge_store = EdgeAttributeStore.from_cursor(cursor)
+    return _edge_store
+
+
+def invalidate_edge_store():
+    """edgesmodified更新后丢弃常驻路段属性，下次使用时重新加载"""
+    global _edge_store
+    with _edge_store_lock:
+        _edge_store = None
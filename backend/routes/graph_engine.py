@@ -0,0 +1,859 @@
+# 进程内路网图引擎
+# 将edgesmodified/nodesmodified一次性加载为NumPy CSR数组，Dijkstra由scipy.sparse.csgraph在CSR矩阵上完成，BFS按层向量化，
+# 避免每次请求都由pgRouting重新解析边表SQL并构建整张图
+import heapq
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+
+try:
+    from routes.node_snapper import EARTH_RADIUS, NodeSnapper, haversine_distance
+    from routes.contraction import CONTRACTION_DIR, ContractionHierarchy, graph_fingerprint, load_hierarchy
+    from routes.recommendation_table import (RECOMMENDATION_TABLE, RecommendationTable, load_recommendation_table,
+                                             table_fingerprint)
+except ImportError:  # 在routes目录下直接运行时
+    from node_snapper import EARTH_RADIUS, NodeSnapper, haversine_distance
+    from contraction import CONTRACTION_DIR, ContractionHierarchy, graph_fingerprint, load_hierarchy
+    from recommendation_table import (RECOMMENDATION_TABLE, RecommendationTable, load_recommendation_table,
+                                      table_fingerprint)
+
+logger = logging.getLogger(__name__)
+
+# 偏好综合评价列（来自modified-3.m的Mtotal字段）
+MTOTAL_COLUMNS = [
+    'poi_mtotal', 'svi_mtotal', 'gvi_mtotal', 'vw_mtotal', 'vei_mtotal', 'light_mtotal',
+    'poiden_mtotal', 'slope_mtotal', 'buildng_mtotal', 'ndvi_mtotal', 'winding_mtotal', 'water_mtotal'
+]
+
+# 加载到内存中的路段数值列
+EDGE_VALUE_COLUMNS = ['dis_ori', 'total', 'score'] + MTOTAL_COLUMNS
+
+# 偏好评分的组成列，顺序与PreferenceMode的1-7一一对应（首列为主字段，其余列NULL按0补齐）
+PREFERENCE_COLUMN_GROUPS = [
+    ('total',),                         # 1 综合得分
+    ('water_mtotal',),                  # 2 滨水路线
+    ('ndvi_mtotal', 'gvi_mtotal'),      # 3 绿化路线
+    ('svi_mtotal', 'buildng_mtotal'),   # 4 视野开阔路线
+    ('light_mtotal',),                  # 5 夜间灯光充足路线
+    ('poi_mtotal',),                    # 6 设施便利路线
+    ('slope_mtotal',),                  # 7 坡度平缓路线
+]
+
+# 搜索树沿树累加的属性列：路段数、实际长度、score，以及7种偏好评分（preference_1即total）
+TREE_COLUMNS = ['segments', 'dis_ori', 'score'] + [f'preference_{i}' for i in range(1, len(PREFERENCE_COLUMN_GROUPS) + 1)]
+
+# 搜索树缓存的内存上限（MB）
+TREE_CACHE_MB = float(os.getenv('TREE_CACHE_MB', '256'))
+
+# A*启发式系数不受 代价 / 直线距离 最低的这些路段影响，它们作为例外路段单独处理（见RoadGraph.astar_heuristic）
+ASTAR_EXCEPTION_EDGES = 64
+
+
+def preference_kind(mode_value: int) -> str:
+    """偏好模式（1-7）对应的代价类型名与累加列名"""
+    return f'preference_{mode_value}'
+
+
+@dataclass
+class ShortestPathTree:
+    """单源搜索树（Dijkstra为累计代价，BFS为跳数），不可达节点为inf"""
+    source: int                          # 源节点下标
+    dist: np.ndarray                     # 累计代价/跳数
+    pred_node: np.ndarray                # 前驱节点下标，-1表示无
+    pred_edge: np.ndarray                # 前驱路段下标，-1表示无
+    sums: Optional[np.ndarray] = None    # 沿树累加的TREE_COLUMNS (N, k)，缓存树才有
+
+    def reachable(self) -> np.ndarray:
+        """可达节点掩码"""
+        return np.isfinite(self.dist)
+
+    @property
+    def nbytes(self) -> int:
+        total = self.dist.nbytes + self.pred_node.nbytes + self.pred_edge.nbytes
+        return total + (self.sums.nbytes if self.sums is not None else 0)
+
+
+@dataclass
+class AStarHeuristic:
+    """A*启发式参数：h(v) = scale * 节点v到终点的球面距离（再按例外路段修正）"""
+    scale: float                    # 代价 / 端点球面距离 的下界系数
+    exception_edges: np.ndarray     # 比值低于scale的例外路段下标
+
+
+@dataclass
+class CostMatrix:
+    """scipy最短路使用的代价矩阵：同一有序端点对的平行路段合并为代价最小的一条"""
+    matrix: csr_matrix              # (N, N) 代价矩阵，显式0元素同样是边
+    pair_edges: np.ndarray          # 各矩阵元素对应的路段下标，与RoadGraph._pair_keys一一对应
+
+
+# 有界搜索的约束列 -> 约束代价类型
+BOUND_KINDS = {'dis_ori': 'distance', 'segments': 'hops'}
+
+# 有界搜索判断越界时的相对余量，抵消搜索树float32存储的舍入
+BOUND_SLACK = 1e-6
+
+
+@dataclass
+class SearchBound:
+    """
+    有界搜索：节点沿搜索树累加的约束量（TREE_COLUMNS中的列）加上它到另一端点的约束量超过limit即为越界，
+    越界节点的后代同样越界（三角不等式），越界节点按不可达处理；约束代价树保留的节点结果与完整搜索相同，
+    其余代价类型只在界内节点导出的子图上搜索（见RoadGraph._bounded_search）
+    """
+    column: str                          # 'dis_ori' 或 'segments'
+    limit: float
+    lower: Optional[np.ndarray] = None   # 各节点到另一端点的约束量（椭圆界），None为以源点为中心的圆形界
+    key: Tuple = ()                      # 缓存键（含约束列与上限，椭圆界另含另一端点）
+
+
+class TreeCache:
+    """
+    搜索树缓存，键为(源节点下标, 代价类型)，有界搜索树另附界的缓存键
+    树以float32/int32紧凑存储，按内存上限淘汰最久未使用的树
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._trees: 'OrderedDict[Tuple, ShortestPathTree]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: Tuple) -> Optional[ShortestPathTree]:
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is None:
+                self._stats['misses'] += 1
+                return None
+            self._trees.move_to_end(key)
+            self._stats['hits'] += 1
+            return tree
+
+    def put(self, key: Tuple, tree: ShortestPathTree):
+        if tree.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._trees.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._trees[key] = tree
+            self._bytes += tree.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._trees.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self._stats['evictions'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'trees': len(self._trees), 'bytes': self._bytes, 'max_bytes': self.max_bytes})
+        return stats
+
+
+@dataclass
+class DualSourceResult:
+    """
+    起终点双源搜索结果（对应modified-3.m中的dijkstra_enhanced_dual）
+    每种代价下各保存起点树与终点树（含沿树累加的TREE_COLUMNS），数组均按节点下标
+    """
+    start_trees: Dict[str, ShortestPathTree]  # 代价名 -> 起点搜索树
+    end_trees: Dict[str, ShortestPathTree]    # 代价名 -> 终点搜索树（无终点时为空）
+
+    @property
+    def has_end(self) -> bool:
+        return bool(self.end_trees)
+
+    def cost(self, name: str) -> np.ndarray:
+        """经过各节点的总代价（起点->节点->终点；无终点时为起点->节点）"""
+        dist = self.start_trees[name].dist.astype(np.float64)
+        if self.has_end:
+            dist = dist + self.end_trees[name].dist
+        return dist
+
+    def column(self, name: str, column: str) -> np.ndarray:
+        """经过各节点的路径上某属性列的总和"""
+        k = TREE_COLUMNS.index(column)
+        values = self.start_trees[name].sums[:, k].astype(np.float64)
+        if self.has_end:
+            values = values + self.end_trees[name].sums[:, k]
+        return values
+
+
+class RoadGraph:
+    """无向路网的CSR表示，节点与路段均以数组下标寻址"""
+
+    def __init__(self, node_ids: np.ndarray, node_x: np.ndarray, node_y: np.ndarray,
+                 edge_ids: np.ndarray, edge_source: np.ndarray, edge_target: np.ndarray,
+                 edge_values: Dict[str, np.ndarray]):
+        # 节点按ID排序，便于searchsorted查找下标
+        node_order = np.argsort(node_ids)
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)[node_order]
+        self.node_x = np.asarray(node_x, dtype=np.float64)[node_order]   # 经度
+        self.node_y = np.asarray(node_y, dtype=np.float64)[node_order]   # 纬度
+
+        # 路段按ID排序，并剔除端点不在节点表中的路段
+        edge_ids = np.asarray(edge_ids, dtype=np.int64)
+        src_idx = self.node_indices(np.asarray(edge_source, dtype=np.int64))
+        tgt_idx = self.node_indices(np.asarray(edge_target, dtype=np.int64))
+        valid = (src_idx >= 0) & (tgt_idx >= 0)
+        if not valid.all():
+            logger.warning(f"忽略 {int((~valid).sum())} 条端点不在nodesmodified中的路段")
+        edge_order = np.argsort(edge_ids[valid])
+        self.edge_ids = edge_ids[valid][edge_order]
+        self.edge_source = src_idx[valid][edge_order].astype(np.int32)
+        self.edge_target = tgt_idx[valid][edge_order].astype(np.int32)
+        self.edge_values = {
+            name: np.asarray(values, dtype=np.float64)[valid][edge_order]
+            for name, values in edge_values.items()
+        }
+
+        # 构建无向CSR：每条路段在两个端点的邻接表中各出现一次
+        num_nodes = len(self.node_ids)
+        num_edges = len(self.edge_ids)
+        heads = np.concatenate([self.edge_source, self.edge_target])
+        tails = np.concatenate([self.edge_target, self.edge_source])
+        edge_refs = np.concatenate([np.arange(num_edges), np.arange(num_edges)])
+        order = np.argsort(heads, kind='stable')
+        self.indices = tails[order].astype(np.int32)
+        self.adj_edges = edge_refs[order].astype(np.int32)
+        self.indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=num_nodes), out=self.indptr[1:])
+
+        # scipy代价矩阵的拓扑：邻接项按 (起点, 终点, 路段下标) 排序，同一有序端点对为一组，
+        # 每组在矩阵中占一个元素（行主序），各代价类型只需按组取最小代价（见cost_matrix）
+        pair_keys = heads.astype(np.int64) * num_nodes + tails
+        pair_order = np.lexsort((edge_refs, pair_keys))
+        sorted_keys = pair_keys[pair_order]
+        first = np.ones(len(sorted_keys), dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        self._pair_refs = edge_refs[pair_order]
+        self._pair_starts = np.flatnonzero(first)
+        self._pair_keys = sorted_keys[self._pair_starts]
+        self._pair_indices = (self._pair_keys % max(num_nodes, 1)).astype(np.int32)
+        self._pair_indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._pair_keys // max(num_nodes, 1), minlength=num_nodes), out=self._pair_indptr[1:])
+        # 代价矩阵按代价类型缓存，见cost_matrix
+        self._cost_matrices: Dict[str, CostMatrix] = {}
+
+        # 最近节点索引，用于起终点与轨迹点吸附
+        self.snapper = NodeSnapper(self.node_ids, self.node_x, self.node_y)
+
+        # 预计算各偏好模式的评分与代价表 (7, E)，请求时按下标取行
+        self.preference_values, self.preference_costs = self._build_preference_tables()
+        # 沿搜索树累加的路段属性 (E, len(TREE_COLUMNS))
+        self.tree_values = np.column_stack([
+            np.ones(num_edges), self.edge_column('dis_ori'), self.edge_column('score'), self.preference_values.T
+        ])
+        # 搜索树缓存随路网实例存在，路网重新加载即全部失效
+        self.tree_cache = TreeCache(int(TREE_CACHE_MB * 1024 * 1024))
+        # 收缩层次按代价类型首次使用时从CONTRACTION_DIR读取，None表示没有可用的预处理文件
+        self.hierarchies: Dict[str, Optional[ContractionHierarchy]] = {}
+        self._hierarchy_lock = threading.Lock()
+        # 推荐约束值表首次使用时从RECOMMENDATION_TABLE读取（见recommendation_table.py）
+        self._recommendation_table: Optional[RecommendationTable] = None
+        self._recommendation_table_loaded = False
+        # A*启发式参数（按代价类型缓存），见astar_heuristic
+        self._astar_heuristics: Dict[str, AStarHeuristic] = {}
+        self._node_lat_list = np.radians(self.node_y).tolist()
+        self._node_lon_list = np.radians(self.node_x).tolist()
+
+        # A*主循环使用Python列表访问更快
+        self._indptr_list = self.indptr.tolist()
+        self._indices_list = self.indices.tolist()
+        self._adj_edges_list = self.adj_edges.tolist()
+
+        logger.info(f"内存路网加载完成: {num_nodes} 个节点, {num_edges} 条路段")
+
+    @classmethod
+    def from_cursor(cls, cursor) -> 'RoadGraph':
+        """从数据库读取nodesmodified与edgesmodified构建路网"""
+        cursor.execute("SELECT id, x, y FROM nodesmodified;")
+        nodes = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+
+        cursor.execute(
+            "SELECT id, source, target, " + ", ".join(EDGE_VALUE_COLUMNS) +
+            " FROM edgesmodified WHERE source IS NOT NULL AND target IS NOT NULL;"
+        )
+        # NULL值转换为NaN，由调用方决定如何填充
+        edges = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3 + len(EDGE_VALUE_COLUMNS))
+        if len(nodes) == 0 or len(edges) == 0:
+            raise ValueError("nodesmodified或edgesmodified表为空，无法构建内存路网")
+
+        return cls(
+            node_ids=nodes[:, 0].astype(np.int64),
+            node_x=nodes[:, 1],
+            node_y=nodes[:, 2],
+            edge_ids=edges[:, 0].astype(np.int64),
+            edge_source=edges[:, 1].astype(np.int64),
+            edge_target=edges[:, 2].astype(np.int64),
+            edge_values={name: edges[:, 3 + i] for i, name in enumerate(EDGE_VALUE_COLUMNS)}
+        )
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'RoadGraph':
+        """
+        直接由路网CSV（如res/road_modified.csv）构建路网，用于离线计算与基准测试，不需要数据库
+        节点按startX/startY、endX/endY去重生成（与routeplanning_db_init.py生成nodesmodified的方式一致），
+        路段ID为行号（从1开始）；CSV中缺少的数值列按NULL处理
+        """
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            header = [name.strip().lower() for name in f.readline().split(',')]
+            data = np.loadtxt(f, delimiter=',', ndmin=2)
+        column = {name: data[:, i] for i, name in enumerate(header)}
+
+        start = np.column_stack([column['startx'], column['starty']])
+        end = np.column_stack([column['endx'], column['endy']])
+        points, inverse = np.unique(np.vstack([start, end]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        node_ids = np.arange(1, len(points) + 1)
+        missing = [name for name in EDGE_VALUE_COLUMNS if name not in column]
+        if missing:
+            logger.warning(f"CSV中缺少列 {missing}，按NULL处理")
+
+        num_edges = len(data)
+        return cls(
+            node_ids=node_ids,
+            node_x=points[:, 0],
+            node_y=points[:, 1],
+            edge_ids=np.arange(1, num_edges + 1),
+            edge_source=node_ids[inverse[:num_edges]],
+            edge_target=node_ids[inverse[num_edges:]],
+            edge_values={name: column.get(name, np.full(num_edges, np.nan)) for name in EDGE_VALUE_COLUMNS}
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.edge_ids)
+
+    def node_indices(self, ids: np.ndarray) -> np.ndarray:
+        """节点ID数组转下标数组，不存在的ID返回-1"""
+        pos = np.searchsorted(self.node_ids, ids)
+        pos = np.clip(pos, 0, max(len(self.node_ids) - 1, 0))
+        found = self.node_ids[pos] == ids
+        return np.where(found, pos, -1)
+
+    def node_index(self, node_id: int) -> int:
+        """节点ID转下标"""
+        idx = int(self.node_indices(np.array([node_id], dtype=np.int64))[0])
+        if idx < 0:
+            raise ValueError(f"节点 {node_id} 不在路网中")
+        return idx
+
+    def edge_column(self, name: str) -> np.ndarray:
+        """获取路段数值列，NULL按0处理（与SQL中sum忽略NULL一致）"""
+        return np.nan_to_num(self.edge_values[name], nan=0.0)
+
+    def _build_preference_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        生成偏好评分表与偏好代价表
+        代价为 dis_ori / preference，偏好非正（或为NULL）时为 dis_ori * 10
+        """
+        missing = np.full(self.num_edges, np.nan)
+        values = np.empty((len(PREFERENCE_COLUMN_GROUPS), self.num_edges), dtype=np.float64)
+        for i, columns in enumerate(PREFERENCE_COLUMN_GROUPS):
+            row = self.edge_values.get(columns[0], missing).copy()
+            for column in columns[1:]:
+                row += np.nan_to_num(self.edge_values.get(column, missing), nan=0.0)
+            values[i] = np.nan_to_num(row, nan=0.0)
+
+        dis_ori = self.edge_column('dis_ori')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            costs = np.where(values > 0, dis_ori / values, dis_ori * 10)
+        return values, costs
+
+    def build_cost_matrix(self, weights: np.ndarray) -> CostMatrix:
+        """由每条路段的代价生成scipy代价矩阵，平行路段取代价最小者（代价相同时取下标最小者）"""
+        cost = np.nan_to_num(np.asarray(weights, dtype=np.float64), nan=0.0)[self._pair_refs]
+        if cost.size == 0:
+            data, pair_edges = np.zeros(0), np.zeros(0, dtype=np.int64)
+        else:
+            data = np.minimum.reduceat(cost, self._pair_starts)
+            sizes = np.diff(np.append(self._pair_starts, cost.size))
+            positions = np.where(cost == np.repeat(data, sizes), np.arange(cost.size), cost.size)
+            pair_edges = self._pair_refs[np.minimum.reduceat(positions, self._pair_starts)]
+        matrix = csr_matrix((data, self._pair_indices, self._pair_indptr), shape=(self.num_nodes, self.num_nodes))
+        return CostMatrix(matrix=matrix, pair_edges=pair_edges)
+
+    def cost_matrix(self, kind: str) -> CostMatrix:
+        """代价类型对应的scipy代价矩阵（首次使用时生成并缓存），'hops'为单位代价"""
+        matrix = self._cost_matrices.get(kind)
+        if matrix is None:
+            matrix = self._cost_matrices[kind] = self.build_cost_matrix(self.contraction_weights(kind))
+        return matrix
+
+    def _submatrix(self, matrix: csr_matrix, nodes: np.ndarray) -> csr_matrix:
+        """代价矩阵在节点集合（升序下标）上的导出子矩阵，保留显式0元素"""
+        position = np.full(self.num_nodes, -1, dtype=np.int64)
+        position[nodes] = np.arange(len(nodes))
+        starts, counts = matrix.indptr[nodes], np.diff(matrix.indptr)[nodes]
+        entries = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        columns = position[matrix.indices[entries]]
+        kept = columns >= 0
+        rows = np.repeat(np.arange(len(nodes)), counts)[kept]
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(nodes)), out=indptr[1:])
+        return csr_matrix((matrix.data[entries[kept]], columns[kept], indptr), shape=(len(nodes), len(nodes)))
+
+    def dijkstra(self, source: int, weights: Union[np.ndarray, CostMatrix], limit: Optional[float] = None,
+                 nodes: Optional[np.ndarray] = None) -> ShortestPathTree:
+        """
+        单源Dijkstra（无向图），由scipy.sparse.csgraph.dijkstra在代价矩阵上完成
+        Args:
+            source: 源节点下标
+            weights: 每条路段的非负代价，或已生成的CostMatrix（见cost_matrix）
+            limit: 可选，累计代价超过limit的节点不再扩展，结果为inf
+            nodes: 可选，只在这些节点（升序下标，须含源节点）导出的子图上搜索，其余节点为inf
+        """
+        matrix = weights if isinstance(weights, CostMatrix) else self.build_cost_matrix(weights)
+        limit = np.inf if limit is None else limit
+        if nodes is None:
+            dist, pred = csgraph_dijkstra(matrix.matrix, directed=True, indices=source, return_predecessors=True,
+                                          limit=limit)
+        else:
+            sub_dist, sub_pred = csgraph_dijkstra(self._submatrix(matrix.matrix, nodes), directed=True,
+                                                  indices=int(np.searchsorted(nodes, source)),
+                                                  return_predecessors=True, limit=limit)
+            dist = np.full(self.num_nodes, np.inf)
+            dist[nodes] = sub_dist
+            pred = np.full(self.num_nodes, -1, dtype=np.int64)
+            pred[nodes] = np.where(sub_pred >= 0, nodes[np.maximum(sub_pred, 0)], -1)
+        # scipy以-9999表示无前驱；前驱路段由 (前驱节点, 节点) 在代价矩阵中的元素确定
+        pred_node = np.where(pred >= 0, pred, -1).astype(np.int64)
+        pred_edge = np.full(self.num_nodes, -1, dtype=np.int64)
+        reached = np.flatnonzero(pred_node >= 0)
+        keys = pred_node[reached] * self.num_nodes + reached
+        pred_edge[reached] = matrix.pair_edges[np.searchsorted(self._pair_keys, keys)]
+        return ShortestPathTree(source=source, dist=dist, pred_node=pred_node, pred_edge=pred_edge)
+
+    def astar_heuristic(self, kind: str) -> AStarHeuristic:
+        """
+        代价类型对应的A*启发式参数（首次使用时计算并缓存）
+        系数取各路段 代价 / 端点球面距离 中第ASTAR_EXCEPTION_EDGES小的值（偏好代价 dis_ori / 偏好 时约为 1 / 最大偏好值），
+        比值更低的少数路段（坐标与长度不符的异常数据，或偏好极高的路段）作为例外路段单独处理，不拉低整体系数
+        """
+        heuristic = self._astar_heuristics.get(kind)
+        if heuristic is None:
+            straight = haversine_distance(self.node_y[self.edge_source], self.node_x[self.edge_source],
+                                          self.node_y[self.edge_target], self.node_x[self.edge_target])
+            weights = self.contraction_weights(kind)
+            positive = np.flatnonzero(straight > 0)
+            ratio = weights[positive] / straight[positive]
+            if positive.size > ASTAR_EXCEPTION_EDGES:
+                scale = max(float(np.partition(ratio, ASTAR_EXCEPTION_EDGES)[ASTAR_EXCEPTION_EDGES]), 0.0)
+                exceptions = positive[ratio < scale]
+            else:
+                scale, exceptions = 0.0, np.zeros(0, dtype=np.int64)
+            heuristic = self._astar_heuristics[kind] = AStarHeuristic(scale=scale, exception_edges=exceptions)
+        return heuristic
+
+    def astar_offset(self, target: int, heuristic: AStarHeuristic, weights: np.ndarray) -> float:
+        """
+        例外路段对启发式的修正量：h(v) = max(0, 系数 * 球面距离(v, 终点) - 修正量)
+        在“例外路段端点 + 终点”组成的小图上（两点间代价下界为系数乘以球面距离，例外路段取其实际代价）
+        求各端点到终点的代价下界LB(x)，修正量为 max(系数 * 球面距离(x, 终点) - LB(x))，保证启发式可采纳
+        """
+        exceptions = heuristic.exception_edges
+        if exceptions.size == 0 or heuristic.scale <= 0:
+            return 0.0
+        ends = np.unique(np.concatenate([self.edge_source[exceptions], self.edge_target[exceptions]]))
+        points = np.append(ends, target)
+        lat, lon = self.node_y[points], self.node_x[points]
+        bound = heuristic.scale * haversine_distance(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+        straight = bound[:, -1].copy()
+
+        a = np.searchsorted(ends, self.edge_source[exceptions])
+        b = np.searchsorted(ends, self.edge_target[exceptions])
+        cost = np.asarray(weights, dtype=np.float64)[exceptions]
+        np.minimum.at(bound, (a, b), cost)
+        np.minimum.at(bound, (b, a), cost)
+
+        # Bellman-Ford：小图上到终点的代价下界
+        lower = straight.copy()
+        for _ in range(len(points)):
+            relaxed = np.minimum(lower, (bound + lower[None, :]).min(axis=1))
+            if np.array_equal(relaxed, lower):
+                break
+            lower = relaxed
+        return max(0.0, float((straight - lower).max()))
+
+    def astar(self, source: int, target: int, weights: np.ndarray,
+              heuristic: AStarHeuristic) -> Tuple[ShortestPathTree, int]:
+        """
+        点到点A*（无向图），启发式为 系数 * 到终点的球面距离 - 例外路段修正量（见astar_heuristic）
+        例外路段附近启发式可能不一致，节点允许重新展开，终点首次出堆即为最短路径
+        Returns:
+            (只含已访问节点的搜索树, 扩展节点数)
+        """
+        indptr = self._indptr_list
+        indices = self._indices_list
+        adj_edges = self._adj_edges_list
+        lats, lons = self._node_lat_list, self._node_lon_list
+        cost = np.nan_to_num(np.asarray(weights, dtype=np.float64), nan=0.0).tolist()
+        target_lat, target_lon = lats[target], lons[target]
+        cos_target = math.cos(target_lat)
+        factor = 2 * EARTH_RADIUS * heuristic.scale
+        offset = self.astar_offset(target, heuristic, weights)
+
+        def estimate(v: int) -> float:
+            a = (math.sin((target_lat - lats[v]) / 2) ** 2
+                 + math.cos(lats[v]) * cos_target * math.sin((target_lon - lons[v]) / 2) ** 2)
+            return max(factor * math.asin(math.sqrt(min(a, 1.0))) - offset, 0.0)
+
+        dist = {source: 0.0}
+        pred_node = {source: -1}
+        pred_edge = {source: -1}
+        expanded = 0
+        heap = [(estimate(source), 0.0, source)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            expanded += 1
+            if u == target:
+                break
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                e = adj_edges[k]
+                nd = d + cost[e]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    pred_node[v] = u
+                    pred_edge[v] = e
+                    heapq.heappush(heap, (nd + estimate(v), nd, v))
+
+        visited = np.fromiter(dist.keys(), dtype=np.int64, count=len(dist))
+        tree = ShortestPathTree(
+            source=source,
+            dist=np.full(self.num_nodes, np.inf),
+            pred_node=np.full(self.num_nodes, -1, dtype=np.int64),
+            pred_edge=np.full(self.num_nodes, -1, dtype=np.int64)
+        )
+        tree.dist[visited] = np.fromiter(dist.values(), dtype=np.float64, count=len(dist))
+        tree.pred_node[visited] = np.fromiter(pred_node.values(), dtype=np.int64, count=len(dist))
+        tree.pred_edge[visited] = np.fromiter(pred_edge.values(), dtype=np.int64, count=len(dist))
+        return tree, expanded
+
+    def bfs(self, source: int, max_hops: Optional[int] = None) -> ShortestPathTree:
+        """按层向量化的BFS，dist为最少路段数（跳数）"""
+        hops = np.full(self.num_nodes, np.inf)
+        pred_node = np.full(self.num_nodes, -1, dtype=np.int64)
+        pred_edge = np.full(self.num_nodes, -1, dtype=np.int64)
+        hops[source] = 0
+        frontier = np.array([source], dtype=np.int64)
+        level = 0
+
+        while frontier.size and (max_hops is None or level < max_hops):
+            starts = self.indptr[frontier]
+            counts = self.indptr[frontier + 1] - starts
+            total = int(counts.sum())
+            if total == 0:
+                break
+            # 展开当前层所有邻接位置
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            neighbors = self.indices[offsets]
+            fresh = np.isinf(hops[neighbors])
+            if not fresh.any():
+                break
+            neighbors = neighbors[fresh]
+            edges = self.adj_edges[offsets][fresh]
+            parents = np.repeat(frontier, counts)[fresh]
+
+            frontier, first = np.unique(neighbors, return_index=True)
+            level += 1
+            hops[frontier] = level
+            pred_node[frontier] = parents[first]
+            pred_edge[frontier] = edges[first]
+
+        return ShortestPathTree(source=source, dist=hops, pred_node=pred_node, pred_edge=pred_edge)
+
+    def accumulate(self, tree: ShortestPathTree, values: np.ndarray) -> np.ndarray:
+        """
+        沿搜索树累加路段属性（指针倍增，O(N log depth)全向量化）
+        Args:
+            values: 形状为(E,)或(E, k)的路段属性
+        Returns:
+            每个节点从源点出发的累加值，不可达节点为0
+        """
+        values = np.asarray(values, dtype=np.float64)
+        has_pred = tree.pred_edge >= 0
+        acc = np.zeros((self.num_nodes,) + values.shape[1:], dtype=np.float64)
+        acc[has_pred] = values[tree.pred_edge[has_pred]]
+        ancestor = tree.pred_node.copy()
+        while True:
+            active = ancestor >= 0
+            if not active.any():
+                break
+            acc[active] = acc[active] + acc[ancestor[active]]
+            ancestor[active] = ancestor[ancestor[active]]
+        return acc
+
+    def lowest_common_ancestors(self, tree: ShortestPathTree, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """
+        搜索树上节点对的最近公共祖先（倍增法，全向量化），a、b须为可达节点下标
+        """
+        if tree.sums is not None:
+            depth = np.rint(tree.sums[:, TREE_COLUMNS.index('segments')]).astype(np.int64)
+        else:
+            depth = np.rint(self.accumulate(tree, np.ones(self.num_edges))).astype(np.int64)
+        # 根节点（及不可达节点）的父节点指向自身，倍增时停在根上
+        parent = np.where(tree.pred_node >= 0, tree.pred_node, np.arange(self.num_nodes)).astype(np.int64)
+
+        a = np.array(a, dtype=np.int64)
+        b = np.array(b, dtype=np.int64)
+        swap = depth[a] < depth[b]
+        a[swap], b[swap] = b[swap], a[swap]
+        max_depth = int(depth[a].max()) if a.size else 0
+        up = [parent]
+        while len(up) < max(1, max_depth.bit_length()):
+            up.append(up[-1][up[-1]])
+
+        # 先把较深的节点提升到同一深度，再同步向上跳到公共祖先之下
+        diff = depth[a] - depth[b]
+        for j, table in enumerate(up):
+            lift = ((diff >> j) & 1).astype(bool)
+            a[lift] = table[a[lift]]
+        for table in reversed(up):
+            differ = table[a] != table[b]
+            a[differ] = table[a[differ]]
+            b[differ] = table[b[differ]]
+        return np.where(a == b, a, parent[a])
+
+    def cost_weights(self, kind: str) -> Optional[np.ndarray]:
+        """
+        代价类型对应的路段代价
+        'distance' 为dis_ori，'hops' 为单位代价（返回None，使用BFS），'preference_k' 为偏好模式k的偏好代价
+        """
+        if kind == 'distance':
+            return self.edge_column('dis_ori')
+        if kind == 'hops':
+            return None
+        if kind.startswith('preference_'):
+            return self.preference_costs[int(kind[len('preference_'):]) - 1]
+        raise ValueError(f"未知的代价类型: {kind}")
+
+    def contraction_weights(self, kind: str) -> np.ndarray:
+        """收缩层次使用的路段代价（'hops'为全1）"""
+        weights = self.cost_weights(kind)
+        return np.ones(self.num_edges) if weights is None else weights
+
+    def contraction_hierarchy(self, kind: str) -> Optional[ContractionHierarchy]:
+        """代价类型对应的收缩层次（见contraction.py），未预处理或与路网不一致时为None"""
+        if kind not in self.hierarchies:
+            with self._hierarchy_lock:
+                if kind not in self.hierarchies:
+                    fingerprint = graph_fingerprint(self.edge_source, self.edge_target,
+                                                    self.contraction_weights(kind))
+                    self.hierarchies[kind] = load_hierarchy(CONTRACTION_DIR, kind, fingerprint)
+        return self.hierarchies[kind]
+
+    def recommendation_table(self) -> Optional[RecommendationTable]:
+        """无终点模式的推荐约束值表，未预处理或与路网不一致时为None"""
+        if not self._recommendation_table_loaded:
+            with self._hierarchy_lock:
+                if not self._recommendation_table_loaded:
+                    self._recommendation_table = load_recommendation_table(RECOMMENDATION_TABLE,
+                                                                           table_fingerprint(self))
+                    self._recommendation_table_loaded = True
+        return self._recommendation_table
+
+    def point_to_point(self, source: int, target: int, kind: str) -> Tuple[List[int], List[int], int]:
+        """
+        点到点最短路径，返回 (节点下标序列, 路段下标序列, 扩展节点数)
+        依次使用：双向CH搜索（有预处理文件时）、已缓存的源点搜索树（扩展数记为0）、按球面距离启发的A*
+        """
+        hierarchy = self.contraction_hierarchy(kind)
+        if hierarchy is not None:
+            cost, nodes, edges, expanded = hierarchy.query(source, target)
+            if not np.isfinite(cost):
+                raise ValueError("起点到终点无可达路径")
+            return nodes, edges, expanded
+
+        tree = self.tree_cache.get((source, kind))
+        if tree is not None:
+            return (*self.path(tree, target), 0)
+        tree, expanded = self.astar(source, target, self.contraction_weights(kind), self.astar_heuristic(kind))
+        return (*self.path(tree, target), expanded)
+
+    def shortest_path_tree(self, source: int, kind: str, bound: Optional[SearchBound] = None) -> ShortestPathTree:
+        """
+        获取源节点在指定代价类型下的搜索树（含沿树累加列），优先从缓存读取
+        同一起点的不同目标值、容差与权重请求复用同一棵树；有界搜索时已缓存的完整搜索树同样可用
+        """
+        key = (source, kind)
+        tree = self.tree_cache.get(key)
+        if tree is not None:
+            return tree
+        if bound is None:
+            tree = self.bfs(source) if kind == 'hops' else self.dijkstra(source, self.cost_matrix(kind))
+            sums = self.accumulate(tree, self.tree_values)
+        else:
+            key = (source, kind, bound.key)
+            tree = self.tree_cache.get(key)
+            if tree is not None:
+                return tree
+            tree, sums = self._bounded_search(source, kind, bound)
+
+        tree = ShortestPathTree(
+            source=source,
+            dist=tree.dist.astype(np.float32),
+            pred_node=tree.pred_node.astype(np.int32),
+            pred_edge=tree.pred_edge.astype(np.int32),
+            sums=sums.astype(np.float32)
+        )
+        self.tree_cache.put(key, tree)
+        return tree
+
+    def _bounded_search(self, source: int, kind: str, bound: SearchBound) -> Tuple[ShortestPathTree, np.ndarray]:
+        """
+        有界搜索树及沿树累加列
+        约束代价的圆形界直接按上限停止（Dijkstra的limit / BFS的层数上限）；其余情况先取源点约束代价的圆形搜索树，
+        得到界内节点（圆或椭圆），合法路线经过的节点都在界内（三角不等式），Dijkstra只在界内节点导出的子图上搜索，
+        BFS以界内节点沿该树路径的路段数最大值为层数上限；最后把沿树约束量（加另一端点的约束量）越界的节点置为不可达
+        """
+        limit = bound.limit * (1 + BOUND_SLACK) + BOUND_SLACK
+        constraint_kind = BOUND_KINDS[bound.column]
+        if kind == constraint_kind and bound.lower is None:
+            if kind == 'hops':
+                tree = self.bfs(source, int(np.floor(bound.limit)))
+            else:
+                tree = self.dijkstra(source, self.cost_matrix(kind), limit)
+            return tree, self.accumulate(tree, self.tree_values)
+
+        circle = SearchBound(bound.column, bound.limit, key=('radius', bound.column, bound.limit))
+        region = self.shortest_path_tree(source, constraint_kind, circle)
+        lower = bound.lower if bound.lower is not None else 0.0
+        inside = region.dist.astype(np.float64) + lower <= limit
+        if kind == constraint_kind:
+            tree, sums = region, region.sums.astype(np.float64)
+        elif kind == 'hops':
+            reach = region.sums[inside, TREE_COLUMNS.index('segments')].max(initial=0.0)
+            tree = self.bfs(source, int(np.rint(reach)))
+            sums = self.accumulate(tree, self.tree_values)
+        else:
+            inside[source] = True
+            tree = self.dijkstra(source, self.cost_matrix(kind), nodes=np.flatnonzero(inside))
+            sums = self.accumulate(tree, self.tree_values)
+
+        # 越界节点的后代同样越界，置为不可达后保留的节点仍构成完整的树
+        outside = sums[:, TREE_COLUMNS.index(bound.column)] + lower > limit
+        outside |= ~np.isfinite(tree.dist)
+        sums = np.where(outside[:, None], 0.0, sums)
+        return ShortestPathTree(
+            source=source,
+            dist=np.where(outside, np.inf, tree.dist),
+            pred_node=np.where(outside, -1, tree.pred_node),
+            pred_edge=np.where(outside, -1, tree.pred_edge)
+        ), sums
+
+    def dual_source_search(self, start: int, end: Optional[int], kinds: Dict[str, str],
+                           limit: Optional[Tuple[str, float]] = None) -> DualSourceResult:
+        """
+        获取起点（及终点）在多种代价下的搜索树
+        Args:
+            start: 起点下标
+            end: 终点下标，None表示无终点模式
+            kinds: 代价名 -> 代价类型（见cost_weights）
+            limit: 可选，(约束列, 上限)：所有搜索树只保留经过节点的约束量不超过上限的范围。
+                   无终点时为以起点为中心的圆；有终点时先求起终点的约束代价树（圆），
+                   各搜索树再以另一端点的约束代价为下界，即以起终点为焦点的椭圆
+        """
+        if limit is None:
+            start_trees = {name: self.shortest_path_tree(start, kind) for name, kind in kinds.items()}
+            end_trees = {} if end is None else {name: self.shortest_path_tree(end, kind)
+                                                for name, kind in kinds.items()}
+            return DualSourceResult(start_trees=start_trees, end_trees=end_trees)
+
+        column, value = limit
+        circle = SearchBound(column, value, key=('radius', column, value))
+        if end is None:
+            return DualSourceResult(start_trees={name: self.shortest_path_tree(start, kind, circle)
+                                                 for name, kind in kinds.items()}, end_trees={})
+
+        constraint_kind = BOUND_KINDS[column]
+        start_circle = self.shortest_path_tree(start, constraint_kind, circle)
+        end_circle = self.shortest_path_tree(end, constraint_kind, circle)
+        start_bound = SearchBound(column, value, lower=end_circle.dist, key=('ellipse', column, end, value))
+        end_bound = SearchBound(column, value, lower=start_circle.dist, key=('ellipse', column, start, value))
+        start_trees = {name: self.shortest_path_tree(start, kind, start_bound) for name, kind in kinds.items()}
+        end_trees = {name: self.shortest_path_tree(end, kind, end_bound) for name, kind in kinds.items()}
+        return DualSourceResult(start_trees=start_trees, end_trees=end_trees)
+
+    def path(self, tree: ShortestPathTree, target: int) -> Tuple[List[int], List[int]]:
+        """由前驱数组回溯源点到目标点的节点下标序列与路段下标序列"""
+        if not np.isfinite(tree.dist[target]):
+            raise ValueError("起点到终点无可达路径")
+        nodes = [target]
+        edges = []
+        node = target
+        while node != tree.source:
+            edges.append(int(tree.pred_edge[node]))
+            node = int(tree.pred_node[node])
+            nodes.append(node)
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+    def path_via(self, start_tree: ShortestPathTree, end_tree: Optional[ShortestPathTree],
+                 via: int) -> Tuple[List[int], List[int]]:
+        """起点树回溯到途经点，再沿终点树回溯到终点；end_tree为None时只返回起点到途经点"""
+        nodes, edges = self.path(start_tree, via)
+        if end_tree is not None:
+            back_nodes, back_edges = self.path(end_tree, via)
+            nodes.extend(reversed(back_nodes[:-1]))
+            edges.extend(reversed(back_edges))
+        return nodes, edges
+
+    def loop_path(self, tree: ShortestPathTree, edge: int) -> Tuple[List[int], List[int]]:
+        """起点树回溯到路段一端，经该路段到另一端，再沿起点树回到起点，组成闭合环线"""
+        nodes, edges = self.path(tree, int(self.edge_source[edge]))
+        back_nodes, back_edges = self.path(tree, int(self.edge_target[edge]))
+        nodes.extend(reversed(back_nodes))
+        edges.append(int(edge))
+        edges.extend(reversed(back_edges))
+        return nodes, edges
+
+
+# 进程级常驻路网（首次使用时从数据库加载）
+_road_graph: Optional[RoadGraph] = None
+_road_graph_lock = threading.Lock()
+# 路网重新加载后需要失效的依赖（如结果缓存），由上层模块注册
+_reload_listeners: List[Callable[[], None]] = []
+
+
+def add_reload_listener(listener: Callable[[], None]):
+    """注册路网重新加载后的回调"""
+    if listener not in _reload_listeners:
+        _reload_listeners.append(listener)
+
+
+def get_road_graph(cursor) -> RoadGraph:
+    """获取进程内常驻路网，首次调用时从数据库构建"""
+    global _road_graph
+    if _road_graph is None:
+        with _road_graph_lock:
+            if _road_graph is None:
+                _road_graph = RoadGraph.from_cursor(cursor)
+    return _road_graph
+
+
+def reload_road_graph(cursor) -> RoadGraph:
+    """edgesmodified更新后重新加载常驻路网"""
+    global _road_graph
+    with _road_graph_lock:
+        _road_graph = RoadGraph.from_cursor(cursor)
+    for listener in _reload_listeners:
+        listener()
+    return _road_graph
@@ -0,0 +1,122 @@
+# 路网节点吸附（最近节点查找）
+# 将nodesmodified的x/y常驻内存建立KD树，批量吸附起终点与GPS轨迹点，不再逐点查询数据库
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # 未安装scipy时退化为NumPy分块暴力搜索
+    cKDTree = None
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371008.8  # 地球平均半径（米）
+
+# NumPy回退方案每块计算的 查询点数 x 节点数 上限，控制临时内存
+_BRUTE_FORCE_BLOCK = 4_000_000
+
+
+def haversine_distance(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """球面距离（米），支持数组广播"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class NodeSnapper:
+    """
+    最近路网节点索引
+    与数据库中 geom <-> ST_MakePoint(lon, lat) 一致，按经纬度平面距离选取最近节点
+    """
+
+    def __init__(self, node_ids: np.ndarray, node_x: np.ndarray, node_y: np.ndarray):
+        if len(node_ids) == 0:
+            raise ValueError("未找到任何路网节点，请检查nodesmodified表是否有数据")
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.node_x = np.asarray(node_x, dtype=np.float64)
+        self.node_y = np.asarray(node_y, dtype=np.float64)
+        self._tree = cKDTree(np.column_stack([self.node_x, self.node_y])) if cKDTree is not None else None
+        self._id_order = np.argsort(self.node_ids)
+
+    @classmethod
+    def from_cursor(cls, cursor) -> 'NodeSnapper':
+        """从数据库读取nodesmodified构建索引"""
+        cursor.execute("SELECT id, x, y FROM nodesmodified;")
+        nodes = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+        return cls(nodes[:, 0].astype(np.int64), nodes[:, 1], nodes[:, 2])
+
+    def nearest_indices(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """查询点对应的最近节点下标"""
+        if self._tree is not None:
+            _, idx = self._tree.query(np.column_stack([lons, lats]))
+            return np.asarray(idx, dtype=np.int64)
+
+        idx = np.empty(len(lats), dtype=np.int64)
+        step = max(1, _BRUTE_FORCE_BLOCK // len(self.node_ids))
+        for i in range(0, len(lats), step):
+            dx = self.node_x[None, :] - lons[i:i + step, None]
+            dy = self.node_y[None, :] - lats[i:i + step, None]
+            idx[i:i + step] = np.argmin(dx * dx + dy * dy, axis=1)
+        return idx
+
+    def snap_points(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量吸附到最近路网节点
+        Args:
+            lats: 纬度数组
+            lons: 经度数组
+        Returns:
+            (节点ID数组, 查询点到节点的距离数组（米）)
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        if lats.shape != lons.shape:
+            raise ValueError("纬度与经度数组长度不一致")
+        if len(lats) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        idx = self.nearest_indices(lats, lons)
+        dists = haversine_distance(lats, lons, self.node_y[idx], self.node_x[idx])
+        return self.node_ids[idx], dists
+
+    def snap_point(self, lat: float, lon: float) -> Tuple[int, float, float]:
+        """单点吸附，返回(节点ID, 节点纬度, 节点经度)"""
+        idx = int(self.nearest_indices(np.array([lat]), np.array([lon]))[0])
+        return int(self.node_ids[idx]), float(self.node_y[idx]), float(self.node_x[idx])
+
+    def node_coordinates(self, node_ids) -> List[Tuple[float, float]]:
+        """节点ID序列对应的(经度, 纬度)列表，数据库引擎回溯路径坐标时使用"""
+        ids = np.asarray(node_ids, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.node_ids, ids, sorter=self._id_order), 0, len(self.node_ids) - 1)
+        idx = self._id_order[pos]
+        missing = ids[self.node_ids[idx] != ids]
+        if missing.size:
+            raise ValueError(f"节点 {int(missing[0])} 不在路网中")
+        return list(zip(self.node_x[idx].tolist(), self.node_y[idx].tolist()))
+
+
+# 进程级常驻索引（数据库引擎使用；内存引擎直接复用路网自带的索引）
+_node_snapper: Optional[NodeSnapper] = None
+_node_snapper_lock = threading.Lock()
+
+
+def get_node_snapper(cursor) -> NodeSnapper:
+    """获取进程内常驻节点索引，首次调用时从数据库构建"""
+    global _node_snapper
+    if _node_snapper is None:
+        with _node_snapper_lock:
+            if _node_snapper is None:
+                _node_snapper = NodeSnapper.from_cursor(cursor)
+                logger.info(f"节点索引构建完成: {len(_node_snapper.node_ids)} 个节点")
+    return _node_snapper
+
+
+def reload_node_snapper(cursor) -> NodeSnapper:
+    """nodesmodified更新后重新构建节点索引"""
+    global _node_snapper
+    with _node_snapper_lock:
+        _node_snapper = NodeSnapper.from_cursor(cursor)
+    return _node_snapper
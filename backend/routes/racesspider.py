@@ -1,5 +1,5 @@
 # 本代码实现马拉松赛事信息爬虫
-# 请在修改12-19行代码为自己数据库信息，第29行代码需要修改为自己的config.yaml路径.第183行代码改为自己temp文件夹路径
+# 数据库信息请在db_pool.py中修改，第29行代码需要修改为自己的config.yaml路径.第183行代码改为自己temp文件夹路径
 import os
 import time
 import yaml
@@ -8,15 +8,7 @@ from flask import Blueprint, jsonify, request
 import requests
 import csv
 import psycopg2
-
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'joy_run_db',
-    'user': 'postgres',
-    # 'password': 'postgres1'
-    'password': 'zzq12'
-}
+from routes.db_pool import get_connection
 
 race_bp = Blueprint('race', __name__)
 
@@ -42,8 +34,12 @@ def insert_new_races_from_csv(csv_file):
 
     csv_race_ids = set(row['raceId'] for row in csv_races)
 
+    with get_connection() as conn:
+        insert_races(conn, csv_races, csv_race_ids)
+
+def insert_races(conn, csv_races, csv_race_ids):
+    """将数据库中尚不存在的赛事写入race表"""
     # 2. 查询数据库已有raceId
-    conn = psycopg2.connect(**DB_CONFIG)
     cur = conn.cursor()
     cur.execute("SELECT raceId FROM race")
     db_race_ids = set(str(row[0]) for row in cur.fetchall())
@@ -53,7 +49,6 @@ def insert_new_races_from_csv(csv_file):
     if not new_race_ids:
         print("数据库无新增赛事，无需插入。")
         cur.close()
-        conn.close()
         return
 
     # 4. 插入新增赛事
@@ -80,7 +75,6 @@ def insert_new_races_from_csv(csv_file):
     conn.commit()
     print(f"已插入 {len(new_race_ids)} 条新赛事。")
     cur.close()
-    conn.close()
 
 class RaceSpider:
     def __init__(self, base_url, out_csv):
@@ -216,83 +210,82 @@ def get_races():
     如果传入range，按raceId从大到小排序并返回指定范围
     """
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+        with get_connection() as conn:
+            cur = conn.cursor()
         
-        # 获取查询参数
-        province = request.args.get('province')
-        race_type = request.args.get('raceType')
-        range_param = request.args.get('range')
+            # 获取查询参数
+            province = request.args.get('province')
+            race_type = request.args.get('raceType')
+            range_param = request.args.get('range')
         
-        # 构建基础查询SQL
-        base_sql = """
-            SELECT raceId, raceName, province, city, area, shortAddress, 
-                   startTime, showSignEndTime, coverImage, raceType
-            FROM race
-        """
+            # 构建基础查询SQL
+            base_sql = """
+                SELECT raceId, raceName, province, city, area, shortAddress, 
+                       startTime, showSignEndTime, coverImage, raceType
+                FROM race
+            """
         
-        # 情况1: 按range查询
-        if range_param:
-            try:
-                # 解析range参数，如 "1-5" 或 "10-20"
-                start_idx, end_idx = map(int, range_param.split('-'))
+            # 情况1: 按range查询
+            if range_param:
+                try:
+                    # 解析range参数，如 "1-5" 或 "10-20"
+                    start_idx, end_idx = map(int, range_param.split('-'))
                 
-                # 按raceId从大到小排序，然后取指定范围
-                sql = base_sql + " ORDER BY raceId DESC LIMIT %s OFFSET %s"
-                limit = end_idx - start_idx + 1
-                offset = start_idx - 1
-                cur.execute(sql, (limit, offset))
+                    # 按raceId从大到小排序，然后取指定范围
+                    sql = base_sql + " ORDER BY raceId DESC LIMIT %s OFFSET %s"
+                    limit = end_idx - start_idx + 1
+                    offset = start_idx - 1
+                    cur.execute(sql, (limit, offset))
                 
-            except ValueError:
-                return jsonify({
-                    "code": 400,
-                    "message": "range参数格式错误，应为 '开始-结束' 格式，如 '1-5'"
-                }), 400
+                except ValueError:
+                    return jsonify({
+                        "code": 400,
+                        "message": "range参数格式错误，应为 '开始-结束' 格式，如 '1-5'"
+                    }), 400
         
-        # 情况2: 按province和/或raceType查询
-        else:
-            conditions = []
-            params = []
+            # 情况2: 按province和/或raceType查询
+            else:
+                conditions = []
+                params = []
             
-            if province:
-                conditions.append("province = %s")
-                params.append(province)
+                if province:
+                    conditions.append("province = %s")
+                    params.append(province)
             
-            if race_type:
-                conditions.append("raceType = %s")
-                params.append(int(race_type))
+                if race_type:
+                    conditions.append("raceType = %s")
+                    params.append(int(race_type))
             
-            # 构建WHERE子句
-            where_clause = ""
-            if conditions:
-                where_clause = " WHERE " + " AND ".join(conditions)
+                # 构建WHERE子句
+                where_clause = ""
+                if conditions:
+                    where_clause = " WHERE " + " AND ".join(conditions)
             
-            # 按举办时间排序（如果有startTime的话，否则按raceId排序）
-            sql = base_sql + where_clause + " ORDER BY startTime ASC, raceId ASC"
-            cur.execute(sql, params)
+                # 按举办时间排序（如果有startTime的话，否则按raceId排序）
+                sql = base_sql + where_clause + " ORDER BY startTime ASC, raceId ASC"
+                cur.execute(sql, params)
         
-        # 获取查询结果
-        results = cur.fetchall()
+            # 获取查询结果
+            results = cur.fetchall()
         
-        # 转换为字典格式
-        race_list = []
-        for row in results:
-            race_dict = {
-                "raceId": row[0],
-                "raceName": row[1],
-                "province": row[2],
-                "city": row[3],
-                "area": row[4],
-                "shortAddress": row[5],
-                "startTime": row[6],
-                "showSignEndTime": row[7],
-                "coverImage": row[8],
-                "raceType": row[9]
-            }
-            race_list.append(race_dict)
+            # 转换为字典格式
+            race_list = []
+            for row in results:
+                race_dict = {
+                    "raceId": row[0],
+                    "raceName": row[1],
+                    "province": row[2],
+                    "city": row[3],
+                    "area": row[4],
+                    "shortAddress": row[5],
+                    "startTime": row[6],
+                    "showSignEndTime": row[7],
+                    "coverImage": row[8],
+                    "raceType": row[9]
+                }
+                race_list.append(race_dict)
         
-        cur.close()
-        conn.close()
+            cur.close()
         
         # 如果数据库中没有数据，返回模拟数据进行测试
         if not race_list and range_param:
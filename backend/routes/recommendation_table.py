@@ -0,0 +1,215 @@
+# 推荐约束值预计算表
+# 无终点模式（3、4）的约束范围只取决于起点：起点到各可达节点的最短距离与最少路段数的最小/最大值。
+# 离线为全部节点（或热点节点）计算并保存为npz，推荐接口与前端提交前的范围提示直接查表，不再做整图搜索
+#
+# 离线预处理（多进程）：
+#     python routes/recommendation_table.py                              # 从数据库加载路网，全部节点
+#     python routes/recommendation_table.py --csv res/road_modified.csv --processes 8
+#     python routes/recommendation_table.py --nodes hotspots.txt         # 只计算热点（每行一个节点ID或“纬度,经度”）
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from routes.contraction import graph_fingerprint
+except ImportError:  # 在routes目录下直接运行时
+    from contraction import graph_fingerprint
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_TABLE = os.getenv('RECOMMENDATION_TABLE', os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../res/recommendations.npz')))
+
+# 每个任务计算的起点数
+CHUNK_SIZE = 64
+
+
+def table_fingerprint(graph) -> str:
+    """路网拓扑与路段长度的指纹，路网更新后旧表自动失效"""
+    return graph_fingerprint(graph.edge_source, graph.edge_target, graph.contraction_weights('distance'))
+
+
+class RecommendationTable:
+    """按起点节点ID寻址的约束范围；距离无可达节点时为NaN，路段数为-1"""
+
+    def __init__(self, node_ids: np.ndarray, distance_min: np.ndarray, distance_max: np.ndarray,
+                 segments_min: np.ndarray, segments_max: np.ndarray, fingerprint: str = ''):
+        order = np.argsort(node_ids)
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)[order]
+        self.distance_min = np.asarray(distance_min, dtype=np.float32)[order]
+        self.distance_max = np.asarray(distance_max, dtype=np.float32)[order]
+        self.segments_min = np.asarray(segments_min, dtype=np.int32)[order]
+        self.segments_max = np.asarray(segments_max, dtype=np.int32)[order]
+        self.fingerprint = fingerprint
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def build(cls, graph, node_ids: Optional[np.ndarray] = None, processes: int = 1,
+              chunk_size: int = CHUNK_SIZE) -> 'RecommendationTable':
+        """为指定起点（默认全部节点）计算约束范围，processes>1时按起点分批在进程池中计算"""
+        sources = graph.node_indices(np.asarray(node_ids, dtype=np.int64)) if node_ids is not None \
+            else np.arange(graph.num_nodes)
+        if (sources < 0).any():
+            raise ValueError("部分节点不在路网中")
+        sources = np.unique(sources)
+        chunks = [sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size)]
+
+        if processes > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                     initargs=(_graph_arrays(graph),)) as executor:
+                results = list(executor.map(_range_chunk_in_worker, chunks))
+        else:
+            results = [_range_chunk(graph, chunk) for chunk in chunks]
+
+        ranges = np.concatenate(results, axis=0) if results else np.empty((0, 4))
+        return cls(
+            node_ids=graph.node_ids[sources],
+            distance_min=ranges[:, 0],
+            distance_max=ranges[:, 1],
+            segments_min=np.nan_to_num(ranges[:, 2], nan=-1),
+            segments_max=np.nan_to_num(ranges[:, 3], nan=-1),
+            fingerprint=table_fingerprint(graph)
+        )
+
+    def save(self, path: str):
+        """保存为npz（先写临时文件再替换）"""
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, node_ids=self.node_ids, distance_min=self.distance_min,
+                            distance_max=self.distance_max, segments_min=self.segments_min,
+                            segments_max=self.segments_max, fingerprint=np.array(self.fingerprint))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RecommendationTable':
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        fingerprint = str(arrays.pop('fingerprint'))
+        return cls(fingerprint=fingerprint, **arrays)
+
+    def lookup(self, node_id: int, constraint_type: str) -> Optional[Tuple[float, float]]:
+        """起点的距离（'distance'）或路段数（'segments'）范围，不在表中或无可达节点时返回None"""
+        pos = int(np.searchsorted(self.node_ids, node_id))
+        if pos >= len(self.node_ids) or self.node_ids[pos] != node_id:
+            return None
+        if constraint_type == 'distance':
+            low, high = float(self.distance_min[pos]), float(self.distance_max[pos])
+            return None if np.isnan(low) else (low, high)
+        low, high = int(self.segments_min[pos]), int(self.segments_max[pos])
+        return None if low < 0 else (low, high)
+
+
+def _range_chunk(graph, sources: np.ndarray) -> np.ndarray:
+    """一批起点的 [距离最小值, 距离最大值, 路段数最小值, 路段数最大值]（不含起点本身）"""
+    weights = graph.cost_matrix('distance')
+    ranges = np.full((len(sources), 4), np.nan)
+    for i, source in enumerate(sources.tolist()):
+        # 与内存引擎缓存的搜索树一致，距离按float32取值
+        dist = graph.dijkstra(source, weights).dist.astype(np.float32)
+        hops = graph.bfs(source).dist
+        for j, values in ((0, dist), (2, hops)):
+            values = values[np.isfinite(values) & (values > 0)]
+            if values.size:
+                ranges[i, j], ranges[i, j + 1] = values.min(), values.max()
+    return ranges
+
+
+def _graph_arrays(graph) -> Dict[str, object]:
+    """在工作进程中重建路网所需的数组"""
+    return {
+        'node_ids': graph.node_ids, 'node_x': graph.node_x, 'node_y': graph.node_y,
+        'edge_ids': graph.edge_ids, 'edge_source': graph.node_ids[graph.edge_source],
+        'edge_target': graph.node_ids[graph.edge_target], 'edge_values': graph.edge_values
+    }
+
+
+# 多进程计算时各进程常驻的路网
+_worker_graph = None
+
+
+def _init_worker(arrays: Dict[str, object]):
+    global _worker_graph
+    try:
+        from routes.graph_engine import RoadGraph
+    except ImportError:  # 在routes目录下直接运行时
+        from graph_engine import RoadGraph
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_graph = RoadGraph(**arrays)
+
+
+def _range_chunk_in_worker(sources: np.ndarray) -> np.ndarray:
+    return _range_chunk(_worker_graph, sources)
+
+
+def load_recommendation_table(path: str, fingerprint: str) -> Optional[RecommendationTable]:
+    """读取预计算表；文件不存在或与当前路网指纹不一致时返回None（调用方退回实时搜索）"""
+    if not os.path.exists(path):
+        return None
+    try:
+        table = RecommendationTable.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"读取推荐值表失败: {path}: {e}")
+        return None
+    if table.fingerprint != fingerprint:
+        logger.warning(f"推荐值表与当前路网不一致，已忽略（请重新预处理）: {path}")
+        return None
+    logger.info(f"已加载推荐值表: {table.num_nodes}个起点")
+    return table
+
+
+def read_hotspots(path: str, graph) -> np.ndarray:
+    """热点文件：每行一个节点ID，或“纬度,经度”（吸附到最近节点）"""
+    node_ids: List[int] = []
+    lats, lons = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = [field.strip() for field in line.split(',') if field.strip()]
+            if len(fields) == 1:
+                node_ids.append(int(fields[0]))
+            elif len(fields) == 2:
+                lats.append(float(fields[0]))
+                lons.append(float(fields[1]))
+    snapped, _ = graph.snapper.snap_points(lats, lons)
+    return np.unique(np.concatenate([np.array(node_ids, dtype=np.int64), snapped]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线计算推荐约束值表（无终点模式3、4的约束范围）')
+    parser.add_argument('--csv', help='由路网CSV构建（默认从数据库加载edgesmodified/nodesmodified）')
+    parser.add_argument('--out', default=RECOMMENDATION_TABLE, help='输出npz路径')
+    parser.add_argument('--nodes', help='热点文件（每行一个节点ID或“纬度,经度”），默认全部节点')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='进程数')
+    args = parser.parse_args()
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    from routes.graph_engine import RoadGraph
+    if args.csv:
+        graph = RoadGraph.from_csv(args.csv)
+    else:
+        from routes.db_pool import get_connection
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                graph = RoadGraph.from_cursor(cursor)
+            finally:
+                cursor.close()
+
+    node_ids = read_hotspots(args.nodes, graph) if args.nodes else None
+    started = time.perf_counter()
+    table = RecommendationTable.build(graph, node_ids, processes=args.processes)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    table.save(args.out)
+    logger.info(f"推荐值表: {table.num_nodes}个起点，耗时 {time.perf_counter() - started:.1f}s -> {args.out}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
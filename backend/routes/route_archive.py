@@ -0,0 +1,132 @@
+# 路径GeoJSON归档
+# 规划结果直接在内存中返回给前端，归档仅作为可选的异步落盘（write-behind），不影响请求耗时
+# config.yaml 配置项：
+#   route_planning_temp_folder: 归档目录
+#   route_archive_enabled: 是否归档（默认true）
+#   route_archive_max_files: 最多保留的文件数（默认200）
+#   route_archive_max_age_hours: 文件最长保留小时数（默认24）
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import yaml
+
+try:
+    from routes.route_serializer import dumps
+except ImportError:  # 在routes目录下直接运行时
+    from route_serializer import dumps
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../config.yaml'))
+
+# 待写入队列上限，写盘跟不上时丢弃新的归档而不是阻塞请求
+QUEUE_SIZE = 100
+
+
+class RouteArchive:
+    """后台线程异步写入GeoJSON，并按文件数与时间清理旧文件"""
+
+    def __init__(self, folder: str, max_files: int = 200, max_age_hours: float = 24):
+        self.folder = folder
+        self.max_files = max_files
+        self.max_age = max_age_hours * 3600
+        self._queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._files: deque = deque()   # (写入时间, 路径)，按时间先后排列
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, geojson: Dict) -> Optional[str]:
+        """提交归档任务，返回将要写入的路径；队列已满时放弃本次归档并返回None"""
+        self._ensure_worker()
+        path = os.path.join(self.folder, filename)
+        try:
+            self._queue.put_nowait((path, geojson))
+        except queue.Full:
+            logger.warning(f"GeoJSON归档队列已满，跳过: {filename}")
+            return None
+        return path
+
+    def flush(self, timeout: Optional[float] = None):
+        """等待队列中的归档全部写完（测试与进程退出时使用）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='route-archive', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        os.makedirs(self.folder, exist_ok=True)
+        # 启动时登记已有文件，之后只在内存中维护，不再逐次扫描目录
+        existing = [(os.path.getmtime(p), p) for p in glob.glob(os.path.join(self.folder, 'route_*.json'))]
+        self._files.extend(sorted(existing))
+
+        while True:
+            path, geojson = self._queue.get()
+            try:
+                self._write(path, geojson)
+                self._files.append((time.time(), path))
+                self._prune()
+            except Exception as e:
+                logger.error(f"保存GeoJSON失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, geojson: Dict):
+        # 先写临时文件再替换，避免读到写了一半的文件
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(dumps(geojson))
+        os.replace(tmp_path, path)
+        logger.info(f"GeoJSON 路径已保存到: {path}")
+
+    def _prune(self):
+        expire_before = time.time() - self.max_age
+        while self._files and (len(self._files) > self.max_files or self._files[0][0] < expire_before):
+            _, path = self._files.popleft()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"清理旧GeoJSON失败: {path}: {e}")
+
+
+_route_archive: Optional[RouteArchive] = None
+_route_archive_loaded = False
+_route_archive_lock = threading.Lock()
+
+
+def get_route_archive() -> Optional[RouteArchive]:
+    """按config.yaml创建进程级归档器；未启用或未配置目录时返回None"""
+    global _route_archive, _route_archive_loaded
+    if not _route_archive_loaded:
+        with _route_archive_lock:
+            if not _route_archive_loaded:
+                try:
+                    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                        config = yaml.safe_load(f) or {}
+                except OSError as e:
+                    logger.warning(f"读取config.yaml失败，不归档GeoJSON: {e}")
+                    config = {}
+                folder = config.get('route_planning_temp_folder')
+                if folder and config.get('route_archive_enabled', True):
+                    _route_archive = RouteArchive(
+                        folder,
+                        max_files=int(config.get('route_archive_max_files', 200)),
+                        max_age_hours=float(config.get('route_archive_max_age_hours', 24))
+                    )
+                _route_archive_loaded = True
+    return _route_archive
@@ -0,0 +1,73 @@
+# 路径规划结果缓存
+# 以吸附后的起终点节点和规划参数为键，缓存完整的规划结果；容量与有效期可通过环境变量
+# ROUTE_CACHE_SIZE / ROUTE_CACHE_TTL 调整，ROUTE_CACHE_SIZE=0 时关闭缓存
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+ROUTE_CACHE_SIZE = int(os.getenv('ROUTE_CACHE_SIZE', '512'))     # 最多缓存的结果数
+ROUTE_CACHE_TTL = float(os.getenv('ROUTE_CACHE_TTL', '3600'))    # 有效期（秒）
+
+
+class RouteCache:
+    """线程安全的LRU缓存，支持按有效期与容量淘汰，并统计命中率"""
+
+    def __init__(self, max_entries: int = ROUTE_CACHE_SIZE, ttl: float = ROUTE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()   # key -> (过期时间, 结果)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的结果"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        """清空缓存（路网重新加载后调用）"""
+        with self._lock:
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0
+        })
+        return stats
+
+
+# 进程级结果缓存
+route_cache = RouteCache()
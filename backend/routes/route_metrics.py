@@ -0,0 +1,175 @@
+# 路径规划分阶段计时与指标
+# 每次plan_route使用一个StageTimer记录各阶段与每条SQL的耗时、返回行数及有效节点数等，
+# 结束后汇总到进程级直方图，由 /api/get_routes/metrics 以Prometheus文本格式输出
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 直方图分桶：耗时（秒）与数量（行数、节点数）
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+class StageTimer:
+    """单次规划的阶段计时，阶段可嵌套（SQL记录在所属阶段下）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []     # 按开始顺序排列
+        self.total_ms: Optional[float] = None
+        self._stack: List[Dict] = []
+
+    @contextmanager
+    def span(self, stage: str, **fields) -> Iterator[Dict]:
+        """记录一个阶段，返回的字典可补充行数、节点数等字段"""
+        record = {'stage': stage, **fields}
+        if self._stack:
+            record['parent'] = self._stack[-1]['stage']
+        self.spans.append(record)
+        self._stack.append(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['ms'] = record.get('ms', 0.0) + (time.perf_counter() - started) * 1000
+            self._stack.pop()
+
+    def stop(self) -> float:
+        """结束计时，返回总耗时（毫秒）"""
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self.total_ms
+
+    def to_dict(self) -> Dict:
+        """接口返回的timings内容"""
+        total_ms = self.total_ms if self.total_ms is not None else (time.perf_counter() - self.started) * 1000
+        return {'total_ms': total_ms, 'spans': [dict(span) for span in self.spans]}
+
+
+@contextmanager
+def extend_span(record: Dict) -> Iterator[Dict]:
+    """把后续耗时累加到已结束的阶段上（SQL的fetch计入对应的execute）"""
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['ms'] = record.get('ms', 0.0) + (time.perf_counter() - started) * 1000
+
+
+class TimedCursor:
+    """包装数据库游标：execute与随后的fetch记为所属阶段下的'sql'子阶段，并记录返回行数"""
+
+    def __init__(self, cursor, get_timer: Callable[[], Optional[StageTimer]]):
+        self._cursor = cursor
+        self._get_timer = get_timer
+        self._record: Optional[Dict] = None
+
+    def execute(self, sql, params=None):
+        timer = self._get_timer()
+        if timer is None:
+            self._record = None
+            return self._cursor.execute(sql, params)
+        with timer.span('sql') as record:
+            self._record = record
+            return self._cursor.execute(sql, params)
+
+    def fetchall(self):
+        if self._record is None:
+            return self._cursor.fetchall()
+        with extend_span(self._record) as record:
+            rows = self._cursor.fetchall()
+            record['rows'] = record.get('rows', 0) + len(rows)
+        return rows
+
+    def fetchone(self):
+        if self._record is None:
+            return self._cursor.fetchone()
+        with extend_span(self._record) as record:
+            row = self._cursor.fetchone()
+            record['rows'] = record.get('rows', 0) + (row is not None)
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Histogram:
+    """按标签分组的累积直方图（Prometheus histogram语义）"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List] = {}   # 标签值 -> [各桶计数, 总和, 次数]
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{self.name}_sum{suffix} {total:.6f}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+
+class RouteMetrics:
+    """进程级规划指标，汇总各次规划的StageTimer"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_seconds = Histogram('route_planning_request_seconds', '单次路径规划总耗时（秒）',
+                                         ('engine', 'constraint_mode', 'status'), SECONDS_BUCKETS)
+        self.stage_seconds = Histogram('route_planning_stage_seconds', '路径规划各阶段耗时（秒）',
+                                       ('stage',), SECONDS_BUCKETS)
+        self.sql_seconds = Histogram('route_planning_sql_seconds', '各阶段SQL执行耗时（秒，含读取结果）',
+                                     ('stage',), SECONDS_BUCKETS)
+        self.sql_rows = Histogram('route_planning_sql_rows', '各阶段SQL返回行数', ('stage',), COUNT_BUCKETS)
+        self.valid_nodes = Histogram('route_planning_valid_nodes', '满足约束的有效节点数',
+                                     ('constraint_mode',), COUNT_BUCKETS)
+
+    def observe(self, timer: StageTimer, engine: str, constraint_mode: str, status: str):
+        """计入一次规划（成功或失败）"""
+        total_ms = timer.stop()
+        with self._lock:
+            self.request_seconds.observe((engine, constraint_mode, status), total_ms / 1000)
+            for span in timer.spans:
+                seconds = span.get('ms', 0.0) / 1000
+                if span['stage'] == 'sql':
+                    parent = span.get('parent', '')
+                    self.sql_seconds.observe((parent,), seconds)
+                    self.sql_rows.observe((parent,), span.get('rows', 0))
+                else:
+                    self.stage_seconds.observe((span['stage'],), seconds)
+                if 'valid_nodes' in span:
+                    self.valid_nodes.observe((constraint_mode,), span['valid_nodes'])
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """Prometheus文本格式；gauges为额外输出的 {指标名: (说明, 值)}"""
+        with self._lock:
+            lines = []
+            for histogram in [self.request_seconds, self.stage_seconds, self.sql_seconds, self.sql_rows,
+                              self.valid_nodes]:
+                lines.extend(histogram.render())
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+
+# 进程级指标
+route_metrics = RouteMetrics()
@@ -0,0 +1,98 @@
+# 路径规划接口的JSON序列化
+# 安装了orjson时使用orjson（原生支持NumPy数组与标量），否则退回标准库json；后端可由环境变量
+# ROUTE_JSON_BACKEND（auto/orjson/json）指定。坐标小数位数由ROUTE_COORD_PRECISION控制（默认不截断，
+# 6位约0.1米），用于缩小GeoJSON体积
+import json
+import logging
+import math
+import os
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时使用标准库json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+ROUTE_JSON_BACKEND = os.getenv('ROUTE_JSON_BACKEND', 'auto')
+_precision = os.getenv('ROUTE_COORD_PRECISION', '')
+COORDINATE_PRECISION: Optional[int] = int(_precision) if _precision else None
+
+
+def round_coordinates(coordinates, precision: Optional[int] = COORDINATE_PRECISION):
+    """按小数位数截断坐标（单点、点序列或多段线），precision为None时原样返回"""
+    if precision is None or not len(coordinates):
+        return coordinates
+    if isinstance(coordinates[0], (int, float)):
+        return [round(value, precision) for value in coordinates]
+    try:
+        return np.round(np.asarray(coordinates, dtype=np.float64), precision).tolist()
+    except ValueError:  # 多段线各段点数不同
+        return [round_coordinates(part, precision) for part in coordinates]
+
+
+def round_geometry(geometry: Optional[Dict], precision: Optional[int] = COORDINATE_PRECISION) -> Optional[Dict]:
+    """截断GeoJSON几何的坐标"""
+    if precision is None or not geometry or 'coordinates' not in geometry:
+        return geometry
+    return dict(geometry, coordinates=round_coordinates(geometry['coordinates'], precision))
+
+
+def _numpy_default(obj: Any):
+    """标准库json不支持的NumPy类型"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"无法序列化类型 {type(obj).__name__}")
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_numpy_default,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def _finite(obj: Any) -> Any:
+    """非有限浮点数（NaN、±Infinity）换为None，与orjson输出null一致"""
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def _json_dumps(obj: Any) -> bytes:
+    # 多数响应不含非有限值，先直接序列化，遇到NaN/Infinity时替换后重试，输出合法JSON
+    try:
+        text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'), allow_nan=False, default=_numpy_default)
+    except ValueError:
+        text = json.dumps(_finite(obj), ensure_ascii=False, separators=(',', ':'), allow_nan=False,
+                          default=_numpy_default)
+    return text.encode('utf-8')
+
+
+SERIALIZERS: Dict[str, Callable[[Any], bytes]] = {'json': _json_dumps}
+if orjson is not None:
+    SERIALIZERS['orjson'] = _orjson_dumps
+
+
+def get_serializer(backend: str = ROUTE_JSON_BACKEND) -> Callable[[Any], bytes]:
+    """按名称选择序列化函数（返回UTF-8编码的bytes），auto优先orjson"""
+    if backend == 'auto':
+        backend = 'orjson' if 'orjson' in SERIALIZERS else 'json'
+    if backend not in SERIALIZERS:
+        raise ValueError(f"不支持的JSON序列化后端: {backend}（可选 {'、'.join(SERIALIZERS)}）")
+    return SERIALIZERS[backend]
+
+
+# 进程级序列化函数，接口响应、批量NDJSON与GeoJSON归档共用
+dumps = get_serializer()
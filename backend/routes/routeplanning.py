@@ -1,30 +1,84 @@
 # 个性化慢跑路线核心功能代码
-# 修改19-27行代码为自己的数据库信息，第1272行改为自己的temp文件夹路径
-import psycopg2
+# 数据库信息请在db_pool.py中修改，GeoJSON归档目录在config.yaml中配置
 import numpy as np
-from typing import Tuple, List, Dict, Optional, Union
-import json
+from typing import Tuple, List, Dict, Optional, Union, Iterator
 import logging
-import yaml
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 
+try:
+    from routes.graph_engine import (RoadGraph, DualSourceResult, TREE_COLUMNS, ASTAR_EXCEPTION_EDGES, get_road_graph,
+                                     add_reload_listener, preference_kind)
+    from routes.node_snapper import NodeSnapper, get_node_snapper
+    from routes.ant_colony import AntColonyConfig, AntColonySolver, AntProblem, prune_dead_ends
+    from routes.edge_store import EDGE_FORMATS, EdgeAttributeStore, get_edge_store, invalidate_edge_store
+    from routes.db_pool import get_pool, get_pool_stats
+    from routes.route_archive import get_route_archive
+    from routes.route_cache import route_cache
+    from routes.route_serializer import dumps, round_coordinates
+    from routes.route_metrics import StageTimer, TimedCursor, route_metrics
+except ImportError:  # 在routes目录下直接运行本文件时
+    from graph_engine import (RoadGraph, DualSourceResult, TREE_COLUMNS, ASTAR_EXCEPTION_EDGES, get_road_graph,
+                              add_reload_listener, preference_kind)
+    from node_snapper import NodeSnapper, get_node_snapper
+    from ant_colony import AntColonyConfig, AntColonySolver, AntProblem, prune_dead_ends
+    from edge_store import EDGE_FORMATS, EdgeAttributeStore, get_edge_store, invalidate_edge_store
+    from db_pool import get_pool, get_pool_stats
+    from route_archive import get_route_archive
+    from route_cache import route_cache
+    from route_serializer import dumps, round_coordinates
+    from route_metrics import StageTimer, TimedCursor, route_metrics
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 数据库配置
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'joy_run_db',
-    # 'database': 'postgres',
-    'user': 'postgres',
-    # 'password': 'postgres1'
-    'password': 'zzq12'   
-}
+# 路径规划引擎：'memory' 使用进程内CSR图引擎，'database' 使用pgr_dijkstra查询（便于对比结果）
+ROUTE_ENGINE = os.getenv('ROUTE_ENGINE', 'memory')
+
+# 数据库引擎的pgr_aStar启发式系数，按代价表达式缓存（见astar_factor）
+ASTAR_FACTORS: Dict[str, float] = {}
+
+# 数据库引擎的子图范围换算系数：每单位约束量（米或路段数）对应的最大坐标跨度，
+# 及不计入该系数的异常路段端点坐标 (k, 4)，按约束列缓存（见subgraph_scale）
+SUBGRAPH_SCALES: Dict[str, Tuple[float, np.ndarray]] = {}
+
+# 子图范围 (xmin, ymin, xmax, ymax)，与geom同为EPSG:4326坐标
+Envelope = Tuple[float, float, float, float]
+
+# edgesmodified重新加载后，已缓存的规划结果、启发式系数与常驻路段属性全部失效
+add_reload_listener(route_cache.clear)
+add_reload_listener(ASTAR_FACTORS.clear)
+add_reload_listener(SUBGRAPH_SCALES.clear)
+add_reload_listener(invalidate_edge_store)
+
+# 备选路径：最多返回的路径条数、每条路径最多考察的候选数，以及与已选路径允许的最大路段重合度（Jaccard）
+MAX_ROUTE_ALTERNATIVES = 10
+ALTERNATIVE_CANDIDATES_PER_ROUTE = 10
+ALTERNATIVE_MAX_SIMILARITY = 0.6
+
+# 环线模式：往返重叠部分（两条半路径共用的前缀）的惩罚系数，比值乘以 (1 - 系数 * 重叠比例)
+LOOP_OVERLAP_PENALTY = 1.0
+
+# 求解器：'heuristic' 为经最优中间节点的双源搜索（默认），'aco' 为改进蚁群算法（仅内存引擎、模式1和2）
+SOLVERS = ['heuristic', 'aco']
+
+# 批量规划：单次请求的最大条数与工作线程数（每个工作线程占用一个数据库连接，不宜超过DB_POOL_MAX）
+MAX_BATCH_SIZE = 1000
+BATCH_WORKERS = int(os.getenv('ROUTE_BATCH_WORKERS', '4'))
+
+
+def edge_jaccard(edges_a: set, edges_b: set) -> float:
+    """两条路径路段集合的Jaccard相似度"""
+    union = len(edges_a | edges_b)
+    return len(edges_a & edges_b) / union if union else 1.0
+
 
 class ConstraintMode(Enum):
     """约束模式枚举 - UPDATE: 扩展到6个模式（来自modified-3.m）"""
@@ -34,6 +88,7 @@ class ConstraintMode(Enum):
     SEGMENTS_NO_END = 4        # 无终点，路段数约束
     SHORTEST_PATH = 5          # 有终点，最短距离（无约束）
     MIN_SEGMENTS_PATH = 6      # 有终点，最少路段数（无约束）
+    LOOP = 7                   # 无终点，环线（回到起点），距离约束
 
 class PreferenceMode(Enum):
     """偏好模式枚举 - UPDATE: 新增偏好系统（来自modified-3.m）"""
@@ -45,6 +100,204 @@ class PreferenceMode(Enum):
     FACILITIES = 6            # 设施便利路线（POI_Mtotal）
     GENTLE_SLOPE = 7          # 坡度平缓路线（slope_Mtotal）
 
+# 偏好模式对应的SQL评分表达式（{t}为表别名前缀）
+# 组合字段整体加括号，保证在 dis_ori / 偏好 中按整体参与运算
+PREFERENCE_SQL_EXPRESSIONS = {
+    PreferenceMode.COMPREHENSIVE: "{t}total",                                          # 综合得分（原Total）
+    PreferenceMode.WATERFRONT: "{t}water_mtotal",                                      # 滨水路线
+    PreferenceMode.GREEN: "({t}ndvi_mtotal + COALESCE({t}gvi_mtotal, 0))",             # 绿化路线
+    PreferenceMode.OPEN_VIEW: "({t}svi_mtotal + COALESCE({t}buildng_mtotal, 0))",      # 视野开阔路线
+    PreferenceMode.WELL_LIT: "{t}light_mtotal",                                        # 夜间灯光充足路线
+    PreferenceMode.FACILITIES: "{t}poi_mtotal",                                        # 设施便利路线
+    PreferenceMode.GENTLE_SLOPE: "{t}slope_mtotal"                                     # 坡度平缓路线
+}
+
+
+def _preference_cost_sql(preference_mode: PreferenceMode) -> str:
+    """偏好代价表达式：dis_ori / 偏好（偏好非正时为 dis_ori * 10）"""
+    preference = PREFERENCE_SQL_EXPRESSIONS[preference_mode].format(t='')
+    return f"CASE WHEN {preference} > 0 THEN dis_ori / {preference} ELSE dis_ori * 10 END"
+
+
+def _cost_kind_sql(cost_kind: str) -> str:
+    """内存引擎代价类型（见graph_engine.cost_weights）对应的SQL代价表达式，两种引擎按同一代价回溯路径"""
+    if cost_kind == 'hops':
+        return '1'
+    if cost_kind.startswith('preference_'):
+        return _preference_cost_sql(PreferenceMode(int(cost_kind[len('preference_'):])))
+    return 'dis_ori'
+
+
+def _edges_sql(cost_function: str, envelope: Optional[Envelope] = None) -> str:
+    """
+    pgRouting的路段SQL（作为参数传入查询）
+    给定envelope时只取与范围相交的路段，由空间索引idx_edgesmodified_geom筛选，不再扫描整张表
+    """
+    sql = f"SELECT id, source, target, {cost_function} as cost, {cost_function} as reverse_cost FROM edgesmodified"
+    if envelope is not None:
+        sql += " WHERE geom && ST_MakeEnvelope({:.9f}, {:.9f}, {:.9f}, {:.9f}, 4326)".format(*envelope)
+    return sql
+
+
+def _astar_edges_sql(cost_function: str, envelope: Optional[Envelope] = None) -> str:
+    """pgr_aStar的路段SQL：代价与端点坐标（x1/y1为source端，x2/y2为target端）"""
+    return _edges_sql(cost_function, envelope).replace(
+        " FROM edgesmodified", ", startx as x1, starty as y1, endx as x2, endy as y2 FROM edgesmodified", 1)
+
+
+def _astar_factor_sql(cost_function: str) -> str:
+    """
+    pgr_aStar启发式（heuristic 4，端点坐标欧氏距离）的系数：各路段 代价 / 端点坐标距离 的最小值，
+    保证启发式可采纳（偏好代价时约为 每度米数 / 最大偏好值）
+    """
+    return f"""
+            SELECT min(({cost_function}) / sqrt(power(endx - startx, 2) + power(endy - starty, 2)))
+            FROM edgesmodified
+            WHERE source IS NOT NULL AND target IS NOT NULL AND (endx <> startx OR endy <> starty);
+            """
+
+
+# 路段长度 / 端点坐标距离 最低的若干路段（比值与端点坐标），其余路段每米的坐标跨度不超过下一条的比值的倒数
+LOWEST_LENGTH_RATIO_SQL = """
+            SELECT ratio, startx, starty, endx, endy FROM (
+                SELECT dis_ori / sqrt(power(endx - startx, 2) + power(endy - starty, 2)) as ratio,
+                       startx, starty, endx, endy
+                FROM edgesmodified
+                WHERE source IS NOT NULL AND target IS NOT NULL AND (endx <> startx OR endy <> starty)
+            ) ratios
+            WHERE ratio IS NOT NULL
+            ORDER BY ratio
+            LIMIT %s;
+            """
+
+# 比值低于上述查询中最大比值的该分之一的路段视为异常路段（长度远小于坐标距离），不计入子图范围的换算系数
+ANOMALOUS_RATIO_GAP = 10.0
+
+# 最长路段的端点坐标距离：经过n个路段的路线离起点的坐标距离不超过 n × 该值
+MAX_EDGE_SPAN_SQL = """
+            SELECT max(sqrt(power(endx - startx, 2) + power(endy - starty, 2)))
+            FROM edgesmodified
+            WHERE source IS NOT NULL AND target IS NOT NULL;
+            """
+
+
+def _build_point_to_point_sql(preference_mode: PreferenceMode, cost_function: str) -> str:
+    """
+    模式5/6：点到点A*路径（第三个参数为启发式系数），
+    同一条语句按返回的路段ID关联edgesmodified汇总评分，不再按节点对拼接查询条件
+    """
+    edges_sql = _astar_edges_sql(cost_function)
+    preference = PREFERENCE_SQL_EXPRESSIONS[preference_mode].format(t='e.')
+    return f"""
+            SELECT 
+                array_agg(p.node ORDER BY p.seq) as path_nodes,
+                array_agg(p.edge ORDER BY p.seq) FILTER (WHERE e.id IS NOT NULL) as path_edges,
+                count(e.id) as total_segments,
+                sum(e.score) as total_score,
+                sum({preference}) as total_preference_score,
+                sum(e.dis_ori) as actual_distance
+            FROM pgr_aStar(
+                '{edges_sql}',
+                %s, %s, directed := false, heuristic := 4, factor := %s
+            ) p
+            LEFT JOIN edgesmodified e ON e.id = p.edge;
+            """
+
+
+def _build_path_metrics_with_end_sql(preference_mode: PreferenceMode) -> str:
+    """有终点模式：起点、终点分别到有效节点的偏好最短路径指标（路段SQL由参数edges传入）"""
+    preference = PREFERENCE_SQL_EXPRESSIONS[preference_mode].format(t='b.')
+    return f"""
+            WITH start_paths AS (
+                SELECT 
+                    end_vid as mid_node,
+                    sum(cost) as dist_std_to_mid,
+                    sum(b.dis_ori) as dist_real_to_mid,
+                    count(*) as segments_to_mid,
+                    sum({preference}) as preference_score_to_mid,
+                    sum(b.total) as total_std_to_mid,
+                    sum(b.score) as score_to_mid
+                FROM pgr_dijkstra(
+                    %(edges)s,
+                    %(start)s, 
+                    %(valid)s::bigint[], 
+                    directed := false
+                ) a
+                JOIN edgesmodified b ON a.edge = b.id
+                WHERE end_vid = ANY(%(valid)s::bigint[])
+                GROUP BY end_vid
+            ),
+            end_paths AS (
+                SELECT 
+                    end_vid as mid_node,
+                    sum(cost) as dist_std_from_mid, 
+                    sum(b.dis_ori) as dist_real_from_mid,
+                    count(*) as segments_from_mid,
+                    sum({preference}) as preference_score_from_mid,
+                    sum(b.total) as total_std_from_mid,
+                    sum(b.score) as score_from_mid
+                FROM pgr_dijkstra(
+                    %(edges)s,
+                    %(end)s,
+                    %(valid)s::bigint[], 
+                    directed := false
+                ) a
+                JOIN edgesmodified b ON a.edge = b.id  
+                WHERE end_vid = ANY(%(valid)s::bigint[])
+                GROUP BY end_vid
+            )
+            SELECT 
+                s.mid_node,
+                (s.preference_score_to_mid + e.preference_score_from_mid) as preference_total,
+                (s.total_std_to_mid + e.total_std_from_mid) as total_std,
+                (s.dist_std_to_mid + e.dist_std_from_mid) as dist_std, 
+                (s.segments_to_mid + e.segments_from_mid) as segments,
+                (s.dist_real_to_mid + e.dist_real_from_mid) as dist_real,
+                (s.score_to_mid + e.score_from_mid) as score
+            FROM start_paths s
+            JOIN end_paths e ON s.mid_node = e.mid_node
+            WHERE s.mid_node != %(start)s AND s.mid_node != %(end)s;
+            """
+
+
+def _build_path_metrics_no_end_sql(preference_mode: PreferenceMode) -> str:
+    """无终点模式：起点到有效节点的偏好最短路径指标（路段SQL由参数edges传入）"""
+    preference = PREFERENCE_SQL_EXPRESSIONS[preference_mode].format(t='b.')
+    return f"""
+            SELECT 
+                end_vid as node_id,
+                sum({preference}) as preference_total,
+                sum(b.total) as total_std,
+                sum(cost) as dist_std,
+                count(*) as segments, 
+                sum(b.dis_ori) as dist_real,
+                sum(b.score) as score
+            FROM pgr_dijkstra(
+                %(edges)s,
+                %(start)s,
+                %(valid)s::bigint[],
+                directed := false
+            ) a
+            JOIN edgesmodified b ON a.edge = b.id
+            WHERE end_vid = ANY(%(valid)s::bigint[]) AND end_vid != %(start)s
+            GROUP BY end_vid;
+            """
+
+
+# 按偏好模式预生成的SQL语句，请求时只做字典查找，参数全部通过占位符传入
+SHORTEST_PATH_SQL = {mode: _build_point_to_point_sql(mode, _preference_cost_sql(mode)) for mode in PreferenceMode}
+MIN_SEGMENTS_PATH_SQL = {mode: _build_point_to_point_sql(mode, '1') for mode in PreferenceMode}
+# 路径回溯的点到点A*，路段SQL（含代价表达式）由第一个参数传入（见_astar_edges_sql）
+TRACE_PATH_SQL = """
+                SELECT node, edge 
+                FROM pgr_aStar(
+                    %s,
+                    %s, %s, directed := false, heuristic := 4, factor := %s
+                ) ORDER BY seq;
+                """
+PATH_METRICS_WITH_END_SQL = {mode: _build_path_metrics_with_end_sql(mode) for mode in PreferenceMode}
+PATH_METRICS_NO_END_SQL = {mode: _build_path_metrics_no_end_sql(mode) for mode in PreferenceMode}
+
 @dataclass
 class RouteParams:
     """路径规划参数 - UPDATE: 添加偏好模式支持（来自modified-3.m）"""
@@ -67,6 +320,18 @@ class RouteParams:
     # 路段数约束参数
     target_segments: int = 40      # 目标路段数
     segments_tolerance: int = 5    # 路段数容差
+    
+    # 返回的路径条数（最优路径 + k-1条备选路径，仅模式1-4、7有效）
+    k: int = 1
+    
+    # 求解器（见SOLVERS）
+    solver: str = 'heuristic'
+    
+    # 路段详情格式（见EDGE_FORMATS）：'rows' 每条路段一个字典，'columns' 每个属性一个数组
+    edge_format: str = 'rows'
+    
+    # 是否同时返回推荐约束值与有效范围（由筛选节点的同一批搜索结果得到，不需要时不计算）
+    recommend: bool = False
 
 @dataclass
 class RouteResult:
@@ -85,40 +350,118 @@ class RouteResult:
     recommended_segments: Optional[List[int]] = None      # 推荐路段数范围
     distance_range: Optional[Tuple[float, float]] = None # 有效距离范围
     segments_range: Optional[Tuple[int, int]] = None     # 有效路段数范围
+    filename: Optional[str] = None                        # GeoJSON文件名
+    filepath: Optional[str] = None                        # 归档路径（未启用归档时为None）
+    alternatives: Optional[List['RouteResult']] = None    # 备选路径（k>1时），按比值从高到低
+    timings: Optional[Dict] = None                        # 本次规划的分阶段耗时（见route_metrics.py）
+
+# 路径指标列，与路径指标SQL的结果列顺序一致
+METRIC_COLUMNS = ['node_id', 'preference_total', 'total_std', 'dist_std', 'segments', 'dist_real', 'score']
+# 环线模式额外的指标列
+LOOP_METRIC_COLUMNS = ['loop_edge', 'overlap']
+
+@dataclass
+class PathMetrics:
+    """满足约束的候选路径指标，按列保存为NumPy数组，只为选中的路径生成字典"""
+    node_id: np.ndarray
+    preference_total: np.ndarray
+    total_std: np.ndarray
+    dist_std: np.ndarray
+    segments: np.ndarray
+    dist_real: np.ndarray
+    score: np.ndarray
+    ratio: np.ndarray
+    loop_edge: Optional[np.ndarray] = None   # 环线模式：闭合两条半路径的路段下标
+    overlap: Optional[np.ndarray] = None     # 环线模式：往返重叠部分占环线长度的比例
+
+    def __len__(self) -> int:
+        return len(self.node_id)
+
+    def to_dict(self, i: int) -> Dict:
+        """第i条候选路径的指标字典"""
+        preference_total = float(self.preference_total[i])
+        dist_real = float(self.dist_real[i])
+        segments = int(self.segments[i])
+        metric = {
+            'node_id': int(self.node_id[i]),
+            'preference_total': preference_total,
+            'total_std': float(self.total_std[i]),
+            'dist_std': float(self.dist_std[i]),
+            'segments': segments,
+            'dist_real': dist_real,
+            'score': float(self.score[i]),
+            'ratio': float(self.ratio[i]),
+            'score_per_meter': preference_total / dist_real if dist_real > 0 else 0,
+            'score_per_segment': preference_total / segments if segments > 0 else 0
+        }
+        if self.loop_edge is not None:
+            metric['loop_edge'] = int(self.loop_edge[i])
+            metric['overlap'] = float(self.overlap[i])
+        return metric
+
+    def top(self, k: int = 1) -> List[Dict]:
+        """按比值从高到低取前k条（比值相同时保持原顺序）"""
+        n = len(self)
+        if n == 0 or k <= 0:
+            return []
+        if k == 1:
+            order = [int(np.argmax(self.ratio))]
+        elif k >= n:
+            order = np.argsort(-self.ratio, kind='stable')
+        else:
+            idx = np.argpartition(-self.ratio, k - 1)[:k]
+            order = idx[np.lexsort((idx, -self.ratio[idx]))]
+        return [self.to_dict(i) for i in order]
+
+    def best(self) -> Dict:
+        """比值最高的候选路径"""
+        return self.top(1)[0]
 
 class JoggingPathPlanner:
-    def get_temp_folder(self):
-        """读取config.yaml获取route_planning_temp_folder路径"""
-        config_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../config.yaml'))
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        temp_folder = config.get('route_planning_temp_folder')
-        if not temp_folder:
-            raise ValueError('config.yaml 未配置 route_planning_temp_folder')
-        return temp_folder
     """智能慢跑路径规划器"""
     
-    def __init__(self):
+    def __init__(self, engine: str = ROUTE_ENGINE):
+        if engine not in ('memory', 'database'):
+            raise ValueError("engine必须为'memory'或'database'")
         self.conn = None
         self.cursor = None
+        self.engine = engine
+        self.graph: Optional[RoadGraph] = None
+        self.snapper: Optional[NodeSnapper] = None
+        self.edge_store: Optional[EdgeAttributeStore] = None
+        self.timer: Optional[StageTimer] = None   # 仅在plan_route执行期间存在
         
     def connect(self):
-        """连接数据库"""
+        """从连接池借出数据库连接，内存引擎同时加载常驻路网，并准备常驻节点索引与路段属性"""
         try:
-            self.conn = psycopg2.connect(**DB_CONFIG)
-            self.cursor = self.conn.cursor()
+            self.conn = get_pool().getconn()
+            self.cursor = TimedCursor(self.conn.cursor(), lambda: self.timer)
             logger.info("数据库连接成功")
         except Exception as e:
             logger.error(f"数据库连接失败: {e}")
             raise
+        if self.engine == 'memory':
+            self.graph = get_road_graph(self.cursor)
+            self.snapper = self.graph.snapper
+        else:
+            self.snapper = get_node_snapper(self.cursor)
+        self.edge_store = get_edge_store(self.cursor)
     
     def disconnect(self):
-        """断开数据库连接"""
+        """归还数据库连接"""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
-        logger.info("数据库连接已断开")
+            get_pool().putconn(self.conn)
+            self.conn = None
+        logger.info("数据库连接已归还连接池")
+    
+    def span(self, stage: str, **fields):
+        """当前规划的一个计时阶段，不在plan_route中时不计时"""
+        if self.timer is None:
+            return nullcontext(dict(fields))
+        return self.timer.span(stage, **fields)
     
     def find_nearest_node(self, lat: float, lon: float) -> Tuple[int, float, float]:
         """
@@ -129,18 +472,15 @@ class JoggingPathPlanner:
         Returns:
             (节点ID, 节点纬度, 节点经度)
         """
-        sql = """
-        SELECT id, y, x
-        FROM nodesmodified 
-        ORDER BY geom <-> ST_SetSRID(ST_MakePoint(%s, %s), 4326)
-        LIMIT 1;
+        return self.snapper.snap_point(lat, lon)
+
+    def snap_points(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
         """
-        self.cursor.execute(sql, (lon, lat))
-        result = self.cursor.fetchone()
-        if not result:
-            raise ValueError(f"未找到任何路网节点，请检查nodesmodified表是否有数据")
-        node_id, node_lat, node_lon = result
-        return node_id, node_lat, node_lon
+        批量吸附到最近路网节点（批量规划、GPS轨迹匹配使用，不访问数据库）
+        Returns:
+            (节点ID数组, 查询点到节点的距离数组（米）)
+        """
+        return self.snapper.snap_points(lats, lons)
     
     def validate_params(self, params: RouteParams):
         """验证参数合法性 - UPDATE: 扩展到6个约束模式和7个偏好模式（来自modified-3.m）"""
@@ -151,9 +491,9 @@ class JoggingPathPlanner:
         if not ((params.w2 > 0 and params.w3 == 0) or (params.w2 == 0 and params.w3 > 0)):
             raise ValueError("w2和w3必须一正一零（w2>0用长度，w3>0用路段数）")
         
-        # UPDATE: 约束模式验证（扩展到1-6）
+        # UPDATE: 约束模式验证（扩展到1-7）
         if not isinstance(params.constraint_mode, ConstraintMode):
-            raise ValueError("constraintMode必须为1-6")
+            raise ValueError("constraintMode必须为1-7")
         
         # UPDATE: 偏好模式验证（新增1-7）
         if not isinstance(params.preference_mode, PreferenceMode):
@@ -164,23 +504,83 @@ class JoggingPathPlanner:
                                     ConstraintMode.SHORTEST_PATH, ConstraintMode.MIN_SEGMENTS_PATH]:
             if params.end_lat is None or params.end_lon is None:
                 raise ValueError("模式1,2,5,6需要提供终点坐标")
+        
+        if not 1 <= params.k <= MAX_ROUTE_ALTERNATIVES:
+            raise ValueError(f"k必须在1-{MAX_ROUTE_ALTERNATIVES}之间")
+        
+        if params.constraint_mode == ConstraintMode.LOOP and self.engine != 'memory':
+            raise ValueError("环线模式（7）需要内存引擎")
+        
+        if params.solver not in SOLVERS:
+            raise ValueError(f"solver必须为{'、'.join(SOLVERS)}之一")
+        if params.solver == 'aco':
+            if self.engine != 'memory':
+                raise ValueError("蚁群求解器需要内存引擎")
+            if params.constraint_mode not in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END]:
+                raise ValueError("蚁群求解器仅支持模式1和2")
+            if params.k > 1:
+                raise ValueError("蚁群求解器只返回一条路径（k=1）")
+        
+        if params.edge_format not in EDGE_FORMATS:
+            raise ValueError(f"edge_format必须为{'、'.join(EDGE_FORMATS)}之一")
     
     def get_preference_total_column(self, preference_mode: PreferenceMode) -> str:
         """根据偏好模式获取对应的Total列名 - UPDATE: 新增偏好系统（来自modified-3.m）"""
-        column_mapping = {
-            PreferenceMode.COMPREHENSIVE: "total",           # 综合得分（原Total）
-            PreferenceMode.WATERFRONT: "water_mtotal",       # 滨水路线
-            PreferenceMode.GREEN: "ndvi_mtotal + COALESCE(gvi_mtotal, 0)",  # UPDATE: 修复组合字段语法
-            PreferenceMode.OPEN_VIEW: "svi_mtotal + COALESCE(buildng_mtotal, 0)", # UPDATE: 修复组合字段语法
-            PreferenceMode.WELL_LIT: "light_mtotal",         # 夜间灯光充足路线
-            PreferenceMode.FACILITIES: "poi_mtotal",         # 设施便利路线
-            PreferenceMode.GENTLE_SLOPE: "slope_mtotal"      # 坡度平缓路线
-        }
-        return column_mapping[preference_mode]
-    
+        return PREFERENCE_SQL_EXPRESSIONS[preference_mode].format(t='')
+
+    def get_preference_values(self, preference_mode: PreferenceMode) -> np.ndarray:
+        """内存引擎：偏好模式对应的路段偏好评分（路网加载时预计算）"""
+        return self.graph.preference_values[preference_mode.value - 1]
+
+    def get_preference_cost(self, preference_mode: PreferenceMode) -> np.ndarray:
+        """内存引擎：偏好代价 dis_ori / preference（偏好非正时为 dis_ori * 10，路网加载时预计算）"""
+        return self.graph.preference_costs[preference_mode.value - 1]
+
+    def search_endpoints(self, start_node: int, end_node: Optional[int], constraint_mode: ConstraintMode,
+                         preference_mode: Optional[PreferenceMode] = None,
+                         limit: Optional[Tuple[str, float]] = None) -> DualSourceResult:
+        """
+        内存引擎：获取起点与终点的全部搜索树（经路网的搜索树缓存复用）
+        'constraint' 代价为约束量（距离模式为dis_ori，路段数模式为单位代价BFS），
+        'preference' 代价为偏好代价（未指定偏好模式时不计算）
+        limit见search_limit，为None时搜索整个路网
+        """
+        graph = self.graph
+        distance_mode = constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END]
+        kinds = {'constraint': 'distance' if distance_mode else 'hops'}
+        if preference_mode is not None:
+            kinds['preference'] = preference_kind(preference_mode.value)
+
+        end_idx = graph.node_index(end_node) if end_node is not None else None
+        return graph.dual_source_search(graph.node_index(start_node), end_idx, kinds, limit)
+
+    def search_limit(self, params: RouteParams) -> Optional[Tuple[str, float]]:
+        """
+        搜索范围 (约束列, 上限)：约束量超过 目标值+容差 的节点不可能成为候选，搜索到此为止
+        （有终点时为以起终点为焦点的椭圆），耗时随路线规模而非路网规模增长；
+        内存引擎据此限定搜索树，数据库引擎据此只取范围内的路段（见subgraph_envelope）。
+        请求推荐值时需要完整的约束范围，不限制搜索
+        """
+        if params.recommend or params.constraint_mode in [ConstraintMode.SHORTEST_PATH,
+                                                          ConstraintMode.MIN_SEGMENTS_PATH]:
+            return None
+        column = 'segments' if params.constraint_mode in [ConstraintMode.SEGMENTS_WITH_END,
+                                                          ConstraintMode.SEGMENTS_NO_END] else 'dis_ori'
+        return column, float(self.get_constraint_bounds(params)[1])
+
+    def path_cost_kind(self, params: RouteParams) -> str:
+        """内存引擎：最终路径所在搜索树的代价类型（模式6为最少路段数，其余为偏好代价）"""
+        if params.constraint_mode == ConstraintMode.MIN_SEGMENTS_PATH:
+            return 'hops'
+        return preference_kind(params.preference_mode.value)
+
     def calculate_dynamic_constraints(self, start_node: int, end_node: Optional[int], 
-                                    constraint_mode: ConstraintMode) -> Dict:
+                                    constraint_mode: ConstraintMode,
+                                    search: Optional[DualSourceResult] = None) -> Dict:
         """动态计算约束范围并生成推荐值 - UPDATE: 新增动态约束计算（来自modified-3.m）"""
+        if self.graph is not None:
+            return self._calculate_dynamic_constraints_in_memory(start_node, end_node, constraint_mode, search)
+
         if constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END]:
             # 距离约束的动态计算
             if constraint_mode == ConstraintMode.DISTANCE_WITH_END and end_node is not None:
@@ -228,91 +628,102 @@ class JoggingPathPlanner:
                 raise ValueError("无法计算有效距离范围，请检查路网数据")
             
             min_dist, max_dist = result
-            distance_step = 500  # 500米间隔
-            
-            # 生成推荐距离（向上取整到步长倍数）
-            min_recommended = int(np.ceil(min_dist / distance_step) * distance_step)
-            max_recommended = int(np.floor(max_dist / distance_step) * distance_step)
-            
-            if min_recommended > max_recommended:
-                recommended_distances = [min_recommended]
-            else:
-                recommended_distances = list(range(min_recommended, max_recommended + 1, distance_step))
-            
-            return {
-                'type': 'distance',
-                'min_value': min_dist,
-                'max_value': max_dist,
-                'recommended_values': recommended_distances,
-                'step': distance_step,
-                'unit': 'meters'
-            }
+            return self.build_constraint_info('distance', min_dist, max_dist)
             
         else:  # 路段数约束
+            # 单位代价的pgr_drivingDistance即BFS，每个节点只出现一次，返回最少路段数
             if constraint_mode == ConstraintMode.SEGMENTS_WITH_END and end_node is not None:
-                # 有终点：使用递归CTE计算路段数范围（简化版BFS）
+                # 有终点：起点、终点各做一次BFS，经过各节点的最少路段数为两者之和
                 sql = """
-                WITH RECURSIVE segments_calc AS (
-                    SELECT source, target, 1 as segments
-                    FROM edgesmodified
-                    WHERE source = %s OR target = %s
-                    UNION ALL
-                    SELECT e.source, e.target, s.segments + 1
-                    FROM segments_calc s
-                    JOIN edgesmodified e ON (e.source = s.target OR e.target = s.source)
-                    WHERE s.segments < 50  -- 限制递归深度
+                WITH start_hops AS (
+                    SELECT node, agg_cost as hops
+                    FROM pgr_drivingDistance(
+                        'SELECT id, source, target, 1 as cost, 1 as reverse_cost FROM edgesmodified',
+                        %(start)s, (SELECT count(*) FROM edgesmodified)::float, directed := false
+                    )
+                ),
+                end_hops AS (
+                    SELECT node, agg_cost as hops
+                    FROM pgr_drivingDistance(
+                        'SELECT id, source, target, 1 as cost, 1 as reverse_cost FROM edgesmodified',
+                        %(end)s, (SELECT count(*) FROM edgesmodified)::float, directed := false
+                    )
                 )
-                SELECT min(segments), max(segments)
-                FROM segments_calc
-                WHERE source = %s OR target = %s;
+                SELECT min(s.hops + e.hops)::int, max(s.hops + e.hops)::int
+                FROM start_hops s
+                JOIN end_hops e ON s.node = e.node;
                 """
-                self.cursor.execute(sql, (start_node, start_node, end_node, end_node))
+                self.cursor.execute(sql, {'start': start_node, 'end': end_node})
             else:
-                # 无终点：单源路段数计算
+                # 无终点：单源BFS
                 sql = """
-                WITH RECURSIVE segments_calc AS (
-                    SELECT target as node_id, 1 as segments
-                    FROM edgesmodified
-                    WHERE source = %s
-                    UNION ALL
-                    SELECT e.target, s.segments + 1
-                    FROM segments_calc s
-                    JOIN edgesmodified e ON e.source = s.node_id
-                    WHERE s.segments < 50 AND s.node_id != %s
-                )
-                SELECT min(segments), max(segments)
-                FROM segments_calc;
+                SELECT min(agg_cost)::int, max(agg_cost)::int
+                FROM pgr_drivingDistance(
+                    'SELECT id, source, target, 1 as cost, 1 as reverse_cost FROM edgesmodified',
+                    %s, (SELECT count(*) FROM edgesmodified)::float, directed := false
+                ) WHERE agg_cost > 0;
                 """
-                self.cursor.execute(sql, (start_node, start_node))
+                self.cursor.execute(sql, (start_node,))
             
             result = self.cursor.fetchone()
             if not result or result[0] is None:
                 raise ValueError("无法计算有效路段数范围，请检查路网数据")
             
             min_segments, max_segments = result
-            segments_step = 5  # 5段间隔
-            
-            # 生成推荐路段数
-            min_recommended = int(np.ceil(min_segments / segments_step) * segments_step)
-            max_recommended = int(np.floor(max_segments / segments_step) * segments_step)
-            
-            if min_recommended > max_recommended:
-                recommended_segments = [min_recommended]
-            else:
-                recommended_segments = list(range(min_recommended, max_recommended + 1, segments_step))
-            
-            return {
-                'type': 'segments',
-                'min_value': min_segments,
-                'max_value': max_segments,
-                'recommended_values': recommended_segments,
-                'step': segments_step,
-                'unit': 'segments'
-            }
+            return self.build_constraint_info('segments', min_segments, max_segments)
+
+    def _calculate_dynamic_constraints_in_memory(self, start_node: int, end_node: Optional[int],
+                                                 constraint_mode: ConstraintMode,
+                                                 search: Optional[DualSourceResult]) -> Dict:
+        """内存引擎：由双源搜索结果的约束代价计算有效范围"""
+        with_end = constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END] \
+            and end_node is not None
+        if search is None:
+            search = self.search_endpoints(start_node, end_node if with_end else None, constraint_mode)
+        constraint_type = 'distance' if constraint_mode in [ConstraintMode.DISTANCE_WITH_END,
+                                                            ConstraintMode.DISTANCE_NO_END] else 'segments'
+
+        values = search.cost('constraint')
+        if search.has_end:
+            values = values[np.isfinite(values)]
+        else:
+            values = values[np.isfinite(values) & (values > 0)]
+
+        if values.size == 0:
+            unit_name = '距离' if constraint_type == 'distance' else '路段数'
+            raise ValueError(f"无法计算有效{unit_name}范围，请检查路网数据")
+
+        min_value, max_value = float(values.min()), float(values.max())
+        if constraint_type == 'segments':
+            min_value, max_value = int(min_value), int(max_value)
+        return self.build_constraint_info(constraint_type, min_value, max_value)
+
+    def build_constraint_info(self, constraint_type: str, min_value: float, max_value: float) -> Dict:
+        """根据有效范围生成推荐约束值（距离500米间隔，路段数5段间隔）"""
+        step = 500 if constraint_type == 'distance' else 5
+        
+        # 生成推荐值（向上取整到步长倍数）
+        min_recommended = int(np.ceil(min_value / step) * step)
+        max_recommended = int(np.floor(max_value / step) * step)
+        
+        if min_recommended > max_recommended:
+            recommended_values = [min_recommended]
+        else:
+            recommended_values = list(range(min_recommended, max_recommended + 1, step))
+        
+        return {
+            'type': constraint_type,
+            'min_value': min_value,
+            'max_value': max_value,
+            'recommended_values': recommended_values,
+            'step': step,
+            'unit': 'meters' if constraint_type == 'distance' else 'segments'
+        }
     
     def get_constraint_bounds(self, params: RouteParams) -> Tuple[float, float]:
         """获取约束范围"""
-        if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END]:
+        if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END,
+                                      ConstraintMode.LOOP]:
             return (
                 params.target_distance - params.distance_tolerance,
                 params.target_distance + params.distance_tolerance
@@ -324,183 +735,257 @@ class JoggingPathPlanner:
             )
     
     def filter_valid_nodes_by_distance(self, start_node: int, end_node: Optional[int], 
-                                     min_dist: float, max_dist: float) -> List[int]:
+                                     min_dist: float, max_dist: float,
+                                     search: Optional[DualSourceResult] = None) -> List[int]:
         """
         基于距离约束筛选有效节点
-        使用PostGIS的pgr_dijkstra进行高效计算
+        起点（及终点）各做一次以max_dist为上限的pgr_drivingDistance，只搜索可能满足约束的范围
         """
+        if self.graph is not None:
+            mode = ConstraintMode.DISTANCE_WITH_END if end_node is not None else ConstraintMode.DISTANCE_NO_END
+            return self._filter_valid_nodes_in_memory(start_node, end_node, mode, min_dist, max_dist, search)
+
+        # 起点（终点）距离超过max_dist的节点不可能满足约束：有终点时为以两端为焦点的椭圆，无终点时为圆，
+        # 路段SQL只取该范围外接矩形内的路段
+        edges = _edges_sql('dis_ori', self.subgraph_envelope(start_node, end_node, ('dis_ori', max_dist)))
         if end_node is not None:
             # 有终点模式：筛选满足起点到节点+节点到终点总距离在范围内的节点
             sql = """
             WITH start_distances AS (
-                SELECT end_vid as node_id, sum(cost) as dist_from_start
-                FROM pgr_dijkstra(
-                    'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
-                    %s, 
-                    (SELECT array_agg(id) FROM nodesmodified),
-                    directed := false
-                ) GROUP BY end_vid
+                SELECT node as node_id, agg_cost as dist_from_start
+                FROM pgr_drivingDistance(
+                    %(edges)s,
+                    %(start)s, %(max)s, directed := false
+                )
             ),
             end_distances AS (
-                SELECT end_vid as node_id, sum(cost) as dist_to_end  
-                FROM pgr_dijkstra(
-                    'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
-                    %s,
-                    (SELECT array_agg(id) FROM nodesmodified), 
-                    directed := false
-                ) GROUP BY end_vid
+                SELECT node as node_id, agg_cost as dist_to_end
+                FROM pgr_drivingDistance(
+                    %(edges)s,
+                    %(end)s, %(max)s, directed := false
+                )
             )
             SELECT s.node_id
             FROM start_distances s
             JOIN end_distances e ON s.node_id = e.node_id
-            WHERE (s.dist_from_start + e.dist_to_end) BETWEEN %s AND %s;
+            WHERE (s.dist_from_start + e.dist_to_end) BETWEEN %(min)s AND %(max)s;
             """
-            self.cursor.execute(sql, (start_node, end_node, min_dist, max_dist))
+            self.cursor.execute(sql, {'edges': edges, 'start': start_node, 'end': end_node,
+                                      'min': min_dist, 'max': max_dist})
         else:
-            # 无终点模式：筛选起点到节点累积距离在范围内的节点
+            # 无终点模式：筛选起点到节点累积距离在范围内的节点（不含起点本身）
             sql = """
-            SELECT end_vid as node_id
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
-                %s,
-                (SELECT array_agg(id) FROM nodesmodified WHERE id != %s),
-                directed := false
+            SELECT node as node_id
+            FROM pgr_drivingDistance(
+                %(edges)s,
+                %(start)s, %(max)s, directed := false
             )
-            WHERE agg_cost BETWEEN %s AND %s AND agg_cost > 0;
+            WHERE agg_cost > 0 AND agg_cost BETWEEN %(min)s AND %(max)s;
             """
-            self.cursor.execute(sql, (start_node, start_node, min_dist, max_dist))
+            self.cursor.execute(sql, {'edges': edges, 'start': start_node, 'min': min_dist, 'max': max_dist})
         
         return [row[0] for row in self.cursor.fetchall()]
     
     def filter_valid_nodes_by_segments(self, start_node: int, end_node: Optional[int],
-                                     min_segments: int, max_segments: int) -> List[int]:
+                                     min_segments: int, max_segments: int,
+                                     search: Optional[DualSourceResult] = None) -> List[int]:
         """
         基于路段数约束筛选有效节点
-        使用BFS思想，通过hop数限制实现
+        起点（及终点）各做一次以max_segments为上限的BFS，按最少路段数筛选，复杂度与路网规模线性相关
         """
+        if self.graph is not None:
+            mode = ConstraintMode.SEGMENTS_WITH_END if end_node is not None else ConstraintMode.SEGMENTS_NO_END
+            return self._filter_valid_nodes_in_memory(start_node, end_node, mode, min_segments, max_segments, search)
+
+        # 单位代价的pgr_drivingDistance即以max_segments为跳数上限的BFS，每个节点只返回最少路段数；
+        # 路段SQL只取max_segments个路段可达范围内的路段
+        edges = _edges_sql('1', self.subgraph_envelope(start_node, end_node, ('segments', max_segments)))
         if end_node is not None:
-            # 有终点模式：使用pgr_withPoints结合距离限制模拟路段数约束
+            # 有终点模式：起点BFS与终点BFS的跳数之和落在约束范围内
             sql = """
-            WITH RECURSIVE path_segments AS (
-                -- 起点BFS
-                SELECT %s as node_id, 0 as segments_from_start
-                UNION ALL
-                SELECT e.endx as node_id, p.segments_from_start + 1
-                FROM path_segments p
-                JOIN edgesmodified e ON e.startx = p.node_id
-                WHERE p.segments_from_start < %s
+            WITH start_hops AS (
+                SELECT node, agg_cost as hops
+                FROM pgr_drivingDistance(
+                    %(edges)s,
+                    %(start)s, %(max)s, directed := false
+                )
             ),
-            end_segments AS (
-                -- 终点BFS  
-                SELECT %s as node_id, 0 as segments_to_end
-                UNION ALL
-                SELECT e.startx as node_id, p.segments_to_end + 1
-                FROM end_segments p
-                JOIN edgesmodified e ON e.endx = p.node_id
-                WHERE p.segments_to_end < %s
+            end_hops AS (
+                SELECT node, agg_cost as hops
+                FROM pgr_drivingDistance(
+                    %(edges)s,
+                    %(end)s, %(max)s, directed := false
+                )
             )
-            SELECT DISTINCT s.node_id
-            FROM path_segments s
-            JOIN end_segments e ON s.node_id = e.node_id
-            WHERE (s.segments_from_start + e.segments_to_end) BETWEEN %s AND %s;
+            SELECT s.node
+            FROM start_hops s
+            JOIN end_hops e ON s.node = e.node
+            WHERE (s.hops + e.hops) BETWEEN %(min)s AND %(max)s;
             """
-            self.cursor.execute(sql, (start_node, max_segments, end_node, max_segments, min_segments, max_segments))
+            self.cursor.execute(sql, {'edges': edges, 'start': start_node, 'end': end_node,
+                                      'min': min_segments, 'max': max_segments})
         else:
-            # 无终点模式：单源BFS
+            # 无终点模式：单源BFS（不含起点本身）
             sql = """
-            WITH RECURSIVE path_segments AS (
-                SELECT %s as node_id, 0 as segments
-                UNION ALL
-                SELECT e.endx as node_id, p.segments + 1
-                FROM path_segments p
-                JOIN edgesmodified e ON e.startx = p.node_id
-                WHERE p.segments < %s
+            SELECT node
+            FROM pgr_drivingDistance(
+                %(edges)s,
+                %(start)s, %(max)s, directed := false
             )
-            SELECT DISTINCT node_id
-            FROM path_segments
-            WHERE segments BETWEEN %s AND %s;
+            WHERE agg_cost > 0 AND agg_cost BETWEEN %(min)s AND %(max)s;
             """
-            self.cursor.execute(sql, (start_node, max_segments, min_segments, max_segments))
+            self.cursor.execute(sql, {'edges': edges, 'start': start_node, 'min': min_segments, 'max': max_segments})
         
         return [row[0] for row in self.cursor.fetchall()]
-    
+
+    def filter_valid_nodes(self, start_node: int, end_node: Optional[int], constraint_mode: ConstraintMode,
+                           min_value: float, max_value: float, search: Optional[DualSourceResult] = None,
+                           with_range: bool = False) -> Tuple[List[int], Optional[Dict]]:
+        """
+        按约束筛选有效节点（模式1-4），with_range时由同一批搜索结果同时给出约束范围与推荐值
+
+        Returns:
+            (有效节点列表, 约束范围信息或None)
+        """
+        distance_mode = constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END]
+        if self.graph is not None:
+            if search is None:
+                search = self.search_endpoints(start_node, end_node, constraint_mode)
+            valid_nodes = self._filter_valid_nodes_in_memory(start_node, end_node, constraint_mode,
+                                                             min_value, max_value, search)
+            if not with_range:
+                return valid_nodes, None
+            try:
+                return valid_nodes, self._calculate_dynamic_constraints_in_memory(start_node, end_node,
+                                                                                  constraint_mode, search)
+            except ValueError as e:
+                logger.warning(f"动态约束计算失败: {e}")
+                return valid_nodes, None
+
+        if not with_range:
+            if distance_mode:
+                return self.filter_valid_nodes_by_distance(start_node, end_node, min_value, max_value), None
+            return self.filter_valid_nodes_by_segments(start_node, end_node, min_value, max_value), None
+        return self._filter_valid_nodes_with_range_in_database(start_node, end_node, distance_mode,
+                                                               min_value, max_value)
+
+    def _filter_valid_nodes_with_range_in_database(self, start_node: int, end_node: Optional[int],
+                                                   distance_mode: bool, min_value: float,
+                                                   max_value: float) -> Tuple[List[int], Optional[Dict]]:
+        """数据库引擎：一条查询内筛选有效节点并聚合全部可达节点的约束范围（路段数模式不设BFS上限）"""
+        if distance_mode and end_node is not None:
+            sql = """
+            WITH start_distances AS (
+                SELECT end_vid as node_id, sum(cost) as dist_from_start
+                FROM pgr_dijkstra(
+                    'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
+                    %(start)s,
+                    (SELECT array_agg(id) FROM nodesmodified),
+                    directed := false
+                ) GROUP BY end_vid
+            ),
+            end_distances AS (
+                SELECT end_vid as node_id, sum(cost) as dist_to_end
+                FROM pgr_dijkstra(
+                    'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
+                    %(end)s,
+                    (SELECT array_agg(id) FROM nodesmodified),
+                    directed := false
+                ) GROUP BY end_vid
+            )
+            SELECT array_agg(s.node_id) FILTER (WHERE s.dist_from_start + e.dist_to_end BETWEEN %(min)s AND %(max)s),
+                   min(s.dist_from_start + e.dist_to_end), max(s.dist_from_start + e.dist_to_end)
+            FROM start_distances s
+            JOIN end_distances e ON s.node_id = e.node_id;
+            """
+        elif distance_mode:
+            sql = """
+            SELECT array_agg(end_vid) FILTER (WHERE agg_cost BETWEEN %(min)s AND %(max)s),
+                   min(agg_cost), max(agg_cost)
+            FROM pgr_dijkstra(
+                'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
+                %(start)s,
+                (SELECT array_agg(id) FROM nodesmodified WHERE id != %(start)s),
+                directed := false
+            ) WHERE agg_cost < 'Infinity'::float AND agg_cost > 0;
+            """
+        elif end_node is not None:
+            sql = """
+            WITH start_hops AS (
+                SELECT node, agg_cost as hops
+                FROM pgr_drivingDistance(
+                    'SELECT id, source, target, 1 as cost, 1 as reverse_cost FROM edgesmodified',
+                    %(start)s, (SELECT count(*) FROM edgesmodified)::float, directed := false
+                )
+            ),
+            end_hops AS (
+                SELECT node, agg_cost as hops
+                FROM pgr_drivingDistance(
+                    'SELECT id, source, target, 1 as cost, 1 as reverse_cost FROM edgesmodified',
+                    %(end)s, (SELECT count(*) FROM edgesmodified)::float, directed := false
+                )
+            )
+            SELECT array_agg(s.node) FILTER (WHERE s.hops + e.hops BETWEEN %(min)s AND %(max)s),
+                   min(s.hops + e.hops)::int, max(s.hops + e.hops)::int
+            FROM start_hops s
+            JOIN end_hops e ON s.node = e.node;
+            """
+        else:
+            sql = """
+            SELECT array_agg(node) FILTER (WHERE agg_cost BETWEEN %(min)s AND %(max)s),
+                   min(agg_cost)::int, max(agg_cost)::int
+            FROM pgr_drivingDistance(
+                'SELECT id, source, target, 1 as cost, 1 as reverse_cost FROM edgesmodified',
+                %(start)s, (SELECT count(*) FROM edgesmodified)::float, directed := false
+            ) WHERE agg_cost > 0;
+            """
+        self.cursor.execute(sql, {'start': start_node, 'end': end_node, 'min': min_value, 'max': max_value})
+        nodes, range_min, range_max = self.cursor.fetchone()
+        if range_min is None:
+            logger.warning("动态约束计算失败: 没有可达节点")
+            return list(nodes or []), None
+        constraint_info = self.build_constraint_info('distance' if distance_mode else 'segments',
+                                                     range_min, range_max)
+        return list(nodes or []), constraint_info
+
+    def _filter_valid_nodes_in_memory(self, start_node: int, end_node: Optional[int], constraint_mode: ConstraintMode,
+                                      min_value: float, max_value: float,
+                                      search: Optional[DualSourceResult]) -> List[int]:
+        """内存引擎：按双源搜索结果的约束代价筛选有效节点"""
+        if search is None:
+            search = self.search_endpoints(start_node, end_node, constraint_mode)
+        values = search.cost('constraint')
+        if not search.has_end:
+            values = np.where(values > 0, values, np.inf)
+        return self.graph.node_ids[(values >= min_value) & (values <= max_value)].tolist()
+
     def calculate_shortest_path(self, start_node: int, end_node: int, 
                               constraint_mode: ConstraintMode, params: RouteParams) -> Dict:
         """计算最短路径（模式5）或最少路段数路径（模式6） - UPDATE: 新增模式5,6支持并修复偏好评分应用（来自modified-3.m）"""
-        
-        # UPDATE: 获取偏好模式对应的评分字段
-        preference_column = self.get_preference_total_column(params.preference_mode)
+        if self.graph is not None:
+            return self._calculate_shortest_path_in_memory(start_node, end_node, constraint_mode, params)
         
         if constraint_mode == ConstraintMode.SHORTEST_PATH:
             # 模式5：最短距离路径 - 考虑偏好评分的权重
-            cost_function = f"CASE WHEN {preference_column} > 0 THEN dis_ori / {preference_column} ELSE dis_ori * 10 END"
-            
-            sql = f"""
-            SELECT 
-                array_agg(node ORDER BY seq) as path_nodes,
-                sum(cost) as total_distance,
-                count(*) as total_segments
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, {cost_function} as cost, {cost_function} as reverse_cost FROM edgesmodified',
-                %s, %s, directed := false
-            );
-            """
-            self.cursor.execute(sql, (start_node, end_node))
+            sql = SHORTEST_PATH_SQL[params.preference_mode]
+            factor = self.astar_factor(_preference_cost_sql(params.preference_mode))
+            self.cursor.execute(sql, (start_node, end_node, factor))
             
         elif constraint_mode == ConstraintMode.MIN_SEGMENTS_PATH:
             # 模式6：最少路段数路径 - 同时考虑偏好评分
-            sql = f"""
-            SELECT 
-                array_agg(node ORDER BY seq) as path_nodes,
-                count(*) as total_segments,
-                sum(cost) as total_distance
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, 1 as cost, 1 as reverse_cost FROM edgesmodified',
-                %s, %s, directed := false
-            ) a
-            JOIN edgesmodified b ON a.edge = b.id;
-            """
-            self.cursor.execute(sql, (start_node, end_node))
+            sql = MIN_SEGMENTS_PATH_SQL[params.preference_mode]
+            self.cursor.execute(sql, (start_node, end_node, self.astar_factor('1')))
         
+        # 路径与评分汇总在同一条语句中按路段ID关联得到
         result = self.cursor.fetchone()
         if not result or not result[0]:
             raise ValueError("起点到终点无可达路径")
         
-        path_nodes, segments_or_distance, distance_or_segments = result
-        
-        if constraint_mode == ConstraintMode.SHORTEST_PATH:
-            total_distance = segments_or_distance
-            total_segments = distance_or_segments
-        else:  # MIN_SEGMENTS_PATH
-            total_segments = segments_or_distance
-            total_distance = distance_or_segments
-            
-        # UPDATE: 计算路径的偏好得分和综合评价
-        edges_from_path = []
-        for i in range(len(path_nodes) - 1):
-            src_node = path_nodes[i]
-            tgt_node = path_nodes[i + 1]
-            edges_from_path.append(f"(source = {src_node} AND target = {tgt_node}) OR (source = {tgt_node} AND target = {src_node})")
-        
-        if edges_from_path:
-            edges_condition = " OR ".join(edges_from_path)
-            sql = f"""
-            SELECT 
-                sum(score) as total_score,
-                sum({preference_column}) as total_preference_score,
-                sum(dis_ori) as actual_distance
-            FROM edgesmodified 
-            WHERE {edges_condition};
-            """
-            self.cursor.execute(sql)
-            score_result = self.cursor.fetchone()
-            total_score = score_result[0] if score_result[0] else 0
-            total_preference_score = score_result[1] if score_result[1] else 0
-            actual_distance = score_result[2] if score_result[2] else total_distance
-        else:
-            total_score = 0
-            total_preference_score = 0
-            actual_distance = total_distance
+        path_nodes, path_edges, total_segments, total_score, total_preference_score, actual_distance = result
+        total_segments = int(total_segments or 0)
+        total_score = float(total_score or 0)
+        total_preference_score = float(total_preference_score or 0)
+        actual_distance = float(actual_distance or 0)
         
         # UPDATE: 使用偏好评分计算优化比值
         if params.w2 > 0:  # 使用长度权重
@@ -511,6 +996,7 @@ class JoggingPathPlanner:
         return {
             'node_id': -1,  # 标识为直接路径
             'path_nodes': path_nodes,
+            'path_edges': path_edges or [],
             'preference_total': total_preference_score,  # UPDATE: 添加偏好总分
             'dist_real': actual_distance,
             'segments': total_segments, 
@@ -520,283 +1006,484 @@ class JoggingPathPlanner:
             'score_per_segment': total_preference_score / total_segments if total_segments > 0 else 0
         }
     
+    def _calculate_shortest_path_in_memory(self, start_node: int, end_node: int,
+                                           constraint_mode: ConstraintMode, params: RouteParams) -> Dict:
+        """
+        内存引擎：模式5按偏好代价、模式6按单位代价求点到点路径
+        有离线预处理的收缩层次时用双向CH搜索（见contraction.py），否则用按球面距离启发的A*
+        """
+        graph = self.graph
+        start_idx = graph.node_index(start_node)
+        end_idx = graph.node_index(end_node)
+
+        node_path, edge_path, expanded = graph.point_to_point(start_idx, end_idx, self.path_cost_kind(params))
+        logger.info(f"点到点搜索扩展节点数: {expanded}（路网共{graph.num_nodes}个节点）")
+
+        total_segments = len(edge_path)
+        total_score = float(graph.edge_column('score')[edge_path].sum())
+        total_preference_score = float(self.get_preference_values(params.preference_mode)[edge_path].sum())
+        actual_distance = float(graph.edge_column('dis_ori')[edge_path].sum())
+
+        if params.w2 > 0:  # 使用长度权重
+            ratio = (total_preference_score ** params.w1) / (actual_distance ** params.w2) if actual_distance > 0 else 0
+        else:  # 使用路段数权重
+            ratio = (total_preference_score ** params.w1) / (total_segments ** params.w3) if total_segments > 0 else 0
+
+        return {
+            'node_id': -1,  # 标识为直接路径
+            'path_nodes': graph.node_ids[node_path].tolist(),
+            'path_edges': graph.edge_ids[edge_path].tolist(),
+            'expanded_nodes': expanded,
+            'preference_total': total_preference_score,
+            'dist_real': actual_distance,
+            'segments': total_segments,
+            'score': total_score,
+            'ratio': ratio,
+            'score_per_meter': total_preference_score / actual_distance if actual_distance > 0 else 0,
+            'score_per_segment': total_preference_score / total_segments if total_segments > 0 else 0
+        }
+
     def calculate_path_metrics(self, start_node: int, end_node: Optional[int], 
-                             valid_nodes: List[int], params: RouteParams) -> List[Dict]:
+                             valid_nodes: List[int], params: RouteParams,
+                             search: Optional[DualSourceResult] = None) -> PathMetrics:
         """
         计算所有有效节点的路径指标 - UPDATE: 修复偏好模式在有终点约束时不生效的问题
-        使用SQL批量计算提高效率，并正确应用偏好评分
+        使用SQL（或内存引擎）批量取得指标列，约束检查与比值计算均为向量化运算
         """
-        metrics = []
-        
-        # UPDATE: 获取偏好模式对应的评分字段
-        preference_column = self.get_preference_total_column(params.preference_mode)
-        
-        # 构建有效节点的WHERE子句
-        valid_nodes_str = ','.join(map(str, valid_nodes))
-        
-        if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END]:
-            # UPDATE: 有终点模式 - 修复偏好评分计算
-            # 使用偏好评分作为路径权重，而不是固定的distance
-            cost_function = f"CASE WHEN {preference_column} > 0 THEN dis_ori / {preference_column} ELSE dis_ori * 10 END"
-            
-            sql = f"""
-            WITH start_paths AS (
-                SELECT 
-                    end_vid as mid_node,
-                    sum(cost) as dist_std_to_mid,
-                    sum(b.dis_ori) as dist_real_to_mid,
-                    count(*) as segments_to_mid,
-                    sum(b.{preference_column}) as preference_score_to_mid,
-                    sum(b.total) as total_std_to_mid,
-                    sum(b.score) as score_to_mid
-                FROM pgr_dijkstra(
-                    'SELECT id, source, target, {cost_function} as cost, {cost_function} as reverse_cost FROM edgesmodified', 
-                    %s, 
-                    ARRAY[{valid_nodes_str}], 
-                    directed := false
-                ) a
-                JOIN edgesmodified b ON a.edge = b.id
-                WHERE end_vid IN ({valid_nodes_str})
-                GROUP BY end_vid
-            ),
-            end_paths AS (
-                SELECT 
-                    end_vid as mid_node,
-                    sum(cost) as dist_std_from_mid, 
-                    sum(b.dis_ori) as dist_real_from_mid,
-                    count(*) as segments_from_mid,
-                    sum(b.{preference_column}) as preference_score_from_mid,
-                    sum(b.total) as total_std_from_mid,
-                    sum(b.score) as score_from_mid
-                FROM pgr_dijkstra(
-                    'SELECT id, source, target, {cost_function} as cost, {cost_function} as reverse_cost FROM edgesmodified',
-                    %s,
-                    ARRAY[{valid_nodes_str}], 
-                    directed := false
-                ) a
-                JOIN edgesmodified b ON a.edge = b.id  
-                WHERE end_vid IN ({valid_nodes_str})
-                GROUP BY end_vid
-            )
-            SELECT 
-                s.mid_node,
-                (s.preference_score_to_mid + e.preference_score_from_mid) as preference_total,
-                (s.total_std_to_mid + e.total_std_from_mid) as total_std,
-                (s.dist_std_to_mid + e.dist_std_from_mid) as dist_std, 
-                (s.segments_to_mid + e.segments_from_mid) as segments,
-                (s.dist_real_to_mid + e.dist_real_from_mid) as dist_real,
-                (s.score_to_mid + e.score_from_mid) as score
-            FROM start_paths s
-            JOIN end_paths e ON s.mid_node = e.mid_node
-            WHERE s.mid_node != %s AND s.mid_node != %s;
-            """
-            
-            self.cursor.execute(sql, (start_node, end_node, start_node, end_node))
+        if self.graph is not None:
+            columns = self._query_path_metrics_in_memory(start_node, end_node, valid_nodes, params, search)
         else:
-            # UPDATE: 无终点模式 - 修复偏好评分计算
-            cost_function = f"CASE WHEN {preference_column} > 0 THEN dis_ori / {preference_column} ELSE dis_ori * 10 END"
-            
-            sql = f"""
-            SELECT 
-                end_vid as node_id,
-                sum(b.{preference_column}) as preference_total,
-                sum(b.total) as total_std,
-                sum(cost) as dist_std,
-                count(*) as segments, 
-                sum(b.dis_ori) as dist_real,
-                sum(b.score) as score
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, {cost_function} as cost, {cost_function} as reverse_cost FROM edgesmodified',
-                %s,
-                ARRAY[{valid_nodes_str}],
-                directed := false
-            ) a
-            JOIN edgesmodified b ON a.edge = b.id
-            WHERE end_vid IN ({valid_nodes_str}) AND end_vid != %s
-            GROUP BY end_vid;
-            """
-            
-            self.cursor.execute(sql, (start_node, start_node))
-        
-        results = self.cursor.fetchall()
-        
-        # 计算约束范围
-        min_constraint, max_constraint = self.get_constraint_bounds(params)
-        
-        for row in results:
+            # 满足约束的路线都在搜索范围内，偏好最短路径只在范围内的路段上计算
+            edges = _edges_sql(_preference_cost_sql(params.preference_mode),
+                               self.subgraph_envelope(start_node, end_node, self.search_limit(params)))
             if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END]:
-                node_id, preference_total, total_std, dist_std, segments, dist_real, score = row
-            else:
-                node_id, preference_total, total_std, dist_std, segments, dist_real, score = row
-            
-            # 约束检查
-            constraint_value = dist_real if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END] else segments
-            if not (min_constraint <= constraint_value <= max_constraint):
-                continue
-            
-            # UPDATE: 使用偏好评分计算优化比值
-            if params.w2 > 0 and dist_std > 0:
-                ratio = (preference_total ** params.w1) / (dist_std ** params.w2)
-            elif params.w3 > 0 and segments > 0:
-                ratio = (preference_total ** params.w1) / (segments ** params.w3)
+                # UPDATE: 有终点模式 - 修复偏好评分计算
+                # 使用偏好评分作为路径权重，而不是固定的distance
+                sql = PATH_METRICS_WITH_END_SQL[params.preference_mode]
+                self.cursor.execute(sql, {'edges': edges, 'start': start_node, 'end': end_node,
+                                          'valid': list(valid_nodes)})
             else:
-                continue
-                
-            # 计算得分比值
-            score_per_meter = preference_total / dist_real if dist_real > 0 else 0
-            score_per_segment = preference_total / segments if segments > 0 else 0
-            
-            metrics.append({
-                'node_id': node_id,
-                'preference_total': preference_total,  # UPDATE: 添加偏好总分
-                'total_std': total_std,
-                'dist_std': dist_std,
-                'segments': segments,
-                'dist_real': dist_real,
-                'score': score,
-                'ratio': ratio,
-                'score_per_meter': score_per_meter,
-                'score_per_segment': score_per_segment
-            })
+                # UPDATE: 无终点模式 - 修复偏好评分计算
+                sql = PATH_METRICS_NO_END_SQL[params.preference_mode]
+                self.cursor.execute(sql, {'edges': edges, 'start': start_node, 'valid': list(valid_nodes)})
+            # NULL转为NaN，比值为NaN的行不参与选择
+            rows = np.array(self.cursor.fetchall(), dtype=np.float64).reshape(-1, len(METRIC_COLUMNS))
+            columns = {name: rows[:, k] for k, name in enumerate(METRIC_COLUMNS)}
+        return self.select_metrics(columns, params)
+    
+    def select_metrics(self, columns: Dict[str, np.ndarray], params: RouteParams) -> PathMetrics:
+        """按约束范围筛选候选指标列并计算优化比值（环线候选另按往返重叠比例惩罚）"""
+        # 约束检查
+        min_constraint, max_constraint = self.get_constraint_bounds(params)
+        if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END,
+                                      ConstraintMode.LOOP]:
+            constraint_value = columns['dist_real']
+        else:
+            constraint_value = columns['segments']
+        mask = (constraint_value >= min_constraint) & (constraint_value <= max_constraint)
+        
+        # UPDATE: 使用偏好评分计算优化比值（长度权重优先，其次路段数权重）
+        preference_total, dist_std, segments = columns['preference_total'], columns['dist_std'], columns['segments']
+        use_dist = (dist_std > 0) if params.w2 > 0 else np.zeros(len(mask), dtype=bool)
+        use_segments = ~use_dist & (segments > 0) if params.w3 > 0 else np.zeros(len(mask), dtype=bool)
+        mask &= use_dist | use_segments
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            numerator = preference_total ** params.w1
+            ratio = np.where(use_dist, numerator / dist_std ** params.w2, numerator / segments ** params.w3)
+        mask &= np.isfinite(ratio)
+        
+        if 'overlap' in columns:
+            ratio = ratio * (1 - LOOP_OVERLAP_PENALTY * columns['overlap'])
+            mask &= columns['overlap'] < 1
         
-        return metrics
+        extra = {name: columns[name][mask] for name in LOOP_METRIC_COLUMNS if name in columns}
+        return PathMetrics(ratio=ratio[mask], **{name: columns[name][mask] for name in METRIC_COLUMNS}, **extra)
     
-    def get_optimal_path(self, start_node: int, end_node: Optional[int], best_metric: Dict) -> Tuple[List[int], List[Tuple[float, float]], List[Dict]]:
+    def _query_path_metrics_in_memory(self, start_node: int, end_node: Optional[int], valid_nodes: List[int],
+                                      params: RouteParams, search: Optional[DualSourceResult]) -> Dict[str, np.ndarray]:
+        """
+        内存引擎：从双源搜索结果的偏好代价树读取各节点路径指标
+        返回与SQL版本相同的指标列（见METRIC_COLUMNS）
+        """
+        graph = self.graph
+        if search is None or 'preference' not in search.start_trees:
+            search = self.search_endpoints(start_node, end_node, params.constraint_mode, params.preference_mode)
+
+        dist_std = search.cost('preference')
+        excluded = [start_node] if end_node is None else [start_node, end_node]
+        candidates = graph.node_indices(np.asarray(valid_nodes, dtype=np.int64))
+        candidates = candidates[candidates >= 0]
+        candidates = candidates[np.isfinite(dist_std[candidates]) & ~np.isin(graph.node_ids[candidates], excluded)]
+
+        return {
+            'node_id': graph.node_ids[candidates],
+            'preference_total': search.column('preference', preference_kind(params.preference_mode.value))[candidates],
+            'total_std': search.column('preference', preference_kind(PreferenceMode.COMPREHENSIVE.value))[candidates],
+            'dist_std': dist_std[candidates],
+            'segments': np.rint(search.column('preference', 'segments')[candidates]),
+            'dist_real': search.column('preference', 'dis_ori')[candidates],
+            'score': search.column('preference', 'score')[candidates]
+        }
+
+    def _query_loop_metrics_in_memory(self, start_node: int, params: RouteParams) -> Dict[str, np.ndarray]:
+        """
+        内存引擎：环线候选指标（只用一棵起点偏好代价树）
+        每条非树路段(a, b)把起点->a与起点->b两条半路径闭合成一条环线，指标为两条半路径与该路段之和；
+        两条半路径在最近公共祖先之前共用的部分需往返各跑一次，其长度的两倍占环线长度的比例记为重叠比例
+        """
+        graph = self.graph
+        tree = graph.dual_source_search(graph.node_index(start_node), None,
+                                        {'preference': preference_kind(params.preference_mode.value)},
+                                        self.search_limit(params)).start_trees['preference']
+
+        edges = np.arange(graph.num_edges)
+        a, b = graph.edge_source, graph.edge_target
+        reachable = tree.reachable()
+        closing = reachable[a] & reachable[b] & (tree.pred_edge[a] != edges) & (tree.pred_edge[b] != edges)
+        edges, a, b = edges[closing], a[closing], b[closing]
+
+        def loop_column(column: str) -> np.ndarray:
+            k = TREE_COLUMNS.index(column)
+            return tree.sums[a, k].astype(np.float64) + tree.sums[b, k] + graph.tree_values[edges, k]
+
+        dist_real = loop_column('dis_ori')
+        shared = tree.sums[graph.lowest_common_ancestors(tree, a, b), TREE_COLUMNS.index('dis_ori')]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            overlap = np.where(dist_real > 0, 2 * shared / dist_real, 1.0)
+
+        preference_cost = self.get_preference_cost(params.preference_mode)
+        return {
+            'node_id': graph.node_ids[a],
+            'preference_total': loop_column(preference_kind(params.preference_mode.value)),
+            'total_std': loop_column(preference_kind(PreferenceMode.COMPREHENSIVE.value)),
+            'dist_std': tree.dist[a].astype(np.float64) + tree.dist[b] + preference_cost[edges],
+            'segments': np.rint(loop_column('segments')),
+            'dist_real': dist_real,
+            'score': loop_column('score'),
+            'loop_edge': edges,
+            'overlap': overlap
+        }
+
+    def _trace_path_in_memory(self, start_node: int, end_node: Optional[int], best_metric: Dict, cost_kind: str,
+                              limit: Optional[Tuple[str, float]] = None
+                              ) -> Tuple[List[int], List[int], List[Tuple[float, float]]]:
+        """内存引擎：由缓存搜索树（与路径指标相同的搜索范围）的前驱数组回溯路径，返回节点ID、路段ID和坐标"""
+        graph = self.graph
+        if 'path_edges' in best_metric:  # 模式5、6已求得完整路径
+            node_path = graph.node_indices(np.asarray(best_metric['path_nodes'], dtype=np.int64))
+            coordinates = list(zip(graph.node_x[node_path].tolist(), graph.node_y[node_path].tolist()))
+            return best_metric['path_nodes'], best_metric['path_edges'], coordinates
+
+        end_idx = graph.node_index(end_node) if end_node is not None else None
+        search = graph.dual_source_search(graph.node_index(start_node), end_idx, {'path': cost_kind}, limit)
+        start_tree = search.start_trees['path']
+        if 'loop_edge' in best_metric:  # 环线：两条半路径经闭合路段相连
+            node_path, edge_path = graph.loop_path(start_tree, best_metric['loop_edge'])
+        elif best_metric['node_id'] == -1:  # 直接路径
+            node_path, edge_path = graph.path(start_tree, end_idx)
+        else:  # 经过最优节点；有终点时再沿终点树回到终点
+            end_tree = search.end_trees.get('path')
+            node_path, edge_path = graph.path_via(start_tree, end_tree, graph.node_index(best_metric['node_id']))
+
+        coordinates = list(zip(graph.node_x[node_path].tolist(), graph.node_y[node_path].tolist()))  # (lon, lat)
+        return graph.node_ids[node_path].tolist(), graph.edge_ids[edge_path].tolist(), coordinates
+
+    def solve_ant_colony(self, start_node: int, end_node: int, params: RouteParams,
+                         config: Optional[AntColonyConfig] = None
+                         ) -> Tuple[Dict, Tuple[List[int], List[int], List[Tuple[float, float]]]]:
+        """
+        内存引擎：改进蚁群算法求解模式1、2（antroadUpgrade.m）
+        经过节点的最小约束量已超出上限的节点不可通行，再剔除死端；终点树的约束代价用于前瞻剪枝
+        Returns:
+            (路径指标, (节点ID, 路段ID, 坐标))
+        """
+        graph = self.graph
+        start_idx, end_idx = graph.node_index(start_node), graph.node_index(end_node)
+        search = self.search_endpoints(start_node, end_node, params.constraint_mode,
+                                       limit=self.search_limit(params))
+        min_value, max_value = self.get_constraint_bounds(params)
+
+        allowed = prune_dead_ends(graph.indptr, graph.indices, search.cost('constraint') <= max_value,
+                                  [start_idx, end_idx])
+        if params.constraint_mode == ConstraintMode.DISTANCE_WITH_END:
+            step_cost = graph.edge_column('dis_ori')
+        else:
+            step_cost = np.ones(graph.num_edges)
+        preference_values = self.get_preference_values(params.preference_mode)
+        problem = AntProblem(
+            indptr=graph.indptr,
+            indices=graph.indices,
+            slot_edges=graph.adj_edges,
+            heuristic=np.maximum(preference_values[graph.adj_edges], 1e-6),
+            step_cost=step_cost,
+            to_end=search.end_trees['constraint'].dist.astype(np.float64),
+            allowed=allowed,
+            start=start_idx,
+            end=end_idx,
+            min_value=min_value,
+            max_value=max_value
+        )
+        solver = AntColonySolver(problem, preference_values, self.get_preference_cost(params.preference_mode), config)
+        solved = solver.solve(params.w1, params.w2, params.w3)
+
+        edges = np.asarray(solved.path_edges, dtype=np.int64)
+        preference_total = float(preference_values[edges].sum())
+        total_segments = len(edges)
+        actual_distance = float(graph.edge_column('dis_ori')[edges].sum())
+        metric = {
+            'node_id': -1,  # 标识为直接路径
+            'preference_total': preference_total,
+            'total_std': float(self.get_preference_values(PreferenceMode.COMPREHENSIVE)[edges].sum()),
+            'dist_std': float(self.get_preference_cost(params.preference_mode)[edges].sum()),
+            'segments': total_segments,
+            'dist_real': actual_distance,
+            'score': float(graph.edge_column('score')[edges].sum()),
+            'ratio': solved.ratio,
+            'score_per_meter': preference_total / actual_distance if actual_distance > 0 else 0,
+            'score_per_segment': preference_total / total_segments if total_segments > 0 else 0
+        }
+        node_path = np.asarray(solved.path_nodes, dtype=np.int64)
+        coordinates = list(zip(graph.node_x[node_path].tolist(), graph.node_y[node_path].tolist()))  # (lon, lat)
+        return metric, (graph.node_ids[node_path].tolist(), graph.edge_ids[edges].tolist(), coordinates)
+
+    def astar_factor(self, cost_function: str) -> float:
+        """
+        数据库引擎：代价表达式对应的pgr_aStar启发式系数（每个进程只查询一次）
+        pgr_aStar无法像内存引擎那样按例外路段修正启发式，系数取全部路段比值的最小值以保证路径最短；
+        长度远小于坐标距离的异常路段会使系数偏小，A*扩展的节点随之增多
+        """
+        factor = ASTAR_FACTORS.get(cost_function)
+        if factor is None:
+            self.cursor.execute(_astar_factor_sql(cost_function))
+            row = self.cursor.fetchone()
+            # pgr_aStar要求factor > 0；代价存在0时退化为Dijkstra（取极小值）
+            factor = ASTAR_FACTORS[cost_function] = max(float(row[0]) if row and row[0] is not None else 0.0, 1e-9)
+        return factor
+
+    def subgraph_scale(self, column: str) -> Tuple[float, np.ndarray]:
+        """
+        数据库引擎：每单位约束量对应的最大坐标跨度，及不计入该系数的路段端点坐标 (k, 4)（每个进程只查询一次）
+        距离的系数取 路段长度 / 端点坐标距离 最小比值的倒数；比值最低的ASTAR_EXCEPTION_EDGES + 1个路段中，
+        比值低于其中最大比值的ANOMALOUS_RATIO_GAP分之一的异常路段单独返回，系数取其余路段的最小比值，
+        由subgraph_envelope按异常路段的端点扩展范围，不会使范围覆盖整张表；路段数的系数为最长路段的坐标距离
+        """
+        cached = SUBGRAPH_SCALES.get(column)
+        if cached is None:
+            if column == 'dis_ori':
+                self.cursor.execute(LOWEST_LENGTH_RATIO_SQL, (ASTAR_EXCEPTION_EDGES + 1,))
+                rows = np.array(self.cursor.fetchall(), dtype=np.float64).reshape(-1, 5)
+                if len(rows):
+                    base = int(np.searchsorted(rows[:, 0], rows[-1, 0] / ANOMALOUS_RATIO_GAP))
+                    cached = (1.0 / max(rows[base, 0], 1e-9), rows[:base, 1:])
+                else:
+                    cached = (0.0, rows[:, 1:])
+            else:
+                self.cursor.execute(MAX_EDGE_SPAN_SQL)
+                row = self.cursor.fetchone()
+                cached = (float(row[0]) if row and row[0] is not None else 0.0, np.zeros((0, 4)))
+            SUBGRAPH_SCALES[column] = cached
+        return cached
+
+    def subgraph_envelope(self, start_node: int, end_node: Optional[int],
+                          limit: Optional[Tuple[str, float]]) -> Optional[Envelope]:
+        """
+        数据库引擎：搜索范围limit（见search_limit）对应的子图外接矩形，limit为None时返回None（整张表）
+        约束量不超过上限的路线在正常路段上离起点的坐标距离不超过 上限 × 换算系数（圆）；有终点时到起终点的距离
+        之和不超过该值（椭圆），离两端中点不超过其一半。经过异常路段的路线每经过一条异常路段，坐标偏移
+        最多多出该路段的坐标跨度，因此圆的外接矩形按可达的异常路段的跨度扩展（见_pad_by_detours）；
+        有终点且起点一侧可达异常路段时，改用起终点两侧扩展后矩形的交集。路线经过的路段都与外接矩形相交
+        """
+        if limit is None:
+            return None
+        column, value = limit
+        scale, detours = self.subgraph_scale(column)
+        radius = value * scale
+        if end_node is None:
+            (x, y), = self.snapper.node_coordinates([start_node])
+            return self._pad_by_detours((x - radius, y - radius, x + radius, y + radius), detours)[0]
+
+        (x1, y1), (x2, y2) = self.snapper.node_coordinates([start_node, end_node])
+        from_start, padded = self._pad_by_detours((x1 - radius, y1 - radius, x1 + radius, y1 + radius),
+                                                  detours)
+        if not padded:
+            x, y, half = (x1 + x2) / 2, (y1 + y2) / 2, radius / 2
+            return x - half, y - half, x + half, y + half
+        from_end, _ = self._pad_by_detours((x2 - radius, y2 - radius, x2 + radius, y2 + radius), detours)
+        return (max(from_start[0], from_end[0]), max(from_start[1], from_end[1]),
+                min(from_start[2], from_end[2]), min(from_start[3], from_end[3]))
+
+    @staticmethod
+    def _pad_by_detours(envelope: Envelope, detours: np.ndarray) -> Tuple[Envelope, bool]:
+        """
+        一端落在矩形内的异常路段可被路线经过，矩形按其x、y方向的跨度向四周扩展，重复直到没有新的异常路段
+        落在矩形内；路线不重复经过同一路段，扩展量不超过各异常路段跨度之和。返回矩形及是否扩展过
+        """
+        xmin, ymin, xmax, ymax = envelope
+        padded = False
+        while len(detours):
+            ends = detours.reshape(-1, 2, 2)
+            inside = ((ends[:, :, 0] >= xmin) & (ends[:, :, 0] <= xmax) &
+                      (ends[:, :, 1] >= ymin) & (ends[:, :, 1] <= ymax)).any(axis=1)
+            if not inside.any():
+                break
+            dx, dy = np.abs(ends[inside, 1] - ends[inside, 0]).sum(axis=0)
+            xmin, ymin, xmax, ymax = xmin - dx, ymin - dy, xmax + dx, ymax + dy
+            detours = detours[~inside]
+            padded = True
+        return (xmin, ymin, xmax, ymax), padded
+
+    def get_optimal_path(self, start_node: int, end_node: Optional[int], best_metric: Dict,
+                         cost_kind: Optional[str] = None, edge_format: str = 'rows'
+                         ) -> Tuple[List[int], List[Tuple[float, float]], Union[List[Dict], Dict[str, List]]]:
         """
         获取最优路径的节点序列、坐标和路段详细信息
         """
-        if best_metric['node_id'] == -1:  # 直接路径
-            sql = """
-            SELECT node, edge 
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
-                %s, %s, directed := false
-            ) ORDER BY seq;
-            """
-            self.cursor.execute(sql, (start_node, end_node))
-            path_result = self.cursor.fetchall()
-        elif end_node is not None:
-            # 通过中间节点的路径
-            mid_node = best_metric['node_id']
-            
-            # 起点到中间节点
-            sql1 = """
-            SELECT node, edge 
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
-                %s, %s, directed := false
-            ) ORDER BY seq;
-            """
-            self.cursor.execute(sql1, (start_node, mid_node))
-            path1 = self.cursor.fetchall()
-            
-            # 中间节点到终点
-            sql2 = """
-            SELECT node, edge 
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
-                %s, %s, directed := false
-            ) ORDER BY seq;
-            """
-            self.cursor.execute(sql2, (mid_node, end_node))
-            path2 = self.cursor.fetchall()
-            
-            # 合并路径（去除重复的中间节点）
-            path_result = path1 + path2[1:]
+        with self.span('trace_path'):
+            path_nodes, path_edges, coordinates = self.trace_path(start_node, end_node, best_metric, cost_kind)
+        return path_nodes, coordinates, self.get_edge_details(path_edges, edge_format)
+
+    def trace_path(self, start_node: int, end_node: Optional[int], best_metric: Dict,
+                   cost_kind: Optional[str] = None, limit: Optional[Tuple[str, float]] = None
+                   ) -> Tuple[List[int], List[int], List[Tuple[float, float]]]:
+        """
+        回溯路径的节点ID、路段ID和坐标
+        内存引擎按cost_kind（见path_cost_kind）与搜索范围limit（见search_limit）对应搜索树的前驱数组回溯，
+        与路径指标使用同一棵树；数据库引擎按同一代价在范围内的路段上做pgr_aStar
+        """
+        if self.graph is not None:
+            path_nodes, path_edges, coordinates = self._trace_path_in_memory(start_node, end_node, best_metric,
+                                                                             cost_kind or 'distance', limit)
+        elif 'path_edges' in best_metric:  # 模式5、6的路径查询已返回完整路径
+            path_nodes, path_edges = best_metric['path_nodes'], best_metric['path_edges']
+            coordinates = self.snapper.node_coordinates(path_nodes)  # (lon, lat)
         else:
-            # 无终点模式：起点到最优节点
-            sql = """
-            SELECT node, edge 
-            FROM pgr_dijkstra(
-                'SELECT id, source, target, dis_ori as cost, dis_ori as reverse_cost FROM edgesmodified',
-                %s, %s, directed := false
-            ) ORDER BY seq;
-            """
-            self.cursor.execute(sql, (start_node, best_metric['node_id']))
-            path_result = self.cursor.fetchall()
+            # 点到点回溯均使用A*，只在搜索范围内的路段上进行；代价与路径指标一致（偏好代价，模式6为单位代价），
+            # 返回的路线与上报的距离、路段数和比值对应，也与内存引擎的回溯结果一致
+            cost_function = _cost_kind_sql(cost_kind or 'distance')
+            factor = self.astar_factor(cost_function)
+            edges = _astar_edges_sql(cost_function, self.subgraph_envelope(start_node, end_node, limit))
+            if best_metric['node_id'] == -1:  # 直接路径
+                self.cursor.execute(TRACE_PATH_SQL, (edges, start_node, end_node, factor))
+                path_result = self.cursor.fetchall()
+            elif end_node is not None:
+                # 通过中间节点的路径：起点到中间节点，再到终点
+                mid_node = best_metric['node_id']
+                self.cursor.execute(TRACE_PATH_SQL, (edges, start_node, mid_node, factor))
+                path1 = self.cursor.fetchall()
+                self.cursor.execute(TRACE_PATH_SQL, (edges, mid_node, end_node, factor))
+                path2 = self.cursor.fetchall()
+            
+                # 合并路径：第一段的最后一行是中间节点（edge为-1），由第二段的首行替代
+                path_result = path1[:-1] + path2
+            else:
+                # 无终点模式：起点到最优节点
+                self.cursor.execute(TRACE_PATH_SQL, (edges, start_node, best_metric['node_id'], factor))
+                path_result = self.cursor.fetchall()
         
-        # 提取节点和边
-        path_nodes = [row[0] for row in path_result]
-        path_edges = [row[1] for row in path_result if row[1] is not None]  # 去除None值（终点没有outgoing edge）
+            # 提取节点和边
+            path_nodes = [row[0] for row in path_result]
+            # 去除终点行（pgr_aStar中edge为-1）
+            path_edges = [row[1] for row in path_result if row[1] is not None and row[1] >= 0]
         
-        # 获取路径坐标
-        nodes_str = ','.join(map(str, path_nodes))
-        sql = """
-        SELECT x, y 
-        FROM nodesmodified 
-        WHERE id IN ({})
-        ORDER BY array_position(ARRAY[{}], id);
-        """.format(nodes_str, nodes_str)
-
-        self.cursor.execute(sql)
-        coordinates = [(row[0], row[1]) for row in self.cursor.fetchall()]  # (lon, lat)
+            # 路径坐标取自常驻节点索引
+            coordinates = self.snapper.node_coordinates(path_nodes)  # (lon, lat)
         
-        # 获取路段详细信息
-        edge_details = []
-        if path_edges:
-            edges_str = ','.join(map(str, path_edges))
-            sql = """
-            SELECT id, fid, water, bh, shape_leng, frequency, slope, buildng, ndvi, winding,
-                   sport, life, education, finance, traffic, public, scenery, food, poi, svi, gvi,
-                   vw, vei, light, poiden, origlen, score, startx, starty, endx, endy, total,
-                   dij_w1, distance, score_ori, dis_ori, toatl_ori1, toatl_ori2,
-                   ST_AsGeoJSON(geom) as geometry
-            FROM edgesmodified 
-            WHERE id IN ({})
-            ORDER BY array_position(ARRAY[{}], id);
-            """.format(edges_str, edges_str)
-            
-            self.cursor.execute(sql)
-            edge_results = self.cursor.fetchall()
-            
-            for edge in edge_results:
-                edge_info = {
-                    'edge_id': edge[0],
-                    'fid': edge[1],
-                    'water': edge[2],
-                    'bh': edge[3],
-                    'shape_leng': edge[4],
-                    'frequency': edge[5],
-                    'slope': edge[6],
-                    'buildng': edge[7],
-                    'ndvi': edge[8],
-                    'winding': edge[9],
-                    'sport': edge[10],
-                    'life': edge[11],
-                    'education': edge[12],
-                    'finance': edge[13],
-                    'traffic': edge[14],
-                    'public': edge[15],
-                    'scenery': edge[16],
-                    'food': edge[17],
-                    'poi': edge[18],
-                    'svi': edge[19],
-                    'gvi': edge[20],
-                    'vw': edge[21],
-                    'vei': edge[22],
-                    'light': edge[23],
-                    'poiden': edge[24],
-                    'origlen': edge[25],
-                    'score': edge[26],
-                    'startx': edge[27],
-                    'starty': edge[28],
-                    'endx': edge[29],
-                    'endy': edge[30],
-                    'total': edge[31],
-                    'dij_w1': edge[32],
-                    'distance': edge[33],
-                    'score_ori': edge[34],
-                    'dis_ori': edge[35],
-                    'toatl_ori1': edge[36],
-                    'toatl_ori2': edge[37],
-                    'geometry': json.loads(edge[38]) if edge[38] else None
-                }
-                edge_details.append(edge_info)
-
-        return path_nodes, coordinates, edge_details
+        return path_nodes, path_edges, coordinates
+
+    def get_edge_details(self, path_edges: List[int], edge_format: str = 'rows') -> Union[List[Dict], Dict[str, List]]:
+        """
+        按路径顺序获取路段详细信息，取自常驻路段属性（见edge_store.py）
+        edge_format为'rows'时每条路段一个字典，'columns'时每个属性一个数组
+        """
+        with self.span('edge_details', edges=len(path_edges)):
+            store = self.edge_store if self.edge_store is not None else get_edge_store(self.cursor)
+            if edge_format == 'columns':
+                return store.columnar(path_edges)
+            return store.rows(path_edges)
     
-    def create_geojson(self, coordinates: List[Tuple[float, float]], properties: Dict, edge_details: List[Dict] = None) -> Dict:
-        """创建GeoJSON格式的路径，包含边的详细信息"""
+    def select_distinct_routes(self, start_node: int, end_node: Optional[int], metrics: PathMetrics,
+                               k: int, cost_kind: str, limit: Optional[Tuple[str, float]] = None
+                               ) -> List[Tuple[Dict, Tuple[List[int], List[int], List[Tuple[float, float]]]]]:
+        """
+        从同一批候选指标中按比值从高到低挑选k条互不相似的路径
+        候选路径与任一已选路径的路段Jaccard相似度超过ALTERNATIVE_MAX_SIMILARITY时跳过
+        Returns:
+            [(路径指标, (节点ID, 路段ID, 坐标)), ...]，第一条为最优路径
+        """
+        chosen = []
+        chosen_edges = []
+        for metric in metrics.top(k * ALTERNATIVE_CANDIDATES_PER_ROUTE if k > 1 else 1):
+            traced = self.trace_path(start_node, end_node, metric, cost_kind, limit)
+            edges = set(traced[1])
+            if any(edge_jaccard(edges, other) > ALTERNATIVE_MAX_SIMILARITY for other in chosen_edges):
+                continue
+            chosen.append((metric, traced))
+            chosen_edges.append(edges)
+            if len(chosen) == k:
+                break
+        return chosen
+
+    def build_route_result(self, start_node: int, end_node: Optional[int], metric: Dict, params: RouteParams,
+                           path_nodes: List[int], coordinates: List[Tuple[float, float]],
+                           edge_details: Union[List[Dict], Dict[str, List]]) -> RouteResult:
+        """生成GeoJSON（提交异步归档）并组装规划结果"""
+        with self.span('geojson'):
+            return self._build_route_result(start_node, end_node, metric, params, path_nodes, coordinates,
+                                            edge_details)
+
+    def _build_route_result(self, start_node: int, end_node: Optional[int], metric: Dict, params: RouteParams,
+                            path_nodes: List[int], coordinates: List[Tuple[float, float]],
+                            edge_details: Union[List[Dict], Dict[str, List]]) -> RouteResult:
+        coordinates = round_coordinates(coordinates)  # 按ROUTE_COORD_PRECISION截断
+        # UPDATE: 确保使用正确的偏好评分值
+        preference_score = metric.get('preference_total', metric.get('score', 0))
+        logger.info(f"偏好模式 {params.preference_mode.name} 总评分: {preference_score:.2f}")
+
+        # 创建GeoJSON - UPDATE: 添加偏好模式信息和偏好评分
+        properties = {
+            'optimization_ratio': metric['ratio'],
+            'total_score': metric['score'],
+            'preference_score': preference_score,  # UPDATE: 新增偏好评分
+            'total_distance': metric['dist_real'],
+            'total_segments': metric['segments'],
+            'score_per_meter': metric['score_per_meter'],
+            'score_per_segment': metric['score_per_segment'],
+            'constraint_mode': params.constraint_mode.name,
+            'preference_mode': params.preference_mode.name  # UPDATE: 新增偏好模式信息
+        }
+        if 'overlap' in metric:  # 环线往返重叠比例
+            properties['loop_overlap'] = metric['overlap']
+        if 'expanded_nodes' in metric:  # 模式5、6点到点搜索的扩展节点数
+            properties['expanded_nodes'] = metric['expanded_nodes']
+        geojson = self.create_geojson(coordinates, properties, edge_details)
+
+        # GeoJSON随结果直接返回，归档由后台线程异步写入
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        if params.constraint_mode == ConstraintMode.LOOP:
+            filename = f'route_{start_node}_loop_{timestamp}.json'
+        else:
+            filename = f'route_{start_node}_to_{end_node if end_node else "auto"}_{timestamp}.json'
+        archive = get_route_archive()
+        filepath = archive.submit(filename, geojson) if archive else None
+
+        return RouteResult(
+            path_nodes=path_nodes,
+            path_coordinates=coordinates,
+            total_distance=metric['dist_real'],
+            total_segments=metric['segments'],
+            total_score=metric['score'],
+            optimization_ratio=metric['ratio'],
+            score_per_meter=metric['score_per_meter'],
+            score_per_segment=metric['score_per_segment'],
+            geojson=geojson,
+            filename=filename,
+            filepath=filepath
+        )
+
+    def create_geojson(self, coordinates: List[Tuple[float, float]], properties: Dict,
+                       edge_details: Union[List[Dict], Dict[str, List]] = None) -> Dict:
+        """创建GeoJSON格式的路径，包含边的详细信息（逐路段字典或按属性分列的数组）"""
         geojson = {
             "type": "Feature",
             "geometry": {
@@ -806,18 +1493,24 @@ class JoggingPathPlanner:
             "properties": properties
         }
         
-        # 添加边的详细信息
-        if edge_details:
+        # 添加边的详细信息（按列格式时以edge_id数组判断是否为空）
+        if edge_details and (not isinstance(edge_details, dict) or edge_details['edge_id']):
             geojson["properties"]["edge_details"] = edge_details
             
             # 添加统计信息
-            total_score = sum(edge.get('score', 0) or 0 for edge in edge_details)
-            total_distance = sum(edge.get('dis_ori', 0) or 0 for edge in edge_details)
-            avg_score = total_score / len(edge_details) if edge_details else 0
-            avg_distance = total_distance / len(edge_details) if edge_details else 0
+            if isinstance(edge_details, dict):
+                scores, distances = edge_details['score'], edge_details['dis_ori']
+            else:
+                scores = [edge.get('score') for edge in edge_details]
+                distances = [edge.get('dis_ori') for edge in edge_details]
+            total_edges = len(scores)
+            total_score = sum(value or 0 for value in scores)
+            total_distance = sum(value or 0 for value in distances)
+            avg_score = total_score / total_edges if total_edges else 0
+            avg_distance = total_distance / total_edges if total_edges else 0
             
             geojson["properties"]["edge_statistics"] = {
-                "total_edges": len(edge_details),
+                "total_edges": total_edges,
                 "total_score": total_score,
                 "total_distance": total_distance,
                 "avg_score_per_edge": avg_score,
@@ -826,34 +1519,126 @@ class JoggingPathPlanner:
         
         return geojson
     
-    def plan_route(self, params: RouteParams) -> RouteResult:
+    def route_cache_key(self, params: RouteParams, start_node: int, end_node: Optional[int]) -> Tuple:
+        """结果缓存键：吸附后的起终点节点 + 影响结果的规划参数"""
+        mode = params.constraint_mode
+        if mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END, ConstraintMode.LOOP]:
+            target, tolerance = params.target_distance, params.distance_tolerance
+        elif mode in [ConstraintMode.SEGMENTS_WITH_END, ConstraintMode.SEGMENTS_NO_END]:
+            target, tolerance = params.target_segments, params.segments_tolerance
+        else:  # 模式5、6不受约束值影响
+            target = tolerance = None
+        return (self.engine, start_node, end_node, mode, params.preference_mode,
+                target, tolerance, params.w1, params.w2, params.w3, params.k, params.solver, params.edge_format,
+                params.recommend)
+
+    def uses_end_node(self, params: RouteParams) -> bool:
+        """模式1,2,5,6且提供了终点坐标时需要吸附终点"""
+        return (params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END,
+                                           ConstraintMode.SHORTEST_PATH, ConstraintMode.MIN_SEGMENTS_PATH]
+                and params.end_lat is not None and params.end_lon is not None)
+
+    def snap_endpoints(self, params: RouteParams) -> Tuple[int, Optional[int]]:
+        """查找起终点最近的路网节点，并输出吸附信息"""
+        start_node, start_node_lat, start_node_lon = self.find_nearest_node(params.start_lat, params.start_lon)
+        end_node = None
+        
+        # UPDATE: 根据约束模式决定是否需要终点
+        if self.uses_end_node(params):
+            end_node, end_node_lat, end_node_lon = self.find_nearest_node(params.end_lat, params.end_lon)
+            logger.info(f"终点吸附到节点: {end_node} (lat={end_node_lat}, lon={end_node_lon})")
+        
+        logger.info(f"起点吸附到节点: {start_node} (lat={start_node_lat}, lon={start_node_lon})")
+        return start_node, end_node
+
+    def snap_endpoints_batch(self, params_list: List[RouteParams]) -> List[Tuple[int, Optional[int]]]:
+        """批量规划：所有请求的起点和终点各做一次批量吸附"""
+        start_nodes, _ = self.snap_points([p.start_lat for p in params_list], [p.start_lon for p in params_list])
+        with_end = [i for i, p in enumerate(params_list) if self.uses_end_node(p)]
+        end_nodes = {}
+        if with_end:
+            ids, _ = self.snap_points([params_list[i].end_lat for i in with_end],
+                                      [params_list[i].end_lon for i in with_end])
+            end_nodes = dict(zip(with_end, ids.tolist()))
+        return [(int(start_node), end_nodes.get(i)) for i, start_node in enumerate(start_nodes)]
+
+    def recommend_constraints(self, params: RouteParams) -> Dict:
+        """
+        只计算起终点的约束范围与推荐值，不规划路径（供前端在提交前展示有效范围）
+        模式3、4的起点在推荐值表中时直接查表，其余按约束量的双源搜索计算，模式7按环线长度范围计算；
+        模式5、6没有约束值
+        """
+        if params.constraint_mode in [ConstraintMode.SHORTEST_PATH, ConstraintMode.MIN_SEGMENTS_PATH]:
+            raise ValueError("模式5和6没有约束值，不提供推荐")
+        self.validate_params(params)
+        start_node, end_node = self.snap_endpoints(params)
+
+        table = self.graph.recommendation_table() if self.graph is not None else None
+        if table is not None and params.constraint_mode in [ConstraintMode.DISTANCE_NO_END,
+                                                            ConstraintMode.SEGMENTS_NO_END]:
+            constraint_type = 'distance' if params.constraint_mode == ConstraintMode.DISTANCE_NO_END else 'segments'
+            value_range = table.lookup(start_node, constraint_type)
+            if value_range is not None:
+                return dict(self.build_constraint_info(constraint_type, *value_range),
+                            start_node=start_node, end_node=end_node, precomputed=True)
+
+        if params.constraint_mode == ConstraintMode.LOOP:
+            columns = self._query_loop_metrics_in_memory(start_node, replace(params, recommend=True))
+            loop_lengths = columns['dist_real'][columns['overlap'] < 1]
+            if not loop_lengths.size:
+                raise ValueError("无法计算有效环线长度范围，请检查路网数据")
+            constraint_info = self.build_constraint_info('distance', float(loop_lengths.min()),
+                                                         float(loop_lengths.max()))
+        else:
+            constraint_info = self.calculate_dynamic_constraints(start_node, end_node, params.constraint_mode)
+        return dict(constraint_info, start_node=start_node, end_node=end_node, precomputed=False)
+
+    def plan_route(self, params: RouteParams,
+                   snapped_nodes: Optional[Tuple[int, Optional[int]]] = None) -> RouteResult:
         """
         主要路径规划方法 - UPDATE: 支持6种约束模式和7种偏好模式（来自modified-3.m）
+        各阶段与SQL的耗时记录在结果的timings中，并汇总到route_metrics
         
         Args:
             params: 路径规划参数
+            snapped_nodes: 已吸附的(起点节点, 终点节点)，批量规划时传入以跳过逐个吸附
             
         Returns:
             路径规划结果
         """
+        self.timer = StageTimer()
+        status = 'error'
+        try:
+            result = self._plan_route(params, snapped_nodes)
+            status = 'ok'
+            self.timer.stop()
+            # 缓存中的结果不带timings，每次返回带本次耗时的副本
+            return replace(result, timings=self.timer.to_dict())
+        finally:
+            mode = params.constraint_mode.name if isinstance(params.constraint_mode, ConstraintMode) else 'invalid'
+            route_metrics.observe(self.timer, self.engine, mode, status)
+            self.timer = None
+
+    def _plan_route(self, params: RouteParams, snapped_nodes: Optional[Tuple[int, Optional[int]]]) -> RouteResult:
+        """plan_route的各个阶段"""
         logger.info(f"开始路径规划，约束模式: {params.constraint_mode.name}，偏好模式: {params.preference_mode.name}")
         
         # 验证参数
         self.validate_params(params)
         
-        # 查找起终点最近的路网节点，并输出吸附信息
-        start_node, start_node_lat, start_node_lon = self.find_nearest_node(params.start_lat, params.start_lon)
-        end_node = None
-        end_node_lat = end_node_lon = None
-        
-        # UPDATE: 根据约束模式决定是否需要终点
-        if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END, 
-                                    ConstraintMode.SHORTEST_PATH, ConstraintMode.MIN_SEGMENTS_PATH]:
-            if params.end_lat is not None and params.end_lon is not None:
-                end_node, end_node_lat, end_node_lon = self.find_nearest_node(params.end_lat, params.end_lon)
-                logger.info(f"终点吸附到节点: {end_node} (lat={end_node_lat}, lon={end_node_lon})")
+        if snapped_nodes is None:
+            with self.span('snap'):
+                snapped_nodes = self.snap_endpoints(params)
+        start_node, end_node = snapped_nodes
         
-        logger.info(f"起点吸附到节点: {start_node} (lat={start_node_lat}, lon={start_node_lon})")
+        # 相同起终点节点与参数的请求直接返回缓存结果
+        cache_key = self.route_cache_key(params, start_node, end_node)
+        with self.span('cache_lookup') as span:
+            cached = route_cache.get(cache_key)
+            span['hit'] = cached is not None
+        if cached is not None:
+            logger.info("命中路径结果缓存")
+            return cached
         
         # UPDATE: 处理最短路径模式（5和6）
         if params.constraint_mode in [ConstraintMode.SHORTEST_PATH, ConstraintMode.MIN_SEGMENTS_PATH]:
@@ -861,32 +1646,79 @@ class JoggingPathPlanner:
                 raise ValueError("模式5和6需要提供终点坐标")
             
             # 直接计算最短路径
-            best_metric = self.calculate_shortest_path(start_node, end_node, params.constraint_mode, params)
+            with self.span('shortest_path'):
+                best_metric = self.calculate_shortest_path(start_node, end_node, params.constraint_mode, params)
             logger.info(f"最短路径计算完成，距离: {best_metric['dist_real']:.2f}米，路段数: {best_metric['segments']}")
             
             # 获取路径坐标
-            path_nodes, coordinates, edge_details = self.get_optimal_path(start_node, end_node, best_metric)
+            path_nodes, coordinates, edge_details = self.get_optimal_path(start_node, end_node, best_metric,
+                                                                          self.path_cost_kind(params),
+                                                                          params.edge_format)
+            
+        elif params.constraint_mode == ConstraintMode.LOOP:
+            # 环线模式：同一棵起点搜索树上的两条半路径经非树路段闭合，全部候选向量化计算
+            with self.span('loop_metrics') as span:
+                columns = self._query_loop_metrics_in_memory(start_node, params)
+                span['candidates'] = len(columns['loop_edge'])
+            loop_lengths = columns['dist_real'][columns['overlap'] < 1]
+            constraint_info = None
+            if params.recommend and loop_lengths.size:
+                constraint_info = self.build_constraint_info('distance', float(loop_lengths.min()),
+                                                             float(loop_lengths.max()))
+                logger.info(f"环线长度范围: {constraint_info['min_value']:.0f} - {constraint_info['max_value']:.0f} meters")
+            
+            with self.span('select_metrics') as span:
+                metrics = self.select_metrics(columns, params)
+                span['valid_nodes'] = len(metrics)
+            if not len(metrics):
+                raise ValueError("没有找到满足距离约束的环线，请调整目标距离")
+            
+            with self.span('trace_path'):
+                chosen = self.select_distinct_routes(start_node, None, metrics, params.k,
+                                                     self.path_cost_kind(params), self.search_limit(params))
+            best_metric, (path_nodes, path_edges, coordinates) = chosen[0]
+            logger.info(f"最优比值: {best_metric['ratio']:.4f}，往返重叠比例: {best_metric['overlap']:.2%}")
+            edge_details = self.get_edge_details(path_edges, params.edge_format)
+            
+        elif params.solver == 'aco':
+            # 蚁群求解器（模式1、2）：需要推荐值时按双源搜索给出约束范围
+            constraint_info = None
+            if params.recommend:
+                try:
+                    with self.span('dynamic_constraints'):
+                        constraint_info = self.calculate_dynamic_constraints(start_node, end_node,
+                                                                             params.constraint_mode)
+                except ValueError as e:
+                    logger.warning(f"动态约束计算失败: {e}")
+            
+            with self.span('ant_colony'):
+                best_metric, (path_nodes, path_edges, coordinates) = self.solve_ant_colony(start_node, end_node,
+                                                                                           params)
+            logger.info(f"蚁群算法最优比值: {best_metric['ratio']:.4f}")
+            edge_details = self.get_edge_details(path_edges, params.edge_format)
             
         else:
             # UPDATE: 传统约束模式（1-4）- 支持动态约束计算
-            # 首先计算动态约束范围
-            try:
-                constraint_info = self.calculate_dynamic_constraints(start_node, end_node, params.constraint_mode)
-                logger.info(f"动态约束范围: {constraint_info['min_value']:.0f} - {constraint_info['max_value']:.0f} {constraint_info['unit']}")
-                logger.info(f"推荐值: {constraint_info['recommended_values']}")
-            except Exception as e:
-                logger.warning(f"动态约束计算失败，使用固定约束: {e}")
-                constraint_info = None
+            # 内存引擎：一次双源搜索同时服务于节点筛选、约束范围和路径指标
+            search = None
+            if self.graph is not None:
+                with self.span('search'):
+                    search = self.search_endpoints(start_node, end_node, params.constraint_mode,
+                                                   params.preference_mode, self.search_limit(params))
             
             # 获取约束范围
             min_constraint, max_constraint = self.get_constraint_bounds(params)
             logger.info(f"使用约束范围: {min_constraint} - {max_constraint}")
             
-            # 筛选有效节点
-            if params.constraint_mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.DISTANCE_NO_END]:
-                valid_nodes = self.filter_valid_nodes_by_distance(start_node, end_node, min_constraint, max_constraint)
-            else:
-                valid_nodes = self.filter_valid_nodes_by_segments(start_node, end_node, min_constraint, max_constraint)
+            # 筛选有效节点；请求推荐值时由同一批搜索结果给出动态约束范围
+            with self.span('filter_valid_nodes') as span:
+                valid_nodes, constraint_info = self.filter_valid_nodes(start_node, end_node, params.constraint_mode,
+                                                                       min_constraint, max_constraint, search=search,
+                                                                       with_range=params.recommend)
+                span['valid_nodes'] = len(valid_nodes)
+            if constraint_info:
+                logger.info(f"动态约束范围: {constraint_info['min_value']:.0f} - {constraint_info['max_value']:.0f} {constraint_info['unit']}")
+                logger.info(f"推荐值: {constraint_info['recommended_values']}")
             
             if not valid_nodes:
                 print("valid_nodes:", len(valid_nodes))
@@ -895,62 +1727,34 @@ class JoggingPathPlanner:
             logger.info(f"有效节点数: {len(valid_nodes)}")
             
             # 计算路径指标
-            metrics = self.calculate_path_metrics(start_node, end_node, valid_nodes, params)
+            with self.span('path_metrics') as span:
+                metrics = self.calculate_path_metrics(start_node, end_node, valid_nodes, params, search=search)
+                span['candidates'] = len(metrics)
             
-            if not metrics:
+            if not len(metrics):
                 raise ValueError("没有找到有效路径，请调整约束参数")
             
-            # 选择最优路径
-            best_metric = max(metrics, key=lambda x: x['ratio'])
+            # 选择最优路径（k>1时同时挑选互不相似的备选路径）
+            with self.span('trace_path'):
+                chosen = self.select_distinct_routes(start_node, end_node, metrics, params.k,
+                                                     self.path_cost_kind(params), self.search_limit(params))
+            best_metric, (path_nodes, path_edges, coordinates) = chosen[0]
             logger.info(f"最优比值: {best_metric['ratio']:.4f}")
-            
-            # 获取最优路径
-            path_nodes, coordinates, edge_details = self.get_optimal_path(start_node, end_node, best_metric)
-
-        # UPDATE: 确保使用正确的偏好评分值
-        preference_score = best_metric.get('preference_total', best_metric.get('score', 0))
-        logger.info(f"偏好模式 {params.preference_mode.name} 总评分: {preference_score:.2f}")
-
-        # 创建GeoJSON - UPDATE: 添加偏好模式信息和偏好评分
-        geojson = self.create_geojson(coordinates, {
-            'optimization_ratio': best_metric['ratio'],
-            'total_score': best_metric['score'],
-            'preference_score': preference_score,  # UPDATE: 新增偏好评分
-            'total_distance': best_metric['dist_real'],
-            'total_segments': best_metric['segments'],
-            'score_per_meter': best_metric['score_per_meter'],
-            'score_per_segment': best_metric['score_per_segment'],
-            'constraint_mode': params.constraint_mode.name,
-            'preference_mode': params.preference_mode.name  # UPDATE: 新增偏好模式信息
-        }, edge_details)
+            edge_details = self.get_edge_details(path_edges, params.edge_format)
 
-        # 保存GeoJSON到指定临时目录
-        try:
-            temp_folder = self.get_temp_folder()
-            os.makedirs(temp_folder, exist_ok=True)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'route_{start_node}_to_{end_node if end_node else "auto"}_{timestamp}.json'
-            geojson_path = os.path.join(temp_folder, filename)
-            with open(geojson_path, 'w', encoding='utf-8') as f:
-                json.dump(geojson, f, ensure_ascii=False, indent=2)
-            logger.info(f"GeoJSON 路径已保存到: {geojson_path}")
-        except Exception as e:
-            logger.error(f"保存GeoJSON失败: {e}")
-    
         # UPDATE: 返回结果包含动态约束信息
-        result = RouteResult(
-            path_nodes=path_nodes,
-            path_coordinates=coordinates,
-            total_distance=best_metric['dist_real'],
-            total_segments=best_metric['segments'],
-            total_score=best_metric['score'],
-            optimization_ratio=best_metric['ratio'],
-            score_per_meter=best_metric['score_per_meter'],
-            score_per_segment=best_metric['score_per_segment'],
-            geojson=geojson
-        )
+        result = self.build_route_result(start_node, end_node, best_metric, params,
+                                         path_nodes, coordinates, edge_details)
+        if params.k > 1 and params.constraint_mode not in [ConstraintMode.SHORTEST_PATH,
+                                                           ConstraintMode.MIN_SEGMENTS_PATH]:
+            result.alternatives = [
+                self.build_route_result(start_node, end_node, metric, params,
+                                        nodes, coords, self.get_edge_details(edges, params.edge_format))
+                for metric, (nodes, edges, coords) in chosen[1:]
+            ]
+            logger.info(f"备选路径数: {len(result.alternatives)}")
         
-        # UPDATE: 添加动态约束推荐信息（如果计算成功）
+        # UPDATE: 添加动态约束推荐信息（请求推荐值且计算成功时）
         if 'constraint_info' in locals() and constraint_info:
             if constraint_info['type'] == 'distance':
                 result.recommended_distances = constraint_info['recommended_values']
@@ -959,14 +1763,41 @@ class JoggingPathPlanner:
                 result.recommended_segments = constraint_info['recommended_values']
                 result.segments_range = (constraint_info['min_value'], constraint_info['max_value'])
         
+        route_cache.put(cache_key, result)
         return result
 
+def route_result_to_dict(result: RouteResult) -> Dict:
+    """规划结果转换为接口返回的字典"""
+    return {
+        'success': True,
+        'path_nodes': result.path_nodes,
+        'path_coordinates': result.path_coordinates,
+        'total_distance': result.total_distance,
+        'total_segments': result.total_segments,
+        'total_score': result.total_score,
+        'optimization_ratio': result.optimization_ratio,
+        'score_per_meter': result.score_per_meter,
+        'score_per_segment': result.score_per_segment,
+        'geojson': result.geojson,
+        # UPDATE: 新增动态约束推荐信息
+        'recommended_distances': result.recommended_distances,
+        'recommended_segments': result.recommended_segments,
+        'distance_range': result.distance_range,
+        'segments_range': result.segments_range,
+        'filename': result.filename,
+        'filepath': result.filepath,
+        'timings': result.timings,
+        'alternatives': [route_result_to_dict(alt) for alt in result.alternatives or []]
+    }
+
 def plan_jogging_route(start_lat: float, start_lon: float, 
                       end_lat: Optional[float] = None, end_lon: Optional[float] = None,
                       constraint_mode: int = 1, preference_mode: int = 1,  # UPDATE: 新增偏好模式参数
                       target_distance: float = 5000, distance_tolerance: float = 400, 
                       target_segments: int = 40, segments_tolerance: int = 5, 
-                      w1: float = 1.0, w2: float = 0.0, w3: float = 1.0) -> Dict:
+                      w1: float = 1.0, w2: float = 0.0, w3: float = 1.0,
+                      engine: Optional[str] = None, k: int = 1, solver: str = 'heuristic',
+                      edge_format: str = 'rows', recommend: bool = False) -> Dict:
     """
     便捷的路径规划函数 - UPDATE: 支持6种约束模式和7种偏好模式（来自modified-3.m）
     
@@ -975,7 +1806,7 @@ def plan_jogging_route(start_lat: float, start_lon: float,
         start_lon: 起点经度
         end_lat: 终点纬度（可选）
         end_lon: 终点经度（可选）
-        constraint_mode: 约束模式 (1-6)，模式1：有终点，距离约束；模式2：有终点，路段数约束；模式3：无终点，距离约束；模式4：无终点，路段数约束；模式5：有终点，最短距离；模式6：有终点，最少路段数
+        constraint_mode: 约束模式 (1-6)，模式1：有终点，距离约束；模式2：有终点，路段数约束；模式3：无终点，距离约束；模式4：无终点，路段数约束；模式5：有终点，最短距离；模式6：有终点，最少路段数；模式7：无终点，回到起点的环线（距离约束，需内存引擎）
         preference_mode: 偏好模式 (1-7)，模式1：综合得分；模式2：滨水路线；模式3：绿化路线；模式4：视野开阔路线；模式5：夜间灯光充足路线；模式6：设施便利路线；模式7：坡度平缓路线
         target_distance: 目标距离(米)
         distance_tolerance: 距离容差
@@ -984,6 +1815,11 @@ def plan_jogging_route(start_lat: float, start_lon: float,
         w1: Total权重
         w2: 长度权重
         w3: 路段数权重
+        engine: 规划引擎，'memory'（内存CSR图）或'database'（pgr_dijkstra），默认取ROUTE_ENGINE
+        k: 返回的路径条数，k>1时在alternatives中附带互不相似的备选路径（仅模式1-4、7）
+        solver: 求解器，'heuristic'（默认）或'aco'（改进蚁群算法，仅内存引擎、模式1和2）
+        edge_format: 路段详情格式，'rows'（默认，每条路段一个字典）或'columns'（每个属性一个数组）
+        recommend: 是否同时返回推荐约束值与有效范围（默认不计算）
         
     Returns:
         包含路径信息的字典
@@ -1002,34 +1838,38 @@ def plan_jogging_route(start_lat: float, start_lon: float,
         segments_tolerance=segments_tolerance,
         w1=w1,
         w2=w2,
-        w3=w3
+        w3=w3,
+        k=k,
+        solver=solver,
+        edge_format=edge_format,
+        recommend=recommend
     )
     
     # 执行路径规划
-    planner = JoggingPathPlanner()
+    planner = JoggingPathPlanner(engine or ROUTE_ENGINE)
     try:
         planner.connect()
         result = planner.plan_route(params)
-        
+        return route_result_to_dict(result)
+    except Exception as e:
+        logger.error(f"路径规划失败: {e}")
         return {
-            'success': True,
-            'path_nodes': result.path_nodes,
-            'path_coordinates': result.path_coordinates,
-            'total_distance': result.total_distance,
-            'total_segments': result.total_segments,
-            'total_score': result.total_score,
-            'optimization_ratio': result.optimization_ratio,
-            'score_per_meter': result.score_per_meter,
-            'score_per_segment': result.score_per_segment,
-            'geojson': result.geojson,
-            # UPDATE: 新增动态约束推荐信息
-            'recommended_distances': result.recommended_distances,
-            'recommended_segments': result.recommended_segments,
-            'distance_range': result.distance_range,
-            'segments_range': result.segments_range
+            'success': False,
+            'error': str(e)
         }
+    finally:
+        planner.disconnect()
+
+def recommend_jogging_constraints(params: RouteParams, engine: Optional[str] = None) -> Dict:
+    """
+    便捷的推荐值计算函数：返回约束范围（min_value/max_value）、推荐值与吸附后的起终点节点
+    """
+    planner = JoggingPathPlanner(engine or ROUTE_ENGINE)
+    try:
+        planner.connect()
+        return dict(planner.recommend_constraints(params), success=True)
     except Exception as e:
-        logger.error(f"路径规划失败: {e}")
+        logger.error(f"推荐值计算失败: {e}")
         return {
             'success': False,
             'error': str(e)
@@ -1037,6 +1877,122 @@ def plan_jogging_route(start_lat: float, start_lon: float,
     finally:
         planner.disconnect()
 
+def parse_route_params(data: Dict) -> RouteParams:
+    """
+    由接口JSON构造路径规划参数（批量接口逐条使用），参数缺失或格式错误时抛出ValueError
+    """
+    if not isinstance(data, dict):
+        raise ValueError("每条请求必须是JSON对象")
+    for param in ['start_lat', 'start_lon']:
+        if param not in data:
+            raise ValueError(f"缺少必需参数: {param}")
+
+    constraint_mode = int(data.get('constraint_mode', 1))
+    preference_mode = int(data.get('preference_mode', 1))
+    if constraint_mode not in range(1, 8):
+        raise ValueError("constraint_mode必须在1-7之间")
+    if preference_mode not in range(1, 8):
+        raise ValueError("preference_mode必须在1-7之间")
+
+    end_lat = data.get('end_lat')
+    end_lon = data.get('end_lon')
+    return RouteParams(
+        start_lat=float(data['start_lat']),
+        start_lon=float(data['start_lon']),
+        end_lat=float(end_lat) if end_lat is not None else None,
+        end_lon=float(end_lon) if end_lon is not None else None,
+        constraint_mode=ConstraintMode(constraint_mode),
+        preference_mode=PreferenceMode(preference_mode),
+        target_distance=float(data.get('target_distance', 5000)),
+        distance_tolerance=float(data.get('distance_tolerance', 400)),
+        target_segments=int(data.get('target_segments', 40)),
+        segments_tolerance=int(data.get('segments_tolerance', 5)),
+        w1=float(data.get('w1', 1.0)),
+        w2=float(data.get('w2', 0.0)),
+        w3=float(data.get('w3', 1.0)),
+        k=int(data.get('k', 1)),
+        solver=str(data.get('solver', 'heuristic')),
+        edge_format=str(data.get('edge_format', 'rows')),
+        recommend=bool(data.get('recommend', False))
+    )
+
+def plan_jogging_routes_batch(params_list: List[RouteParams], engine: Optional[str] = None,
+                              workers: int = BATCH_WORKERS) -> Iterator[Dict]:
+    """
+    批量路径规划，按完成先后逐条产出结果（与plan_jogging_route格式相同，另附请求序号index）
+    - 全部起终点一次批量吸附
+    - 按起点节点分组，同组请求在同一工作线程中依次规划，共享起点搜索树与结果缓存
+    - 各组在线程池中并行执行，每个工作线程从连接池借用各自的连接
+    - 调用方提前停止读取时（如客户端断开），正在执行的分组在当前请求完成后停止并归还连接
+    """
+    engine = engine or ROUTE_ENGINE
+    errors = []
+    snapped = {}
+
+    planner = JoggingPathPlanner(engine)
+    try:
+        planner.connect()
+        valid = []
+        for i, params in enumerate(params_list):
+            try:
+                planner.validate_params(params)
+                valid.append(i)
+            except ValueError as e:
+                errors.append({'index': i, 'success': False, 'error': str(e)})
+        if valid:
+            snapped = dict(zip(valid, planner.snap_endpoints_batch([params_list[i] for i in valid])))
+    except Exception as e:
+        logger.error(f"批量路径规划失败: {e}")
+        errors = [{'index': i, 'success': False, 'error': str(e)} for i in range(len(params_list))]
+        snapped = {}
+    finally:
+        planner.disconnect()
+
+    yield from errors
+    if not snapped:
+        return
+
+    groups: Dict[int, List[int]] = {}
+    for i, (start_node, _) in snapped.items():
+        groups.setdefault(start_node, []).append(i)
+    logger.info(f"批量路径规划: {len(snapped)}条请求，{len(groups)}个起点")
+
+    results: queue.Queue = queue.Queue()
+    cancelled = threading.Event()
+
+    def plan_group(indices: List[int]):
+        group_planner = JoggingPathPlanner(engine)
+        try:
+            group_planner.connect()
+            for i in indices:
+                if cancelled.is_set():
+                    break
+                try:
+                    result = group_planner.plan_route(params_list[i], snapped[i])
+                    results.put(dict(route_result_to_dict(result), index=i))
+                except Exception as e:
+                    logger.error(f"批量路径规划第{i}条失败: {e}")
+                    results.put({'index': i, 'success': False, 'error': str(e)})
+        except Exception as e:
+            logger.error(f"批量路径规划数据库连接失败: {e}")
+            for i in indices:
+                results.put({'index': i, 'success': False, 'error': str(e)})
+        finally:
+            group_planner.disconnect()
+
+    # 大组先提交，减少最后只剩一个线程在跑的情况
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups))), thread_name_prefix='route-batch')
+    try:
+        for indices in sorted(groups.values(), key=len, reverse=True):
+            executor.submit(plan_group, indices)
+        for _ in range(len(snapped)):
+            yield results.get()
+    finally:
+        # 调用方提前停止读取时（如客户端断开）取消尚未开始的分组，并通知正在执行的分组停止
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def test(test_mode: int = 1):
     """
     路径规划测试
@@ -1128,12 +2084,14 @@ def test(test_mode: int = 1):
 # ================================
 
 try:
-    from flask import Blueprint, request, jsonify
-    import glob
-    import time
+    from flask import Blueprint, Response, request
     
     # 创建蓝图
     route_planning_bp = Blueprint('route_planning', __name__)
+    
+    def json_response(payload: Dict) -> Response:
+        """以route_serializer序列化响应（orjson可用时使用orjson），代替jsonify"""
+        return Response(dumps(payload), mimetype='application/json')
    
     @route_planning_bp.route('/api/get_routes', methods=['POST'])
     def get_routes():
@@ -1147,7 +2105,7 @@ try:
             "start_lon": 120.1788077,
             "end_lat": 30.313572,          # 可选（模式1,2,5,6需要）
             "end_lon": 120.1776803,        # 可选（模式1,2,5,6需要）
-            "constraint_mode": 1,          # 1-6, 默认1（UPDATE: 扩展到6个模式）
+            "constraint_mode": 1,          # 1-7, 默认1
             "preference_mode": 1,          # 1-7, 默认1（UPDATE: 新增偏好模式）
             "target_distance": 6000,       # 目标距离(米), 默认5000
             "distance_tolerance": 500,     # 距离容差, 默认400
@@ -1155,7 +2113,11 @@ try:
             "segments_tolerance": 5,       # 路段数容差, 默认5
             "w1": 1.0,                    # Total权重, 默认1.0
             "w2": 0.0,                    # 长度权重, 默认0.0
-            "w3": 1.0                     # 路段数权重, 默认1.0
+            "w3": 1.0,                    # 路段数权重, 默认1.0
+            "k": 3,                       # 可选，返回路径条数（1-10），默认1，仅模式1-4、7生效
+            "edge_format": "columns",     # 可选，路段详情格式，默认rows（逐路段字典），columns为每个属性一个数组
+            "timings": true,              # 可选，返回各阶段与SQL的耗时（timings字段）
+            "recommend": true             # 可选，同时返回推荐约束值与有效范围（默认不计算）
         }
         
         约束模式说明:
@@ -1165,6 +2127,7 @@ try:
         4: 无终点，路段数约束
         5: 有终点，最短距离（无约束）
         6: 有终点，最少路段数（无约束）
+        7: 无终点，回到起点的环线（距离约束）
         
         偏好模式说明:
         1: 综合得分（原Total）
@@ -1188,15 +2151,17 @@ try:
                 "score_per_segment": 15.67,
                 "recommended_distances": [5000, 5500, 6000],  # UPDATE: 动态推荐值
                 "distance_range": [3200, 8500]                # UPDATE: 有效范围
-            }
-            }
+            },
+            "alternatives": [              # k>1时的备选路径，与最优路径的路段重合度不超过60%
+                {"filename": ..., "filepath": ..., "route_info": {...}, "geojson": {...}}
+            ]
         }
         """
         try:
             # 获取请求数据
             data = request.get_json()
             if not data:
-                return jsonify({
+                return json_response({
                     'success': False,
                     'error': '请求体必须是JSON格式'
                 }), 400
@@ -1205,7 +2170,7 @@ try:
             required_params = ['start_lat', 'start_lon']
             for param in required_params:
                 if param not in data:
-                    return jsonify({
+                    return json_response({
                         'success': False,
                         'error': f'缺少必需参数: {param}'
                     }), 400
@@ -1224,6 +2189,10 @@ try:
             w1 = float(data.get('w1', 1.0))
             w2 = float(data.get('w2', 0.0))
             w3 = float(data.get('w3', 1.0))
+            k = int(data.get('k', 1))
+            solver = str(data.get('solver', 'heuristic'))
+            edge_format = str(data.get('edge_format', 'rows'))
+            recommend = bool(data.get('recommend', False))
             
             # 转换 end_lat 和 end_lon 为 float 或 None
             if end_lat is not None:
@@ -1232,18 +2201,36 @@ try:
                 end_lon = float(end_lon)
             
             # UPDATE: 参数验证扩展到6种约束模式和7种偏好模式
-            if constraint_mode not in range(1, 7):
-                return jsonify({
+            if constraint_mode not in range(1, 8):
+                return json_response({
                     'success': False,
-                    'error': 'constraint_mode必须在1-6之间'
+                    'error': 'constraint_mode必须在1-7之间'
                 }), 400
                 
             if preference_mode not in range(1, 8):
-                return jsonify({
+                return json_response({
                     'success': False,
                     'error': 'preference_mode必须在1-7之间'
                 }), 400
             
+            if not 1 <= k <= MAX_ROUTE_ALTERNATIVES:
+                return json_response({
+                    'success': False,
+                    'error': f'k必须在1-{MAX_ROUTE_ALTERNATIVES}之间'
+                }), 400
+            
+            if solver not in SOLVERS:
+                return json_response({
+                    'success': False,
+                    'error': f"solver必须为{'、'.join(SOLVERS)}之一"
+                }), 400
+            
+            if edge_format not in EDGE_FORMATS:
+                return json_response({
+                    'success': False,
+                    'error': f"edge_format必须为{'、'.join(EDGE_FORMATS)}之一"
+                }), 400
+            
             # 执行路径规划
             logger.info(f"API请求路径规划: start=({start_lat}, {start_lon}), end=({end_lat}, {end_lon}), constraint_mode={constraint_mode}, preference_mode={preference_mode}")
             
@@ -1260,97 +2247,180 @@ try:
                 segments_tolerance=segments_tolerance,
                 w1=w1,
                 w2=w2,
-                w3=w3
+                w3=w3,
+                k=k,
+                solver=solver,
+                edge_format=edge_format,
+                recommend=recommend
             )
             
             if result['success']:
-                # 从temp目录获取最新生成的路径文件
-                config_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../config.yaml'))
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f)
-                    # 'G:/gh_repo/Joy-Run-Smart-Track/backend/temp'
-                temp_folder = config.get('route_planning_temp_folder', 'D:\中地校企联合实训\Yuepaozhihui\JoyRun_SmartTrack\backend\temp')
-                
-                # 获取最近5分钟内生成的路径文件
-                current_time = time.time()
-                pattern = os.path.join(temp_folder, 'route_*.json')
-                recent_files = []
-                
-                for file in glob.glob(pattern):
-                    if os.path.getctime(file) > current_time - 300:  # 5分钟内
-                        recent_files.append(file)
-                
-                if recent_files:
-                    # 获取最新的文件
-                    latest_file = max(recent_files, key=os.path.getctime)
-                    filename = os.path.basename(latest_file)
-                    filepath = latest_file
-                else:
-                    # 如果没有找到最新文件，使用默认命名
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f'route_generated_{timestamp}.json'
-                    filepath = os.path.join(temp_folder, filename)
-                
-                # return jsonify({
-                #     'success': True,
-                #     'filename': filename,
-                #     'filepath': filepath,
-                #     'route_info': {
-                #         'total_distance': result['total_distance'],
-                #         'total_segments': result['total_segments'],
-                #         'optimization_ratio': result['optimization_ratio'],
-                #         'score_per_meter': result['score_per_meter'],
-                #         'score_per_segment': result['score_per_segment']
-                #     }
-                # })
-                # 假设 latest_file 是生成的 GeoJSON 文件路径
-                with open(latest_file, 'r', encoding='utf-8') as f:
-                    geojson_data = json.load(f)
-
-                return jsonify({
-                    'success': True,
-                    'filename': filename,
-                    'filepath': filepath,
-                    'route_info': {
-                        'total_distance': result['total_distance'],
-                        'total_segments': result['total_segments'],
-                        'optimization_ratio': result['optimization_ratio'],
-                        'score_per_meter': result['score_per_meter'],
-                        'score_per_segment': result['score_per_segment'],
-                    },
-                    'geojson': geojson_data   # 直接把路径几何数据返回给前端
-                })
+                response = route_response(result, recommend)
+                response['success'] = True
+                response['alternatives'] = [route_response(alt) for alt in result['alternatives']]
+                if data.get('timings'):
+                    response['timings'] = result['timings']
+                return json_response(response)
             else:
-                return jsonify({
+                return json_response({
                     'success': False,
                     'error': result['error']
                 }), 500
                 
         except ValueError as e:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': f'参数格式错误: {str(e)}'
             }), 400
         except Exception as e:
             logger.error(f"API路径规划失败: {e}")
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': f'服务器内部错误: {str(e)}'
             }), 500
     
+    def route_response(route: Dict, recommend: bool = False) -> Dict:
+        """单条路径的响应内容，recommend时附带推荐约束值与有效范围"""
+        response = {
+            'filename': route['filename'],
+            'filepath': route['filepath'],
+            'route_info': {
+                'total_distance': route['total_distance'],
+                'total_segments': route['total_segments'],
+                'optimization_ratio': route['optimization_ratio'],
+                'score_per_meter': route['score_per_meter'],
+                'score_per_segment': route['score_per_segment'],
+            },
+            'geojson': route['geojson']   # 直接把路径几何数据返回给前端
+        }
+        if recommend:
+            for key in ['recommended_distances', 'distance_range', 'recommended_segments', 'segments_range']:
+                response[key] = route[key]
+        return response
+    
+    @route_planning_bp.route('/api/get_routes/batch', methods=['POST'])
+    def get_routes_batch():
+        """
+        批量路径规划API端点（赛事组织、预计算等连续大量请求使用）
+        
+        请求格式:
+        {
+            "requests": [
+                {"start_lat": 30.32, "start_lon": 120.17, "constraint_mode": 3, "target_distance": 5000},
+                ...                        # 每条参数与 /api/get_routes 相同
+            ],
+            "timings": true                # 可选，每行附带该条规划的各阶段耗时
+        }
+        
+        响应为NDJSON（application/x-ndjson），每条规划完成即输出一行，顺序为完成顺序，用index对应请求:
+        {"index": 1, "success": true, "filename": ..., "route_info": {...}, "geojson": {...}, "alternatives": []}
+        {"index": 0, "success": false, "error": "..."}
+        """
+        data = request.get_json(silent=True)
+        items = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return json_response({
+                'success': False,
+                'error': 'requests必须是非空数组'
+            }), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return json_response({
+                'success': False,
+                'error': f'单次最多{MAX_BATCH_SIZE}条请求'
+            }), 400
+        
+        # 参数格式错误的请求单独返回错误行，不影响其他请求
+        parsed = []
+        invalid = []
+        for i, item in enumerate(items):
+            try:
+                parsed.append((i, parse_route_params(item)))
+            except (ValueError, TypeError) as e:
+                invalid.append({'index': i, 'success': False, 'error': f'参数格式错误: {str(e)}'})
+        logger.info(f"API批量路径规划: {len(items)}条请求，参数错误{len(invalid)}条")
+        with_timings = bool(data.get('timings'))
+        
+        def generate():
+            for line in invalid:
+                yield dumps(line) + b'\n'
+            for result in plan_jogging_routes_batch([params for _, params in parsed]):
+                index, params = parsed[result['index']]
+                if result['success']:
+                    line = route_response(result, params.recommend)
+                    line.update(index=index, success=True,
+                                alternatives=[route_response(alt) for alt in result['alternatives']])
+                    if with_timings:
+                        line['timings'] = result['timings']
+                else:
+                    line = {'index': index, 'success': False, 'error': result['error']}
+                yield dumps(line) + b'\n'
+        
+        return Response(generate(), mimetype='application/x-ndjson')
+    
+    @route_planning_bp.route('/api/get_routes/recommend', methods=['POST'])
+    def get_recommendations():
+        """
+        推荐约束值API端点：只计算约束范围与推荐值，不规划路径
+        
+        请求参数与 /api/get_routes 相同（只使用起终点坐标与constraint_mode，模式5、6不提供推荐）
+        
+        响应格式:
+        {
+            "success": true,
+            "type": "distance",            # distance 或 segments
+            "unit": "meters",
+            "min_value": 1032.5,
+            "max_value": 18840.2,
+            "recommended_values": [1500, 2000, ...],
+            "step": 500,
+            "start_node": 841,
+            "end_node": 2212,
+            "precomputed": false           # 是否取自离线推荐值表（见recommendation_table.py）
+        }
+        """
+        try:
+            params = parse_route_params(request.get_json(silent=True))
+        except (ValueError, TypeError) as e:
+            return json_response({
+                'success': False,
+                'error': f'参数格式错误: {str(e)}'
+            }), 400
+        if params.constraint_mode in [ConstraintMode.SHORTEST_PATH, ConstraintMode.MIN_SEGMENTS_PATH]:
+            return json_response({
+                'success': False,
+                'error': '模式5和6没有约束值，不提供推荐'
+            }), 400
+        
+        result = recommend_jogging_constraints(params)
+        if not result['success']:
+            return json_response(result), 500
+        return json_response(result)
+    
     @route_planning_bp.route('/api/get_routes/health', methods=['GET'])
     def health_check():
         """健康检查端点"""
-        return jsonify({
+        return json_response({
             'status': 'healthy',
             'service': 'route_planning',
+            'db_pools': get_pool_stats(),
+            'route_cache': route_cache.stats(),
             'timestamp': datetime.now().isoformat()
         })
     
+    @route_planning_bp.route('/api/get_routes/metrics', methods=['GET'])
+    def metrics():
+        """规划耗时、各阶段与SQL耗时、返回行数、有效节点数的直方图（Prometheus文本格式）"""
+        stats = route_cache.stats()
+        gauges = {
+            'route_planning_cache_entries': ('结果缓存条目数', stats['size']),
+            'route_planning_cache_hit_rate': ('结果缓存命中率', stats['hit_rate'])
+        }
+        return Response(route_metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+    
     @route_planning_bp.route('/api/get_routes/help', methods=['GET'])
     def api_help():
         """API帮助文档"""
-        return jsonify({
+        return json_response({
             'endpoint': '/api/get_routes',
             'method': 'POST',
             'description': '智能慢跑路径规划API',
@@ -1361,20 +2431,45 @@ try:
             'optional_parameters': {
                 'end_lat': 'float - 终点纬度（可选）',
                 'end_lon': 'float - 终点经度（可选）',
-                'constraint_mode': 'int - 约束模式 (1-4)，默认1',
+                'constraint_mode': 'int - 约束模式 (1-7)，默认1',
                 'target_distance': 'float - 目标距离(米)，默认5000',
                 'distance_tolerance': 'float - 距离容差，默认400',
                 'target_segments': 'int - 目标路段数，默认40',
                 'segments_tolerance': 'int - 路段数容差，默认5',
                 'w1': 'float - Total权重，默认1.0',
                 'w2': 'float - 长度权重，默认0.0',
-                'w3': 'float - 路段数权重，默认1.0'
+                'w3': 'float - 路段数权重，默认1.0',
+                'k': 'int - 返回路径条数 (1-10)，默认1，多出的路径放在alternatives中',
+                'solver': "str - 求解器，'heuristic'（默认）或'aco'（改进蚁群算法，仅模式1和2，内存引擎）",
+                'edge_format': "str - geojson中edge_details的格式，'rows'（默认，逐路段字典）或'columns'（每个属性一个数组，体积更小）",
+                'timings': 'bool - 为true时在响应中返回各阶段与每条SQL的耗时（毫秒）、返回行数与有效节点数',
+                'recommend': 'bool - 为true时同时返回recommended_distances/distance_range（或路段数对应字段），默认不计算'
             },
             'constraint_modes': {
                 '1': '有终点，距离约束',
                 '2': '有终点，路段数约束',
                 '3': '无终点，距离约束',
-                '4': '无终点，路段数约束'
+                '4': '无终点，路段数约束',
+                '5': '有终点，最短距离',
+                '6': '有终点，最少路段数',
+                '7': '无终点，回到起点的环线（距离约束）'
+            },
+            'batch_endpoint': {
+                'endpoint': '/api/get_routes/batch',
+                'method': 'POST',
+                'body': '{"requests": [参数同上, ...]}，最多1000条',
+                'response': 'NDJSON，每条规划完成即返回一行，用index对应请求序号'
+            },
+            'recommend_endpoint': {
+                'endpoint': '/api/get_routes/recommend',
+                'method': 'POST',
+                'body': '参数同上（只使用起终点与constraint_mode，模式5、6除外）',
+                'response': '约束范围min_value/max_value与推荐值recommended_values，不规划路径'
+            },
+            'metrics_endpoint': {
+                'endpoint': '/api/get_routes/metrics',
+                'method': 'GET',
+                'response': 'Prometheus文本格式的规划耗时、阶段耗时、SQL耗时与行数、有效节点数直方图'
             }
         })
 
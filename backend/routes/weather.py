@@ -2,37 +2,32 @@
 import requests
 from datetime import datetime, timedelta
 from flask import Blueprint
-import psycopg2
 from flask import Blueprint, jsonify
+from routes.db_pool import get_connection
 
 weather_bp = Blueprint('weather', __name__)
 
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    # 'database': 'joy_run_db',
-    'database': 'postgres',
-    'user': 'postgres',
-    # 'password': 'postgres1'
-    'password': 'zzq12'
-
-}
+# 天气数据所在数据库（连接信息见db_pool.DB_CONFIG）
+# WEATHER_DATABASE = 'joy_run_db'
+WEATHER_DATABASE = 'postgres'
 
 def get_db_connection():
-    conn = psycopg2.connect(**DB_CONFIG)
-    return conn
+    """从连接池借出连接，用法：with get_db_connection() as conn"""
+    return get_connection(WEATHER_DATABASE)
 
 def fetch_api_key():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT api_key FROM gaode_api ORDER BY id DESC LIMIT 1;")
-    api_key = cur.fetchone()[0]
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT api_key FROM gaode_api ORDER BY id DESC LIMIT 1;")
+        api_key = cur.fetchone()[0]
+        cur.close()
     return api_key
 
 def fetch_and_store_weather():
-    conn = get_db_connection()
+    with get_db_connection() as conn:
+        store_weather(conn)
+
+def store_weather(conn):
     cur = conn.cursor()
     cur.execute("SELECT created_at FROM weather ORDER BY created_at DESC LIMIT 1;")
     last_time = cur.fetchone()
@@ -64,27 +59,25 @@ def fetch_and_store_weather():
             conn.commit()
             print("天气成功更新")
     cur.close()
-    conn.close()
 
 @weather_bp.route('/api/get_weather', methods=['GET'])
 def get_weather():
     print("Fetching weather data...")
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # 获取最新四天的天气
-    cur.execute("""
-        SELECT *
-        FROM (
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        # 获取最新四天的天气
+        cur.execute("""
             SELECT *
-            FROM weather
-            ORDER BY created_at DESC
-            LIMIT 4
-        ) AS latest_weather
-        ORDER BY date ASC
-    """)
-    rows = cur.fetchall()
-    columns = [desc[0] for desc in cur.description]
-    forecasts = [dict(zip(columns, row)) for row in rows]
-    cur.close()
-    conn.close()
+            FROM (
+                SELECT *
+                FROM weather
+                ORDER BY created_at DESC
+                LIMIT 4
+            ) AS latest_weather
+            ORDER BY date ASC
+        """)
+        rows = cur.fetchall()
+        columns = [desc[0] for desc in cur.description]
+        forecasts = [dict(zip(columns, row)) for row in rows]
+        cur.close()
     return jsonify({'forecasts': forecasts})
\ No newline at end of file
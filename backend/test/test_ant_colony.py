@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+蚁群求解器测试（无需数据库）
+在网格路网上验证蚂蚁路径连通起终点、满足约束且比值计算与路径一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from routes.ant_colony import AntColonyConfig, prune_dead_ends
+from routes.routeplanning import JoggingPathPlanner, RouteParams, ConstraintMode
+from test_graph_engine import build_grid_graph
+
+
+def build_planner() -> JoggingPathPlanner:
+    planner = JoggingPathPlanner('memory')
+    planner.graph = build_grid_graph(6, 6)
+    planner.graph.preference_values[0] = np.random.default_rng(1).uniform(1, 10, planner.graph.num_edges)
+    return planner
+
+
+def test_prune_dead_ends():
+    graph = build_grid_graph(3, 3)
+    allowed = np.ones(graph.num_nodes, dtype=bool)
+    allowed[[1, 3]] = False   # 角点0、2、6随之成为死端
+    pruned = prune_dead_ends(graph.indptr, graph.indices, allowed, keep=[8])
+    assert not pruned[[0, 2, 6]].any() and pruned[[4, 5, 7, 8]].all()
+    print("✓ 死端节点被迭代剔除")
+
+
+def test_aco_route_within_constraint():
+    planner = build_planner()
+    graph = planner.graph
+    config = AntColonyConfig(num_ants=10, max_iter=20, seed=0)
+    for mode, bounds in [(ConstraintMode.DISTANCE_WITH_END, dict(target_distance=1200, distance_tolerance=150)),
+                         (ConstraintMode.SEGMENTS_WITH_END, dict(target_segments=12, segments_tolerance=2))]:
+        params = RouteParams(start_lat=30.0, start_lon=120.0, end_lat=30.005, end_lon=120.005,
+                             constraint_mode=mode, solver='aco', **bounds)
+        planner.validate_params(params)
+        metric, (nodes, edges, coordinates) = planner.solve_ant_colony(1, 36, params, config)
+        assert nodes[0] == 1 and nodes[-1] == 36 and len(set(nodes)) == len(nodes)
+        assert len(edges) == len(nodes) - 1 == len(coordinates) - 1
+
+        min_value, max_value = planner.get_constraint_bounds(params)
+        value = metric['dist_real'] if mode == ConstraintMode.DISTANCE_WITH_END else metric['segments']
+        assert min_value <= value <= max_value
+        assert np.isclose(metric['ratio'], metric['preference_total'] / metric['segments'])
+        assert np.isclose(metric['preference_total'],
+                          planner.graph.preference_values[0][np.searchsorted(graph.edge_ids, edges)].sum())
+    print("✓ 蚁群路径连通起终点并满足约束")
+
+
+def test_aco_validation():
+    planner = build_planner()
+    for params in [RouteParams(start_lat=30.0, start_lon=120.0, constraint_mode=ConstraintMode.DISTANCE_NO_END,
+                               solver='aco'),
+                   RouteParams(start_lat=30.0, start_lon=120.0, end_lat=30.005, end_lon=120.005,
+                               solver='aco', k=2),
+                   RouteParams(start_lat=30.0, start_lon=120.0, end_lat=30.005, end_lon=120.005,
+                               solver='genetic')]:
+        try:
+            planner.validate_params(params)
+            assert False, "应拒绝不支持的求解器参数"
+        except ValueError:
+            pass
+    print("✓ 不支持的求解器参数被拒绝")
+
+
+if __name__ == "__main__":
+    test_prune_dead_ends()
+    test_aco_route_within_constraint()
+    test_aco_validation()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+批量路径规划测试（无需数据库）
+在网格路网上验证批量吸附、按起点分组的并行规划与逐条结果
+"""
+
+import sys
+import os
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from routes import routeplanning
+from routes.routeplanning import (JoggingPathPlanner, RouteParams, ConstraintMode, route_cache,
+                                  plan_jogging_routes_batch)
+from test_graph_engine import build_grid_graph
+
+
+class FakeCursor:
+    """路段详情查询返回空结果"""
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def test_batch_matches_single_requests():
+    graph = build_grid_graph(6, 6)
+
+    def connect(planner):
+        planner.cursor = FakeCursor()
+        planner.graph = graph
+        planner.snapper = graph.snapper
+
+    saved = JoggingPathPlanner.connect, routeplanning.get_route_archive
+    JoggingPathPlanner.connect = connect
+    routeplanning.get_route_archive = lambda: None
+    route_cache.clear()
+    try:
+        # 两个起点（节点1与节点8）各若干条请求，外加一条缺少终点的无效请求
+        ends = [(30.005, 120.005), (30.003, 120.004), (30.005, 120.0), (30.002, 120.005)]
+        params_list = [RouteParams(start_lat=30.0, start_lon=120.0, end_lat=lat, end_lon=lon,
+                                   constraint_mode=ConstraintMode.SHORTEST_PATH) for lat, lon in ends]
+        params_list += [RouteParams(start_lat=30.001, start_lon=120.001, end_lat=lat, end_lon=lon,
+                                    constraint_mode=ConstraintMode.SHORTEST_PATH) for lat, lon in ends]
+        params_list.append(RouteParams(start_lat=30.0, start_lon=120.0, constraint_mode=ConstraintMode.SHORTEST_PATH))
+
+        results = list(plan_jogging_routes_batch(params_list, engine='memory', workers=2))
+        assert sorted(r['index'] for r in results) == list(range(len(params_list)))
+
+        by_index = {r['index']: r for r in results}
+        assert not by_index[len(params_list) - 1]['success']
+
+        planner = JoggingPathPlanner('memory')
+        planner.connect()
+        route_cache.clear()
+        for i, params in enumerate(params_list[:-1]):
+            assert by_index[i]['success'], by_index[i]
+            assert by_index[i]['path_nodes'] == planner.plan_route(params).path_nodes
+    finally:
+        JoggingPathPlanner.connect, routeplanning.get_route_archive = saved
+        route_cache.clear()
+    print("✓ 批量规划结果与逐条规划一致")
+
+
+def test_batch_stops_running_group_when_closed():
+    graph = build_grid_graph(6, 6)
+    planned, started, release, released = [], threading.Event(), threading.Event(), threading.Event()
+
+    def connect(planner):
+        planner.cursor = FakeCursor()
+        planner.graph = graph
+        planner.snapper = graph.snapper
+
+    def plan_route(planner, params, snapped_nodes=None):
+        planned.append(params)
+        if len(planned) == 2:      # 第二条请求执行期间调用方停止读取
+            started.set()
+            release.wait(5)
+        return saved[2](planner, params, snapped_nodes)
+
+    def disconnect(planner):
+        saved[3](planner)
+        if threading.current_thread().name.startswith('route-batch'):
+            released.set()
+
+    saved = (JoggingPathPlanner.connect, routeplanning.get_route_archive,
+             JoggingPathPlanner.plan_route, JoggingPathPlanner.disconnect)
+    JoggingPathPlanner.connect, JoggingPathPlanner.plan_route = connect, plan_route
+    JoggingPathPlanner.disconnect = disconnect
+    routeplanning.get_route_archive = lambda: None
+    route_cache.clear()
+    try:
+        # 同一起点的请求在同一分组中依次规划
+        ends = [(30.005, 120.005), (30.003, 120.004), (30.005, 120.0), (30.002, 120.005)]
+        params_list = [RouteParams(start_lat=30.0, start_lon=120.0, end_lat=lat, end_lon=lon,
+                                   constraint_mode=ConstraintMode.SHORTEST_PATH) for lat, lon in ends]
+        batch = plan_jogging_routes_batch(params_list, engine='memory', workers=1)
+        assert next(batch)['success']
+        assert started.wait(5)
+        batch.close()
+        release.set()
+
+        # 分组在当前请求完成后停止，不再规划剩余请求，并归还连接
+        assert released.wait(5)
+        assert len(planned) == 2
+    finally:
+        (JoggingPathPlanner.connect, routeplanning.get_route_archive,
+         JoggingPathPlanner.plan_route, JoggingPathPlanner.disconnect) = saved
+        route_cache.clear()
+    print("✓ 停止读取后正在执行的分组提前结束并归还连接")
+
+
+if __name__ == "__main__":
+    test_batch_matches_single_requests()
+    test_batch_stops_running_group_when_closed()
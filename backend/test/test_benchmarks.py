@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+基准测试脚本冒烟测试（无需数据库）
+验证合成路网的规模与属性列，以及在小路网上跑通 引擎 × 模式 组合的计时
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import numpy as np
+
+from routes import routeplanning
+from routes.edge_store import EDGE_DETAIL_COLUMNS
+from routes.routeplanning import ConstraintMode, PreferenceMode, route_cache
+from synthetic_network import generate_network
+from route_planning import run_network
+
+
+def test_synthetic_networks():
+    for kind in ['grid', 'rgg']:
+        network = generate_network(kind, 500, seed=1)
+        graph, store = network.graph, network.edge_store
+        assert graph.num_edges == 500
+        assert np.array_equal(store.edge_ids, graph.edge_ids)
+        assert set(store.columns) == set(EDGE_DETAIL_COLUMNS)
+        details = store.rows(graph.edge_ids[:3].tolist())
+        assert details[0]['dis_ori'] == graph.edge_values['dis_ori'][0]
+        assert details[0]['geometry']['type'] == 'LineString'
+    print("✓ 合成路网规模与属性列正确")
+
+
+def test_run_network():
+    saved = route_cache.max_entries, routeplanning.get_route_archive
+    route_cache.max_entries = 0
+    routeplanning.get_route_archive = lambda: None
+    try:
+        network = generate_network('grid', 300, seed=2)
+        report = run_network(network, ['memory', 'memory-ch'],
+                             [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SHORTEST_PATH, ConstraintMode.LOOP],
+                             [PreferenceMode.COMPREHENSIVE], queries=2, rng=np.random.default_rng(0))
+    finally:
+        route_cache.max_entries, routeplanning.get_route_archive = saved
+    combos = [(r['engine'], r['constraint_mode']) for r in report['results']]
+    assert combos == [('memory', 'DISTANCE_WITH_END'), ('memory', 'SHORTEST_PATH'), ('memory', 'LOOP'),
+                      ('memory-ch', 'SHORTEST_PATH')]
+    for result in report['results']:
+        assert result['queries'] == 2 and result['p95_ms'] >= result['p50_ms'] > 0
+        assert result['peak_memory_mb'] > 0
+    assert set(report['contraction_seconds']) >= {'preference_1', 'hops'}
+    print("✓ 基准测试在小路网上跑通")
+
+
+if __name__ == "__main__":
+    test_synthetic_networks()
+    test_run_network()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+收缩层次测试（无需数据库）
+在网格路网上验证CH双向搜索与Dijkstra/BFS结果一致，以及预处理文件的保存与指纹校验
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import tempfile
+
+import numpy as np
+
+from routes.contraction import ContractionHierarchy, build_all, graph_fingerprint, load_hierarchy
+from test_graph_engine import build_grid_graph
+
+
+def test_query_matches_dijkstra():
+    graph = build_grid_graph(7, 8)
+    rng = np.random.default_rng(3)
+    for kind in ['preference_1', 'hops']:
+        weights = graph.contraction_weights(kind) * rng.uniform(0.5, 2.0, graph.num_edges)
+        hierarchy = ContractionHierarchy.build(graph.num_nodes, graph.edge_source, graph.edge_target, weights)
+        for source in range(0, graph.num_nodes, 5):
+            reference = graph.dijkstra(source, weights).dist
+            for target in range(graph.num_nodes):
+                cost, nodes, edges, _ = hierarchy.query(source, target)
+                assert np.isclose(cost, reference[target])
+                assert nodes[0] == source and nodes[-1] == target and len(edges) == len(nodes) - 1
+                assert np.isclose(weights[edges].sum(), cost)
+                for a, b, e in zip(nodes[:-1], nodes[1:], edges):
+                    assert {a, b} == {int(graph.edge_source[e]), int(graph.edge_target[e])}
+    print("✓ CH查询与Dijkstra代价一致，展开路径连续")
+
+
+def test_save_load_and_fingerprint():
+    graph = build_grid_graph(4, 5)
+    with tempfile.TemporaryDirectory() as folder:
+        build_all(graph, folder, ['preference_1'])
+        weights = graph.contraction_weights('preference_1')
+        hierarchy = load_hierarchy(folder, 'preference_1',
+                                   graph_fingerprint(graph.edge_source, graph.edge_target, weights))
+        assert hierarchy is not None
+        assert load_hierarchy(folder, 'preference_1',
+                              graph_fingerprint(graph.edge_source, graph.edge_target, weights * 2)) is None
+        assert load_hierarchy(folder, 'hops', '') is None
+
+        graph.hierarchies['preference_1'] = hierarchy
+        nodes, edges, _ = graph.point_to_point(0, graph.num_nodes - 1, 'preference_1')
+        expected = graph.dijkstra(0, weights).dist[graph.num_nodes - 1]
+        assert nodes[-1] == graph.num_nodes - 1 and np.isclose(weights[edges].sum(), expected)
+    print("✓ 预处理文件可加载，路网变化后指纹校验失效")
+
+
+if __name__ == "__main__":
+    test_query_matches_dijkstra()
+    test_save_load_and_fingerprint()
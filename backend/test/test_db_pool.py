@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+数据库连接池测试（无需数据库）
+以内存中的假连接替代psycopg2连接，验证借还、健康检查与耗尽统计
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import time
+
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from routes.db_pool import ConnectionPool
+
+
+class FakeInfo:
+    transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    def __init__(self, closed=0):
+        self.closed = closed
+        self.info = FakeInfo()
+
+    def cursor(self):
+        raise AssertionError("健康检查已关闭，不应访问游标")
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    """替代ThreadedConnectionPool，记录借出与丢弃的连接"""
+
+    def __init__(self, broken=0):
+        self.broken = broken    # 先返回的失效连接数
+        self.discarded = 0
+
+    def getconn(self):
+        if self.broken:
+            self.broken -= 1
+            return FakeConnection(closed=1)
+        return FakeConnection()
+
+    def putconn(self, conn, close=False):
+        if close:
+            self.discarded += 1
+
+
+def build_pool(maxconn=2, timeout=0.05, broken=0, retries=3):
+    pool = ConnectionPool({'database': 'test'}, minconn=0, maxconn=maxconn, timeout=timeout, health_check=False,
+                          retries=retries)
+    pool._pool = FakePool(broken)
+    return pool
+
+
+def test_checkout_and_return():
+    pool = build_pool()
+    with pool.connection() as conn:
+        assert not conn.closed
+        assert pool.stats()['in_use'] == 1
+    stats = pool.stats()
+    assert stats['in_use'] == 0 and stats['checkouts'] == 1
+    print("✓ 连接借出与归还正常")
+
+
+def test_broken_connection_replaced():
+    pool = build_pool(broken=1)
+    conn = pool.getconn()
+    assert not conn.closed
+    assert pool._pool.discarded == 1
+    assert pool.stats()['health_check_failures'] == 1
+    pool.putconn(conn)
+
+    # 重新获取的连接同样失效时继续重试
+    pool = build_pool(broken=3, retries=3)
+    conn = pool.getconn()
+    assert not conn.closed and pool._pool.discarded == 3
+    pool.putconn(conn)
+
+    # 重试次数用尽时抛出PoolError，并释放占用的名额
+    pool = build_pool(maxconn=1, broken=5, retries=2)
+    try:
+        pool.getconn()
+        assert False, "应抛出PoolError"
+    except PoolError:
+        pass
+    assert pool._pool.discarded == 3 and pool.stats()['in_use'] == 0
+    pool._pool.broken = 0
+    pool.putconn(pool.getconn())
+    print("✓ 失效连接被丢弃并重新获取")
+
+
+def test_exhaustion_and_wait():
+    pool = build_pool(maxconn=1)
+    conn = pool.getconn()
+    try:
+        pool.getconn()
+        assert False, "连接池耗尽时应抛出PoolError"
+    except PoolError:
+        pass
+    assert pool.stats()['exhausted'] == 1
+
+    # 另一线程稍后归还连接，等待方应取得连接并记录等待时间
+    pool.timeout = 2.0
+    releaser = threading.Timer(0.05, pool.putconn, args=(conn,))
+    releaser.start()
+    started = time.perf_counter()
+    conn = pool.getconn()
+    assert time.perf_counter() - started >= 0.04
+    releaser.join()
+    pool.putconn(conn)
+
+    stats = pool.stats()
+    assert stats['waits'] == 2 and stats['exhausted'] == 1
+    assert stats['wait_seconds_max'] >= 0.04 and stats['in_use'] == 0
+    print("✓ 连接池耗尽与等待统计正确")
+
+
+if __name__ == "__main__":
+    test_checkout_and_return()
+    test_broken_connection_replaced()
+    test_exhaustion_and_wait()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+常驻路段属性测试（无需数据库）
+验证按路段ID取详情的顺序、NULL与整数列处理、按列格式，以及数据库引擎复用模式5、6的路径
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+
+from routes.edge_store import EDGE_DETAIL_COLUMNS, EdgeAttributeStore
+from routes.routeplanning import JoggingPathPlanner
+from test_graph_engine import build_grid_graph
+
+
+class EdgeRowsCursor:
+    """返回固定edgesmodified行的游标"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+class NoQueryCursor:
+    """任何查询都视为错误"""
+
+    def execute(self, sql, params=None):
+        raise AssertionError(f"不应查询数据库: {sql}")
+
+
+def edge_row(edge_id, score, dis_ori):
+    values = {name: float(edge_id) for name in EDGE_DETAIL_COLUMNS}
+    values.update({'score': score, 'dis_ori': dis_ori, 'fid': edge_id - 1})
+    geometry = json.dumps({'type': 'LineString', 'coordinates': [[120.0, 30.0], [120.001, 30.0]]})
+    return (edge_id,) + tuple(values[name] for name in EDGE_DETAIL_COLUMNS) + (geometry,)
+
+
+def test_rows_and_columns():
+    rows = [edge_row(7, 2.5, 100.0), edge_row(3, None, 50.0), edge_row(5, 1.0, None)]
+    rows[2] = rows[2][:-1] + (None,)   # 几何为NULL
+    store = EdgeAttributeStore.from_cursor(EdgeRowsCursor(rows))
+
+    # 按路径顺序返回，不存在的路段跳过
+    details = store.rows([5, 7, 99, 3])
+    assert [edge['edge_id'] for edge in details] == [5, 7, 3]
+    assert list(details[0]) == ['edge_id'] + EDGE_DETAIL_COLUMNS + ['geometry']
+    assert details[0]['dis_ori'] is None and details[0]['geometry'] is None
+    assert details[2]['score'] is None
+    assert details[1]['fid'] == 6 and isinstance(details[1]['fid'], int)
+    assert details[1]['geometry']['type'] == 'LineString'
+
+    # 按列格式与逐路段格式内容一致
+    columns = store.columnar([5, 7, 99, 3])
+    assert set(columns) == set(details[0])
+    for i, edge in enumerate(details):
+        assert all(columns[name][i] == value for name, value in edge.items())
+    print("✓ 路段详情按路径顺序返回，按列格式与逐路段格式一致")
+
+
+def test_geojson_statistics_match():
+    store = EdgeAttributeStore.from_cursor(EdgeRowsCursor([edge_row(1, 2.0, 10.0), edge_row(2, None, 30.0)]))
+    planner = JoggingPathPlanner('database')
+    by_rows = planner.create_geojson([], {}, store.rows([1, 2]))['properties']['edge_statistics']
+    by_columns = planner.create_geojson([], {}, store.columnar([1, 2]))['properties']['edge_statistics']
+    assert by_rows == by_columns
+    assert by_rows['total_edges'] == 2 and by_rows['total_score'] == 2.0 and by_rows['total_distance'] == 40.0
+    assert 'edge_details' not in planner.create_geojson([], {}, store.columnar([]))['properties']
+    print("✓ 两种格式的路段统计一致")
+
+
+def test_database_trace_reuses_shortest_path():
+    graph = build_grid_graph(4, 4)
+    planner = JoggingPathPlanner('database')
+    planner.cursor = NoQueryCursor()
+    planner.snapper = graph.snapper
+    metric = {'node_id': -1, 'path_nodes': [1, 2, 6], 'path_edges': [1, 5]}
+    path_nodes, path_edges, coordinates = planner.trace_path(1, 6, metric)
+    assert path_nodes == [1, 2, 6] and path_edges == [1, 5]
+    idx = graph.node_indices([1, 2, 6])
+    assert coordinates == list(zip(graph.node_x[idx].tolist(), graph.node_y[idx].tolist()))
+    print("✓ 数据库引擎复用模式5、6的路径，坐标取自节点索引")
+
+
+if __name__ == "__main__":
+    test_rows_and_columns()
+    test_geojson_statistics_match()
+    test_database_trace_reuses_shortest_path()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+内存路网图引擎测试（无需数据库）
+使用小型网格路网验证Dijkstra、BFS、路径回溯与沿树累加
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from routes.graph_engine import RoadGraph, EDGE_VALUE_COLUMNS
+
+
+def build_grid_graph(rows: int = 4, cols: int = 5) -> RoadGraph:
+    """构建rows x cols的网格路网，节点ID从1开始，边长按行列变化"""
+    node_ids, xs, ys = [], [], []
+    for r in range(rows):
+        for c in range(cols):
+            node_ids.append(r * cols + c + 1)
+            xs.append(120.0 + c * 0.001)
+            ys.append(30.0 + r * 0.001)
+
+    sources, targets, lengths = [], [], []
+    for r in range(rows):
+        for c in range(cols):
+            nid = r * cols + c + 1
+            if c + 1 < cols:
+                sources.append(nid)
+                targets.append(nid + 1)
+                lengths.append(100.0 + r * 10)
+            if r + 1 < rows:
+                sources.append(nid)
+                targets.append(nid + cols)
+                lengths.append(100.0 + c * 5)
+
+    num_edges = len(sources)
+    values = {name: np.ones(num_edges) for name in EDGE_VALUE_COLUMNS}
+    values['dis_ori'] = np.array(lengths)
+    return RoadGraph(np.array(node_ids), np.array(xs), np.array(ys),
+                     np.arange(1, num_edges + 1), np.array(sources), np.array(targets), values)
+
+
+def brute_force_dijkstra(graph: RoadGraph, source: int, weights: np.ndarray) -> np.ndarray:
+    """Bellman-Ford参考实现"""
+    dist = np.full(graph.num_nodes, np.inf)
+    dist[source] = 0
+    for _ in range(graph.num_nodes):
+        for e in range(graph.num_edges):
+            a, b, w = graph.edge_source[e], graph.edge_target[e], weights[e]
+            dist[b] = min(dist[b], dist[a] + w)
+            dist[a] = min(dist[a], dist[b] + w)
+    return dist
+
+
+def test_dijkstra_matches_reference():
+    graph = build_grid_graph()
+    weights = graph.edge_column('dis_ori')
+    tree = graph.dijkstra(0, weights)
+    assert np.allclose(tree.dist, brute_force_dijkstra(graph, 0, weights))
+    print("✓ Dijkstra距离与参考实现一致")
+
+
+def test_dijkstra_parallel_and_zero_edges():
+    # 节点1-2间两条平行路段，2-3为零长度路段
+    values = {name: np.ones(3) for name in EDGE_VALUE_COLUMNS}
+    values['dis_ori'] = np.array([50.0, 30.0, 0.0])
+    graph = RoadGraph(np.array([1, 2, 3]), np.array([120.0, 120.001, 120.002]), np.array([30.0, 30.0, 30.0]),
+                      np.array([1, 2, 3]), np.array([1, 2, 2]), np.array([2, 1, 3]), values)
+    tree = graph.dijkstra(0, graph.edge_column('dis_ori'))
+    assert np.allclose(tree.dist, [0.0, 30.0, 30.0])
+    assert tree.pred_edge.tolist() == [-1, 1, 2] and tree.pred_node.tolist() == [-1, 0, 1]
+    print("✓ Dijkstra平行路段取代价最小者，零长度路段可达")
+
+
+def test_accumulate_and_path():
+    graph = build_grid_graph()
+    weights = graph.edge_column('dis_ori')
+    tree = graph.dijkstra(0, weights)
+    sums = graph.accumulate(tree, np.column_stack([weights, np.ones(graph.num_edges)]))
+    assert np.allclose(sums[:, 0], tree.dist)
+
+    target = graph.num_nodes - 1
+    nodes, edges = graph.path(tree, target)
+    assert nodes[0] == 0 and nodes[-1] == target
+    assert len(edges) == sums[target, 1]
+    assert np.isclose(weights[edges].sum(), tree.dist[target])
+    print("✓ 沿树累加与路径回溯正确")
+
+
+def test_bfs_hops():
+    graph = build_grid_graph(rows=4, cols=5)
+    tree = graph.bfs(0)
+    # 网格中最少路段数为曼哈顿距离
+    expected = np.array([r + c for r in range(4) for c in range(5)], dtype=float)
+    assert np.array_equal(tree.dist, expected)
+
+    bounded = graph.bfs(0, max_hops=2)
+    assert np.isinf(bounded.dist[expected > 2]).all()
+    print("✓ BFS跳数正确")
+
+
+def test_dual_source_search():
+    graph = build_grid_graph()
+    weights = graph.edge_column('dis_ori')
+    start, end = 0, graph.num_nodes - 1
+    result = graph.dual_source_search(start, end, {'length': 'distance', 'hops': 'hops'})
+
+    expected = graph.dijkstra(start, weights).dist + graph.dijkstra(end, weights).dist
+    assert np.allclose(result.cost('length'), expected)
+    assert np.allclose(result.column('length', 'dis_ori'), expected)
+    assert np.array_equal(result.cost('hops'), result.column('hops', 'segments'))
+    assert result.cost('hops')[start] == graph.bfs(start).dist[end]
+    print("✓ 双源搜索结果与单独搜索一致")
+
+
+def test_tree_cache_and_path_via():
+    graph = build_grid_graph()
+    tree = graph.shortest_path_tree(0, 'preference_1')
+    assert graph.shortest_path_tree(0, 'preference_1') is tree
+    assert tree.dist.dtype == np.float32 and tree.pred_node.dtype == np.int32
+    assert graph.tree_cache.stats()['hits'] == 1
+
+    # 途经点路径：起点树到途经点 + 终点树回到终点
+    end, via = graph.num_nodes - 1, 7
+    end_tree = graph.shortest_path_tree(end, 'preference_1')
+    nodes, edges = graph.path_via(tree, end_tree, via)
+    assert nodes[0] == 0 and nodes[-1] == end and via in nodes
+    assert len(edges) == len(nodes) - 1
+    assert np.isclose(graph.preference_costs[0][edges].sum(), tree.dist[via] + end_tree.dist[via], rtol=1e-5)
+
+    # 超出内存上限时淘汰最久未使用的树
+    graph.tree_cache.max_bytes = tree.nbytes * 2
+    for source in range(1, 4):
+        graph.shortest_path_tree(source, 'distance')
+    stats = graph.tree_cache.stats()
+    assert stats['trees'] == 2 and stats['bytes'] <= stats['max_bytes'] and stats['evictions'] > 0
+    print("✓ 搜索树缓存与途经点回溯正确")
+
+
+def test_preference_tables():
+    graph = build_grid_graph()
+    dis_ori = graph.edge_column('dis_ori')
+    # 绿化偏好为 ndvi + gvi，网格中均为1，代价应为 dis_ori / 2
+    assert np.allclose(graph.preference_values[2], 2.0)
+    assert np.allclose(graph.preference_costs[2], dis_ori / 2)
+
+    # 偏好为0或NULL的路段代价为 dis_ori * 10
+    values = {name: np.ones(graph.num_edges) for name in EDGE_VALUE_COLUMNS}
+    values['dis_ori'] = dis_ori
+    values['water_mtotal'][0] = 0.0
+    values['water_mtotal'][1] = np.nan
+    graph = RoadGraph(graph.node_ids, graph.node_x, graph.node_y, graph.edge_ids,
+                      graph.node_ids[graph.edge_source], graph.node_ids[graph.edge_target], values)
+    assert np.allclose(graph.preference_costs[1][:2], dis_ori[:2] * 10)
+    assert np.allclose(graph.preference_costs[1][2:], dis_ori[2:])
+    print("✓ 偏好代价表预计算正确")
+
+
+def test_common_ancestors_and_loop_path():
+    graph = build_grid_graph(5, 6)
+    tree = graph.shortest_path_tree(7, 'distance')
+
+    def ancestors(node):
+        chain = [node]
+        while node != tree.source:
+            node = int(tree.pred_node[node])
+            chain.append(node)
+        return chain
+
+    a, b = graph.edge_source.astype(np.int64), graph.edge_target.astype(np.int64)
+    lca = graph.lowest_common_ancestors(tree, a, b)
+    expected = [next(n for n in ancestors(u) if n in set(ancestors(v))) for u, v in zip(a, b)]
+    assert lca.tolist() == expected
+
+    # 非树路段闭合成回到起点的环线
+    edge = next(e for e in range(graph.num_edges)
+                if tree.pred_edge[graph.edge_source[e]] != e and tree.pred_edge[graph.edge_target[e]] != e)
+    nodes, edges = graph.loop_path(tree, edge)
+    assert nodes[0] == nodes[-1] == 7 and edge in edges
+    assert len(edges) == len(nodes) - 1
+    for (u, v), e in zip(zip(nodes, nodes[1:]), edges):
+        assert {u, v} == {int(graph.edge_source[e]), int(graph.edge_target[e])}
+    print("✓ 最近公共祖先与环线回溯正确")
+
+
+
+def test_astar_matches_dijkstra():
+    graph = build_grid_graph(12, 12)
+    # 两条长度与坐标明显不符的异常路段，作为例外路段处理后A*仍须给出最短路径
+    graph.edge_values['dis_ori'][[3, 150]] = 0.5
+    for kind in ['distance', 'preference_1', 'hops']:
+        weights = graph.contraction_weights(kind)
+        heuristic = graph.astar_heuristic(kind)
+        assert heuristic.scale > 0
+        reference = graph.dijkstra(0, weights).dist
+        for target in range(1, graph.num_nodes, 7):
+            tree, _ = graph.astar(0, target, weights, heuristic)
+            nodes, edges = graph.path(tree, target)
+            assert nodes[0] == 0 and nodes[-1] == target
+            assert np.isclose(weights[edges].sum(), reference[target])
+    assert {3, 150} <= set(graph.astar_heuristic('distance').exception_edges.tolist())
+    # 启发式使靠近起点的目标只扩展少量节点
+    _, expanded = graph.astar(0, 26, graph.edge_column('dis_ori'), graph.astar_heuristic('distance'))
+    assert expanded < graph.num_nodes // 4
+    print("✓ A*距离与Dijkstra一致且扩展节点更少")
+
+
+def test_bounded_search():
+    graph = build_grid_graph(rows=10, cols=12)
+    start, end, limit = 0, 25, 900.0
+    kinds = {'length': 'distance', 'hops': 'hops', 'preference': 'preference_1'}
+    full = build_grid_graph(rows=10, cols=12).dual_source_search(start, end, kinds)
+    bounded = graph.dual_source_search(start, end, kinds, limit=('dis_ori', limit))
+
+    # 椭圆内节点的各项代价与完整搜索一致，所有搜索树只保留椭圆内的节点
+    inside = full.cost('length') <= limit
+    for name in kinds:
+        assert np.allclose(bounded.cost(name)[inside], full.cost(name)[inside], rtol=1e-5)
+        assert not np.isfinite(bounded.cost(name))[~inside].any()
+    assert np.array_equal(np.isfinite(bounded.cost('length')), inside) and not inside.all()
+
+    # 无终点为圆；已有完整搜索树时直接复用
+    circle = graph.dual_source_search(start, None, {'hops': 'hops'}, limit=('segments', 5))
+    hops = graph.bfs(start).dist
+    assert np.array_equal(circle.cost('hops')[hops <= 5], hops[hops <= 5])
+    assert np.isinf(circle.cost('hops')[hops > 5]).all()
+    tree = graph.shortest_path_tree(end, 'distance')
+    assert graph.dual_source_search(end, None, {'length': 'distance'}, limit=('dis_ori', limit)).start_trees['length'] is tree
+    print("✓ 有界搜索在范围内与完整搜索一致")
+
+
+def test_bounded_cache_key_includes_column():
+    graph = build_grid_graph(rows=10, cols=12)
+    start, end, value = 0, 25, 6.0
+    kinds = {'length': 'distance', 'preference': 'preference_1'}
+    # 同一数值先作为路段数上限、再作为距离上限搜索，不应复用路段数界的搜索树
+    graph.dual_source_search(start, end, kinds, limit=('segments', value))
+    graph.dual_source_search(start, None, kinds, limit=('segments', value))
+    by_distance = graph.dual_source_search(start, end, kinds, limit=('dis_ori', value))
+    circle = graph.dual_source_search(start, None, kinds, limit=('dis_ori', value))
+    reference = build_grid_graph(rows=10, cols=12)
+    expected = reference.dual_source_search(start, end, kinds, limit=('dis_ori', value))
+    expected_circle = reference.dual_source_search(start, None, kinds, limit=('dis_ori', value))
+    for name in kinds:
+        assert np.array_equal(by_distance.cost(name), expected.cost(name))
+        assert np.array_equal(circle.cost(name), expected_circle.cost(name))
+
+    # 反过来：距离界的树不用于路段数界
+    graph = build_grid_graph(rows=10, cols=12)
+    graph.dual_source_search(start, None, kinds, limit=('dis_ori', value))
+    by_segments = graph.dual_source_search(start, None, kinds, limit=('segments', value))
+    hops = graph.bfs(start).dist
+    assert np.isfinite(by_segments.cost('length')[hops <= value]).all()
+    print("✓ 有界搜索树的缓存键区分约束列")
+
+
+if __name__ == "__main__":
+    test_dijkstra_matches_reference()
+    test_dijkstra_parallel_and_zero_edges()
+    test_accumulate_and_path()
+    test_bfs_hops()
+    test_dual_source_search()
+    test_tree_cache_and_path_via()
+    test_preference_tables()
+    test_common_ancestors_and_loop_path()
+    test_astar_matches_dijkstra()
+    test_bounded_search()
+    test_bounded_cache_key_includes_column()
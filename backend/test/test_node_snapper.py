@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+节点吸附测试（无需数据库）
+验证KD树与NumPy回退方案的最近节点结果与暴力搜索一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from routes import node_snapper
+from routes.node_snapper import NodeSnapper, haversine_distance
+
+
+def build_random_snapper(num_nodes: int = 2000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    node_ids = rng.permutation(num_nodes) + 1000
+    node_x = 120.1 + rng.random(num_nodes) * 0.1
+    node_y = 30.2 + rng.random(num_nodes) * 0.1
+    return node_ids, node_x, node_y
+
+
+def test_snap_points_matches_brute_force():
+    node_ids, node_x, node_y = build_random_snapper()
+    snapper = NodeSnapper(node_ids, node_x, node_y)
+
+    rng = np.random.default_rng(1)
+    lons = 120.1 + rng.random(3000) * 0.1
+    lats = 30.2 + rng.random(3000) * 0.1
+    ids, dists = snapper.snap_points(lats, lons)
+
+    expected = np.argmin((node_x[None, :] - lons[:, None]) ** 2 + (node_y[None, :] - lats[:, None]) ** 2, axis=1)
+    assert np.array_equal(ids, node_ids[expected])
+    assert np.allclose(dists, haversine_distance(lats, lons, node_y[expected], node_x[expected]))
+    print("✓ 批量吸附结果与暴力搜索一致")
+
+
+def test_numpy_fallback():
+    node_ids, node_x, node_y = build_random_snapper()
+    saved = node_snapper.cKDTree
+    node_snapper.cKDTree = None
+    try:
+        fallback = NodeSnapper(node_ids, node_x, node_y)
+    finally:
+        node_snapper.cKDTree = saved
+    snapper = NodeSnapper(node_ids, node_x, node_y)
+
+    lats = np.array([30.25, 30.21, 30.29])
+    lons = np.array([120.15, 120.11, 120.19])
+    assert np.array_equal(fallback.snap_points(lats, lons)[0], snapper.snap_points(lats, lons)[0])
+
+    node_id, node_lat, node_lon = fallback.snap_point(30.25, 120.15)
+    assert node_id == snapper.snap_points(30.25, 120.15)[0][0]
+    assert node_lat == node_y[node_ids == node_id][0] and node_lon == node_x[node_ids == node_id][0]
+    print("✓ NumPy回退方案结果一致")
+
+
+if __name__ == "__main__":
+    test_snap_points_matches_brute_force()
+    test_numpy_fallback()
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+路径指标向量化选择测试（无需数据库）
+验证约束筛选、比值计算与top-k排序，内存引擎按搜索范围限定搜索，以及数据库引擎按搜索范围截取子图
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import heapq
+import math
+
+import numpy as np
+
+from routes import routeplanning
+from routes.graph_engine import ASTAR_EXCEPTION_EDGES, RoadGraph, TreeCache, preference_kind
+from routes.node_snapper import haversine_distance
+from routes.routeplanning import (JoggingPathPlanner, RouteParams, ConstraintMode, PreferenceMode,
+                                  METRIC_COLUMNS, ASTAR_FACTORS, SUBGRAPH_SCALES,
+                                  edge_jaccard, route_cache, _preference_cost_sql)
+from synthetic_network import generate_network
+from test_graph_engine import build_grid_graph
+
+
+class RowsCursor:
+    """按SQL结果行返回固定数据的游标"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+class ScalarCursor:
+    """记录执行的SQL，fetchone依次返回给定的标量"""
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+
+    def fetchone(self):
+        return (self.values.pop(0),)
+
+    def fetchall(self):
+        return []
+
+
+def edge_spans(graph) -> np.ndarray:
+    """各路段端点的坐标距离（与SQL中sqrt(power(endx - startx, 2) + power(endy - starty, 2))一致）"""
+    return np.hypot(graph.node_x[graph.edge_target] - graph.node_x[graph.edge_source],
+                    graph.node_y[graph.edge_target] - graph.node_y[graph.edge_source])
+
+
+def lowest_ratio_rows(graph, weights, count):
+    """模拟LOWEST_LENGTH_RATIO_SQL：路段长度 / 坐标距离 最低的count条路段的 (比值, startx, starty, endx, endy)"""
+    spans = edge_spans(graph)
+    edges = np.flatnonzero(spans > 0)
+    ratios = weights[edges] / spans[edges]
+    order = np.argsort(ratios, kind='stable')[:count]
+    edges = edges[order]
+    return list(zip(ratios[order], graph.node_x[graph.edge_source[edges]], graph.node_y[graph.edge_source[edges]],
+                    graph.node_x[graph.edge_target[edges]], graph.node_y[graph.edge_target[edges]]))
+
+
+class EdgeSpanCursor(ScalarCursor):
+    """按内存路网回答子图范围的换算查询（比值最低的路段与最长路段的坐标距离），其余查询无结果"""
+
+    def __init__(self, graph, weights):
+        super().__init__([])
+        self.graph = graph
+        self.weights = weights
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        self.rows = []
+        if 'ORDER BY ratio' in sql:
+            self.rows = lowest_ratio_rows(self.graph, self.weights, params[0])
+        elif 'max(sqrt(' in sql:
+            self.values = [float(edge_spans(self.graph).max())]
+
+    def fetchall(self):
+        return self.rows
+
+
+class AStarCursor:
+    """按路段SQL中的代价表达式在内存路网上求最短路径，模拟pgr_aStar返回的 (node, edge) 行"""
+
+    def __init__(self, graph, costs):
+        self.graph = graph
+        self.costs = costs      # SQL代价表达式 -> 路段代价
+        self.cost_functions = []
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if 'ORDER BY ratio' in sql:    # 子图范围的换算查询
+            self.rows = lowest_ratio_rows(self.graph, self.graph.edge_column('dis_ori'), params[0])
+            return
+        if 'pgr_aStar' not in sql:     # 启发式系数查询
+            self.rows = [(1.0,)]
+            return
+        edges, source, target = params[:3]
+        cost_function = next(expr for expr in self.costs if f", {expr} as cost," in edges)
+        self.cost_functions.append(cost_function)
+        graph = self.graph
+        tree = graph.dijkstra(graph.node_index(source), self.costs[cost_function])
+        nodes, path_edges = graph.path(tree, graph.node_index(target))
+        self.rows = list(zip(graph.node_ids[nodes].tolist(), graph.edge_ids[path_edges].tolist() + [-1]))
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+class PgrAStarCursor:
+    """
+    在内存路网上模拟数据库引擎的A*查询：启发式系数查询返回各路段 代价 / 端点坐标距离 的最小值，
+    pgr_aStar按heuristic 4（坐标欧氏距离 × 系数）搜索，节点允许重新展开，终点首次出堆即结束
+    """
+
+    def __init__(self, graph, costs):
+        self.graph = graph
+        self.costs = costs      # SQL代价表达式 -> 路段代价
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        graph = self.graph
+        if 'pgr_aStar' not in sql:     # 启发式系数查询
+            assert 'min(' in sql
+            cost = self.costs[next(expr for expr in self.costs if f"({expr}) /" in sql)]
+            span = np.hypot(graph.node_x[graph.edge_target] - graph.node_x[graph.edge_source],
+                            graph.node_y[graph.edge_target] - graph.node_y[graph.edge_source])
+            self.rows = [(float((cost[span > 0] / span[span > 0]).min()),)]
+            return
+        edges, source, target, factor = params
+        cost = self.costs[next(expr for expr in self.costs if f", {expr} as cost," in edges)]
+        nodes, path_edges = self.astar(graph.node_index(source), graph.node_index(target), cost, factor)
+        self.rows = list(zip(graph.node_ids[nodes].tolist(), graph.edge_ids[path_edges].tolist() + [-1]))
+
+    def astar(self, source, target, cost, factor):
+        graph = self.graph
+        x, y = graph.node_x, graph.node_y
+
+        def estimate(v):
+            return factor * math.hypot(x[v] - x[target], y[v] - y[target])
+
+        dist, pred = {source: 0.0}, {}
+        heap = [(estimate(source), 0.0, source)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == target:
+                break
+            for k in range(graph.indptr[u], graph.indptr[u + 1]):
+                v, e = int(graph.indices[k]), int(graph.adj_edges[k])
+                nd = d + cost[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v], pred[v] = nd, (u, e)
+                    heapq.heappush(heap, (nd + estimate(v), nd, v))
+        nodes, edges = [target], []
+        while nodes[-1] != source:
+            u, e = pred[nodes[-1]]
+            nodes.append(u)
+            edges.append(e)
+        return nodes[::-1], edges[::-1]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_vectorized_selection():
+    # (node_id, preference_total, total_std, dist_std, segments, dist_real, score)
+    rows = [
+        (1, 100.0, 90.0, 50.0, 10, 4800.0, 80.0),    # 比值2.0
+        (2, 300.0, 90.0, 100.0, 12, 5200.0, 80.0),   # 比值3.0
+        (3, 900.0, 90.0, 100.0, 12, 9000.0, 80.0),   # 超出距离约束
+        (4, None, 90.0, 100.0, 12, 5000.0, 80.0),    # 偏好评分为NULL
+        (5, 150.0, 90.0, 50.0, 12, 5100.0, 80.0),    # 比值3.0，与节点2并列
+    ]
+    planner = JoggingPathPlanner('database')
+    planner.cursor = RowsCursor(rows)
+    planner.subgraph_envelope = lambda start, end, limit: None
+    params = RouteParams(start_lat=30.0, start_lon=120.0, constraint_mode=ConstraintMode.DISTANCE_NO_END,
+                         preference_mode=PreferenceMode.COMPREHENSIVE, target_distance=5000,
+                         distance_tolerance=500, w1=1.0, w2=1.0, w3=0.0)
+
+    metrics = planner.calculate_path_metrics(10, None, [1, 2, 3, 4, 5], params)
+    assert len(metrics) == 3
+    assert np.allclose(metrics.ratio, [2.0, 3.0, 3.0])
+
+    best = metrics.best()
+    assert best['node_id'] == 2 and best['ratio'] == 3.0
+    assert set(best) >= set(METRIC_COLUMNS) | {'ratio', 'score_per_meter', 'score_per_segment'}
+    assert [m['node_id'] for m in metrics.top(2)] == [2, 5]
+    assert [m['node_id'] for m in metrics.top(10)] == [2, 5, 1]
+    print("✓ 约束筛选、比值与top-k选择正确")
+
+
+def test_distinct_alternatives():
+    rows = [
+        (1, 100.0, 90.0, 50.0, 10, 4800.0, 80.0),    # 比值2.0
+        (2, 300.0, 90.0, 100.0, 12, 5200.0, 80.0),   # 比值3.0，最优
+        (5, 150.0, 90.0, 50.0, 12, 5100.0, 80.0),    # 比值3.0，与节点2路段高度重合
+    ]
+    edges = {1: [1, 2, 3, 4], 2: [10, 11, 12, 13], 5: [10, 11, 12, 14]}
+    planner = JoggingPathPlanner('database')
+    planner.cursor = RowsCursor(rows)
+    planner.subgraph_envelope = lambda start, end, limit: None
+    planner.trace_path = lambda start, end, metric, cost_kind, limit=None: ([], edges[metric['node_id']], [])
+    params = RouteParams(start_lat=30.0, start_lon=120.0, constraint_mode=ConstraintMode.DISTANCE_NO_END,
+                         target_distance=5000, distance_tolerance=500, w1=1.0, w2=1.0, w3=0.0, k=3)
+    metrics = planner.calculate_path_metrics(10, None, [1, 2, 5], params)
+
+    assert edge_jaccard(set(edges[2]), set(edges[5])) == 0.6
+    chosen = planner.select_distinct_routes(10, None, metrics, 3, 'distance')
+    assert [metric['node_id'] for metric, _ in chosen] == [2, 5, 1]
+
+    # 重合度超过阈值的候选被跳过
+    edges[5] = [10, 11, 12, 13, 14]
+    chosen = planner.select_distinct_routes(10, None, metrics, 3, 'distance')
+    assert [metric['node_id'] for metric, _ in chosen] == [2, 1]
+    print("✓ 备选路径按路段重合度去重")
+
+
+def test_loop_mode():
+    planner = JoggingPathPlanner('memory')
+    planner.graph = build_grid_graph(6, 6)
+    planner.cursor = RowsCursor([])
+    params = RouteParams(start_lat=30.0, start_lon=120.0, constraint_mode=ConstraintMode.LOOP,
+                         target_distance=800, distance_tolerance=100, k=2)
+    columns = planner._query_loop_metrics_in_memory(8, params)
+    metrics = planner.select_metrics(columns, params)
+    assert len(metrics) and np.all((metrics.dist_real >= 700) & (metrics.dist_real <= 900))
+    assert np.all((metrics.overlap >= 0) & (metrics.overlap < 1))
+
+    chosen = planner.select_distinct_routes(8, None, metrics, 2, planner.path_cost_kind(params))
+    for metric, (nodes, edges, _) in chosen:
+        assert nodes[0] == nodes[-1] == 8
+        assert len(edges) == metric['segments']
+    print("✓ 环线候选满足距离约束并回到起点")
+
+
+def test_bounded_search_explores_route_region():
+    network = generate_network('grid', 20000, seed=4)
+    graph = network.graph
+    planner = JoggingPathPlanner('memory')
+    planner.graph, planner.snapper, planner.edge_store = graph, graph.snapper, network.edge_store
+
+    # 记录每次Dijkstra/BFS实际确定的节点数
+    explored = []
+
+    def counted(search):
+        def run(*args, **kwargs):
+            tree = search(*args, **kwargs)
+            explored.append(int(np.isfinite(tree.dist).sum()))
+            return tree
+        return run
+
+    graph.dijkstra, graph.bfs = counted(graph.dijkstra), counted(graph.bfs)
+    start, end = graph.num_nodes // 2, graph.num_nodes // 2 + 6
+    saved = route_cache.max_entries, routeplanning.get_route_archive
+    route_cache.max_entries = 0
+    routeplanning.get_route_archive = lambda: None
+    try:
+        for mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_WITH_END,
+                     ConstraintMode.DISTANCE_NO_END]:
+            params = RouteParams(start_lat=float(graph.node_y[start]), start_lon=float(graph.node_x[start]),
+                                 end_lat=float(graph.node_y[end]), end_lon=float(graph.node_x[end]),
+                                 constraint_mode=mode, preference_mode=PreferenceMode.GREEN,
+                                 target_distance=1500, distance_tolerance=200, target_segments=15,
+                                 segments_tolerance=2)
+            graph.tree_cache = TreeCache(graph.tree_cache.max_bytes)
+            explored.clear()
+            bounded = planner.plan_route(params)
+            # 约束树与偏好代价树都只搜索路线范围内的节点，与路网规模无关
+            assert len(explored) >= 2 and max(explored) < graph.num_nodes // 10, explored
+
+            graph.tree_cache = TreeCache(graph.tree_cache.max_bytes)
+            planner.search_limit = lambda params: None
+            explored.clear()
+            full = planner.plan_route(params)
+            del planner.search_limit
+            assert max(explored) == graph.num_nodes
+            assert bounded.path_nodes == full.path_nodes
+    finally:
+        route_cache.max_entries, routeplanning.get_route_archive = saved
+    print("✓ 有界搜索只探索路线范围内的节点")
+
+
+def test_subgraph_envelope():
+    graph = build_grid_graph(6, 6)
+    weights = graph.edge_column('dis_ori')
+    planner = JoggingPathPlanner('database')
+    planner.snapper = graph.snapper
+    planner.cursor = EdgeSpanCursor(graph, weights)
+
+    def inside(envelope, mask):
+        xmin, ymin, xmax, ymax = envelope
+        x, y = graph.node_x[mask], graph.node_y[mask]
+        return bool(np.all((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)))
+
+    try:
+        start, end = 0, 14
+        from_start, from_end = graph.dijkstra(start, weights).dist, graph.dijkstra(end, weights).dist
+        circle = planner.subgraph_envelope(int(graph.node_ids[start]), None, ('dis_ori', 450))
+        assert inside(circle, from_start <= 450) and not inside(circle, np.isfinite(from_start))
+        ellipse = planner.subgraph_envelope(int(graph.node_ids[start]), int(graph.node_ids[end]), ('dis_ori', 600))
+        assert inside(ellipse, from_start + from_end <= 600) and not inside(ellipse, np.isfinite(from_start))
+        hops = planner.subgraph_envelope(int(graph.node_ids[start]), None, ('segments', 3))
+        assert inside(hops, graph.bfs(start).dist <= 3)
+        assert planner.subgraph_envelope(1, None, None) is None
+
+        # 筛选查询的路段SQL只取范围内的路段
+        planner.filter_valid_nodes_by_distance(1, None, 300, 450)
+        sql, params = planner.cursor.queries[-1]
+        assert 'pgr_drivingDistance' in sql and 'geom && ST_MakeEnvelope(' in params['edges']
+    finally:
+        ASTAR_FACTORS.clear()
+        SUBGRAPH_SCALES.clear()
+    print("✓ 数据库引擎按搜索范围截取子图")
+
+
+def test_subgraph_envelope_excludes_far_edges():
+    network = generate_network('grid', 3000, seed=6)
+    graph = network.graph
+    source, target = graph.edge_source, graph.edge_target
+    spans = np.hypot(graph.node_x[target] - graph.node_x[source], graph.node_y[target] - graph.node_y[source])
+    # 少数长度远小于坐标距离的异常路段
+    weights = graph.edge_column('dis_ori').copy()
+    anomalies = np.arange(0, graph.num_edges, graph.num_edges // 5)
+    weights[anomalies] = 1.0
+    ratios = np.sort(weights / spans)
+    assert ratios[0] < ratios[ASTAR_EXCEPTION_EDGES] / 100
+
+    planner = JoggingPathPlanner('database')
+    planner.snapper = graph.snapper
+    planner.cursor = EdgeSpanCursor(graph, weights)
+    start, limit = graph.num_nodes // 2, 600.0
+    try:
+        xmin, ymin, xmax, ymax = planner.subgraph_envelope(int(graph.node_ids[start]), None, ('dis_ori', limit))
+    finally:
+        ASTAR_FACTORS.clear()
+        SUBGRAPH_SCALES.clear()
+
+    # 正常路段上limit以内可达的节点都在范围内
+    reached = graph.dijkstra(start, graph.edge_column('dis_ori')).dist <= limit
+    x, y = graph.node_x[reached], graph.node_y[reached]
+    assert np.all((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))
+    # 与范围相交的路段（与geom && envelope一致，按路段外接矩形判断）只占少数，远处路段被排除
+    intersects = ((np.minimum(graph.node_x[source], graph.node_x[target]) <= xmax) &
+                  (np.maximum(graph.node_x[source], graph.node_x[target]) >= xmin) &
+                  (np.minimum(graph.node_y[source], graph.node_y[target]) <= ymax) &
+                  (np.maximum(graph.node_y[source], graph.node_y[target]) >= ymin))
+    assert intersects.sum() < graph.num_edges / 5
+    far = haversine_distance(graph.node_y[start], graph.node_x[start], graph.node_y, graph.node_x) > 2 * limit
+    assert not intersects[far[source] & far[target]].any()
+    print("✓ 含异常路段时子图范围仍排除远处路段")
+
+
+def test_subgraph_envelope_pads_anomalous_edges():
+    grid = build_grid_graph(20, 20)
+    # 第0列的纵向路段长100米；离起点(10, 0)五个路段处的节点(15, 0)接一条长1米、横跨整行的异常路段到(15, 19)
+    start, near, far = 10 * 20, 15 * 20, 15 * 20 + 19
+    sources = np.append(grid.node_ids[grid.edge_source], grid.node_ids[near])
+    targets = np.append(grid.node_ids[grid.edge_target], grid.node_ids[far])
+    values = {name: np.append(column, 1.0) for name, column in grid.edge_values.items()}
+    graph = RoadGraph(grid.node_ids, grid.node_x, grid.node_y, np.arange(1, len(sources) + 1),
+                      sources, targets, values)
+    weights = graph.edge_column('dis_ori')
+
+    planner = JoggingPathPlanner('database')
+    planner.snapper = graph.snapper
+    planner.cursor = EdgeSpanCursor(graph, weights)
+    limit = 600.0
+
+    def inside(envelope, mask):
+        xmin, ymin, xmax, ymax = envelope
+        x, y = graph.node_x[mask], graph.node_y[mask]
+        return bool(np.all((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)))
+
+    try:
+        scale, _ = planner.subgraph_scale('dis_ori')
+        from_start, from_far = graph.dijkstra(start, weights).dist, graph.dijkstra(far, weights).dist
+        # 经异常路段可达的终点在正常路段换算的圆外
+        assert from_start[far] <= limit and graph.node_x[far] - graph.node_x[start] > limit * scale
+
+        circle = planner.subgraph_envelope(int(graph.node_ids[start]), None, ('dis_ori', limit))
+        assert inside(circle, from_start <= limit) and not inside(circle, np.isfinite(from_start))
+        ellipse = planner.subgraph_envelope(int(graph.node_ids[start]), int(graph.node_ids[far]), ('dis_ori', limit))
+        assert inside(ellipse, from_start + from_far <= limit) and not inside(ellipse, np.isfinite(from_start))
+        assert inside(ellipse, np.isin(np.arange(graph.num_nodes), [start, near, far]))
+    finally:
+        ASTAR_FACTORS.clear()
+        SUBGRAPH_SCALES.clear()
+    print("✓ 子图范围按可达异常路段的跨度扩展")
+
+
+def test_trace_path_engines_agree():
+    network = generate_network('grid', 1500, seed=7)
+    graph = network.graph
+    mode = PreferenceMode.GREEN
+    costs = {'dis_ori': graph.edge_column('dis_ori'),
+             _preference_cost_sql(mode): graph.cost_weights(preference_kind(mode.value))}
+
+    memory = JoggingPathPlanner('memory')
+    memory.graph, memory.snapper, memory.edge_store = graph, graph.snapper, network.edge_store
+    database = JoggingPathPlanner('database')
+    database.snapper = graph.snapper
+    database.cursor = AStarCursor(graph, costs)
+
+    start, end = graph.node_ids[graph.num_nodes // 2], graph.node_ids[graph.num_nodes // 2 + 40]
+    params = RouteParams(start_lat=0.0, start_lon=0.0, constraint_mode=ConstraintMode.DISTANCE_WITH_END,
+                         preference_mode=mode, target_distance=4000, distance_tolerance=1000)
+    cost_kind, limit = memory.path_cost_kind(params), memory.search_limit(params)
+    try:
+        for end_node in [int(end), None]:
+            search = graph.dual_source_search(graph.node_index(start), None if end_node is None else
+                                              graph.node_index(end_node), {'path': cost_kind})
+            # 任取一个可达的途经节点
+            reachable = np.flatnonzero(np.isfinite(search.cost('path')))
+            via = int(graph.node_ids[reachable[len(reachable) // 3]])
+            metric = {'node_id': via}
+            expected = memory.trace_path(int(start), end_node, metric, cost_kind, limit)
+            nodes, edges, coordinates = database.trace_path(int(start), end_node, metric, cost_kind, limit)
+            assert (nodes, edges) == (expected[0], expected[1]) and coordinates == expected[2]
+        assert set(database.cursor.cost_functions) == {_preference_cost_sql(mode)}
+
+        # 按dis_ori回溯会得到另一条路线
+        by_distance = database.trace_path(int(start), None, metric, 'distance', limit)
+        assert by_distance[1] != expected[1]
+    finally:
+        ASTAR_FACTORS.clear()
+        SUBGRAPH_SCALES.clear()
+    print("✓ 数据库引擎按偏好代价回溯，与内存引擎路线一致")
+
+
+def test_astar_factor_uses_minimum_ratio():
+    planner = JoggingPathPlanner('database')
+    planner.cursor = ScalarCursor([95000.0, None])
+    try:
+        assert planner.astar_factor('dis_ori') == 95000.0
+        assert planner.astar_factor('dis_ori') == 95000.0   # 每个进程只查询一次
+        sql, params = planner.cursor.queries[0]
+        # 取全部路段比值的最小值，启发式才可采纳
+        assert 'min(' in sql and 'OFFSET' not in sql and len(planner.cursor.queries) == 1
+        # 无结果时退化为Dijkstra
+        assert planner.astar_factor('1') == 1e-9
+    finally:
+        ASTAR_FACTORS.clear()
+    print("✓ 数据库引擎A*系数取比值最小值")
+
+
+def test_database_astar_matches_dijkstra_with_short_edges():
+    graph = build_grid_graph(20, 20)
+    rng = np.random.default_rng(0)
+    # 第10行的横向路段长度远小于坐标距离（异常路段），构成一条捷径
+    cost = graph.edge_column('dis_ori').copy()
+    row = np.isclose(graph.node_y[graph.edge_source], 30.01) & np.isclose(graph.node_y[graph.edge_target], 30.01)
+    cost[row] *= 0.02
+
+    planner = JoggingPathPlanner('database')
+    planner.snapper = graph.snapper
+    planner.cursor = PgrAStarCursor(graph, {'dis_ori': cost})
+    span = np.hypot(graph.node_x[graph.edge_target] - graph.node_x[graph.edge_source],
+                    graph.node_y[graph.edge_target] - graph.node_y[graph.edge_source])
+    skipped = float(np.sort(cost / span)[ASTAR_EXCEPTION_EDGES])   # 排除异常路段后的系数
+    try:
+        longer = 0
+        for source, target in rng.choice(graph.num_nodes, (60, 2)):
+            expected = graph.dijkstra(int(source), cost).dist[target]
+            nodes, edges, _ = planner.trace_path(int(graph.node_ids[source]), int(graph.node_ids[target]),
+                                                 {'node_id': -1}, 'distance')
+            assert nodes[0] == graph.node_ids[source] and nodes[-1] == graph.node_ids[target]
+            assert np.isclose(cost[np.searchsorted(graph.edge_ids, edges)].sum(), expected)
+            # 排除异常路段的系数会高估，部分路线长于最短路径
+            _, skipped_edges = planner.cursor.astar(int(source), int(target), cost, skipped)
+            longer += cost[skipped_edges].sum() > expected + 1e-6
+        assert longer > 0
+    finally:
+        ASTAR_FACTORS.clear()
+    print("✓ 含异常路段时数据库引擎A*与Dijkstra路径等长")
+
+
+if __name__ == "__main__":
+    test_vectorized_selection()
+    test_distinct_alternatives()
+    test_loop_mode()
+    test_bounded_search_explores_route_region()
+    test_subgraph_envelope()
+    test_subgraph_envelope_excludes_far_edges()
+    test_subgraph_envelope_pads_anomalous_edges()
+    test_astar_factor_uses_minimum_ratio()
+    test_database_astar_matches_dijkstra_with_short_edges()
+    test_trace_path_engines_agree()
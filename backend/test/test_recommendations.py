@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+推荐约束值测试（无需数据库）
+验证普通规划不计算推荐值、按需计算时与单独推荐接口一致，数据库引擎在筛选查询中一并聚合范围，
+以及离线推荐值表（多进程构建、保存读取、查表结果与实时搜索一致）
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import tempfile
+from dataclasses import replace
+
+import numpy as np
+
+from routes import routeplanning
+from routes.recommendation_table import RecommendationTable, load_recommendation_table, table_fingerprint
+from routes.routeplanning import JoggingPathPlanner, RouteParams, ConstraintMode, route_cache
+from synthetic_network import generate_network
+
+
+class RangeCursor:
+    """记录执行的SQL，fetchone返回固定行"""
+
+    def __init__(self, row):
+        self.row = row
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+
+    def fetchone(self):
+        return self.row
+
+
+def memory_planner(network):
+    planner = JoggingPathPlanner('memory')
+    planner.graph, planner.snapper, planner.edge_store = network.graph, network.graph.snapper, network.edge_store
+    return planner
+
+
+def test_recommend_on_demand():
+    saved = route_cache.max_entries, routeplanning.get_route_archive
+    route_cache.max_entries = 0
+    routeplanning.get_route_archive = lambda: None
+    try:
+        network = generate_network('grid', 400, seed=4)
+        graph = network.graph
+        planner = memory_planner(network)
+        for mode in [ConstraintMode.DISTANCE_WITH_END, ConstraintMode.SEGMENTS_NO_END]:
+            params = RouteParams(start_lat=float(graph.node_y[0]), start_lon=float(graph.node_x[0]),
+                                 end_lat=float(graph.node_y[-1]), end_lon=float(graph.node_x[-1]),
+                                 constraint_mode=mode, target_distance=3000, distance_tolerance=1500,
+                                 target_segments=12, segments_tolerance=6)
+            plain = planner.plan_route(params)
+            assert plain.recommended_distances is None and plain.recommended_segments is None
+            assert 'dynamic_constraints' not in [span['stage'] for span in plain.timings['spans']]
+
+            recommended = planner.plan_route(replace(params, recommend=True))
+            assert recommended.path_nodes == plain.path_nodes
+            info = planner.recommend_constraints(params)
+            if info['type'] == 'distance':
+                assert recommended.recommended_distances == info['recommended_values']
+                assert recommended.distance_range == (info['min_value'], info['max_value'])
+            else:
+                assert recommended.recommended_segments == info['recommended_values']
+                assert recommended.segments_range == (info['min_value'], info['max_value'])
+    finally:
+        route_cache.max_entries, routeplanning.get_route_archive = saved
+    print("✓ 推荐值只在请求时计算，与推荐接口结果一致")
+
+
+def test_database_range_in_filter_query():
+    planner = JoggingPathPlanner('database')
+    planner.cursor = RangeCursor(([3, 5], 1200.0, 8800.0))
+    valid_nodes, info = planner.filter_valid_nodes(1, 2, ConstraintMode.DISTANCE_WITH_END, 4000, 6000,
+                                                   with_range=True)
+    assert valid_nodes == [3, 5] and len(planner.cursor.queries) == 1
+    assert (info['min_value'], info['max_value']) == (1200.0, 8800.0) and info['recommended_values'][0] == 1500
+
+    planner.cursor = RangeCursor((None, None, None))
+    assert planner.filter_valid_nodes(1, None, ConstraintMode.SEGMENTS_NO_END, 10, 20, with_range=True) == ([], None)
+    print("✓ 数据库引擎在筛选查询中一并聚合约束范围")
+
+
+def test_recommendation_table():
+    network = generate_network('rgg', 600, seed=5)
+    graph = network.graph
+    table = RecommendationTable.build(graph, processes=1, chunk_size=50)
+    assert table.num_nodes == graph.num_nodes
+    parallel = RecommendationTable.build(graph, graph.node_ids[::7], processes=2, chunk_size=10)
+    assert parallel.num_nodes == len(graph.node_ids[::7])
+    for name in ['distance_min', 'distance_max', 'segments_min', 'segments_max']:
+        assert np.array_equal(getattr(parallel, name), getattr(table, name)[::7], equal_nan=True)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'recommendations.npz')
+        table.save(path)
+        loaded = load_recommendation_table(path, table_fingerprint(graph))
+        assert loaded is not None and np.array_equal(loaded.distance_max, table.distance_max, equal_nan=True)
+        assert load_recommendation_table(path, 'stale') is None
+
+    # 查表结果与实时搜索一致
+    planner = memory_planner(network)
+    live = {}
+    for node in table.node_ids[table.segments_min >= 0][:20:4].tolist():
+        params = RouteParams(start_lat=float(graph.node_y[graph.node_index(node)]),
+                             start_lon=float(graph.node_x[graph.node_index(node)]))
+        for mode in [ConstraintMode.DISTANCE_NO_END, ConstraintMode.SEGMENTS_NO_END]:
+            live[node, mode] = planner.recommend_constraints(replace(params, constraint_mode=mode))
+    graph._recommendation_table, graph._recommendation_table_loaded = table, True
+    for (node, mode), expected in live.items():
+        params = RouteParams(start_lat=float(graph.node_y[graph.node_index(node)]),
+                             start_lon=float(graph.node_x[graph.node_index(node)]), constraint_mode=mode)
+        info = planner.recommend_constraints(params)
+        assert info['precomputed'] and not expected['precomputed']
+        assert info == dict(expected, precomputed=True)
+    print("✓ 推荐值表多进程构建、保存读取，查表结果与实时搜索一致")
+
+
+if __name__ == "__main__":
+    test_recommend_on_demand()
+    test_database_range_in_filter_query()
+    test_recommendation_table()
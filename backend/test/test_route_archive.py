@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+GeoJSON异步归档测试（无需数据库）
+验证后台写入与按文件数清理
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import tempfile
+
+from routes.route_archive import RouteArchive
+
+
+def test_archive_write_and_retention():
+    with tempfile.TemporaryDirectory() as folder:
+        archive = RouteArchive(folder, max_files=3, max_age_hours=24)
+        geojson = {'type': 'FeatureCollection', 'features': [], 'properties': {'name': '测试'}}
+
+        paths = [archive.submit(f'route_{i}_to_auto.json', geojson) for i in range(5)]
+        archive.flush(timeout=5)
+
+        remaining = sorted(name for name in os.listdir(folder) if name.startswith('route_'))
+        assert remaining == ['route_2_to_auto.json', 'route_3_to_auto.json', 'route_4_to_auto.json']
+        with open(paths[-1], 'r', encoding='utf-8') as f:
+            assert json.load(f) == geojson
+        print("✓ GeoJSON异步归档与清理正常")
+
+
+if __name__ == "__main__":
+    test_archive_write_and_retention()
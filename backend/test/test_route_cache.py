@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+路径结果缓存测试（无需数据库）
+验证LRU淘汰、有效期与命中统计
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+
+from routes.route_cache import RouteCache
+
+
+def test_lru_eviction():
+    cache = RouteCache(max_entries=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1          # a变为最近使用
+    cache.put('c', 3)                   # 淘汰b
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    stats = cache.stats()
+    assert stats['hits'] == 3 and stats['misses'] == 1 and stats['evictions'] == 1
+    assert stats['size'] == 2
+    print("✓ LRU淘汰与命中统计正确")
+
+
+def test_ttl_and_clear():
+    cache = RouteCache(max_entries=10, ttl=0.05)
+    cache.put('a', 1)
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+    cache.ttl = 60
+    cache.put('b', 2)
+    cache.clear()
+    assert cache.get('b') is None and cache.stats()['invalidations'] == 1
+    print("✓ 有效期与清空正确")
+
+
+def test_disabled_cache():
+    cache = RouteCache(max_entries=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    print("✓ 容量为0时不缓存")
+
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_ttl_and_clear()
+    test_disabled_cache()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+分阶段计时测试（无需数据库）
+验证阶段嵌套、SQL耗时与行数记录、Prometheus文本输出，以及plan_route返回的timings
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from routes import routeplanning
+from routes.route_metrics import RouteMetrics, StageTimer, TimedCursor
+from routes.routeplanning import JoggingPathPlanner, RouteParams, ConstraintMode, PreferenceMode, route_cache
+from synthetic_network import generate_network
+
+
+class RowsCursor:
+    """返回固定行的游标"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+def test_nested_spans():
+    timer = StageTimer()
+    cursor = TimedCursor(RowsCursor([(1,), (2,), (3,)]), lambda: timer)
+    with timer.span('filter_valid_nodes') as span:
+        cursor.execute("SELECT 1")
+        span['valid_nodes'] = len(cursor.fetchall())
+    cursor.execute("SELECT 2")
+    cursor.fetchone()
+    assert cursor.closed is False   # 其他属性直接访问原游标
+
+    spans = timer.to_dict()['spans']
+    assert [span['stage'] for span in spans] == ['filter_valid_nodes', 'sql', 'sql']
+    assert spans[0]['valid_nodes'] == 3
+    assert spans[1]['parent'] == 'filter_valid_nodes' and spans[1]['rows'] == 3
+    assert 'parent' not in spans[2] and spans[2]['rows'] == 1
+    assert spans[0]['ms'] >= spans[1]['ms'] >= 0
+
+    # 未在规划中时不记录
+    untimed = TimedCursor(RowsCursor([(1,)]), lambda: None)
+    untimed.execute("SELECT 1")
+    assert untimed.fetchall() == [(1,)]
+    print("✓ 阶段嵌套，SQL记录耗时与行数")
+
+
+def test_render():
+    metrics = RouteMetrics()
+    timer = StageTimer()
+    with timer.span('path_metrics'):
+        with timer.span('sql') as span:
+            span['rows'] = 42
+    with timer.span('filter_valid_nodes') as span:
+        span['valid_nodes'] = 7
+    metrics.observe(timer, 'database', 'DISTANCE_WITH_END', 'ok')
+    text = metrics.render({'route_planning_cache_entries': ('结果缓存条目数', 3)})
+
+    assert '# TYPE route_planning_request_seconds histogram' in text
+    assert 'route_planning_request_seconds_count{engine="database",constraint_mode="DISTANCE_WITH_END",status="ok"} 1' in text
+    assert 'route_planning_sql_rows_bucket{stage="path_metrics",le="100"} 1' in text
+    assert 'route_planning_sql_rows_bucket{stage="path_metrics",le="10"} 0' in text
+    assert 'route_planning_stage_seconds_count{stage="filter_valid_nodes"} 1' in text
+    assert 'route_planning_valid_nodes_sum{constraint_mode="DISTANCE_WITH_END"} 7' in text
+    assert 'route_planning_cache_entries 3' in text
+    print("✓ Prometheus文本格式输出")
+
+
+def test_plan_route_timings():
+    saved = route_cache.max_entries, routeplanning.get_route_archive
+    route_cache.max_entries = 0
+    routeplanning.get_route_archive = lambda: None
+    try:
+        network = generate_network('grid', 200, seed=3)
+        graph = network.graph
+        planner = JoggingPathPlanner('memory')
+        planner.graph, planner.snapper, planner.edge_store = graph, graph.snapper, network.edge_store
+        params = RouteParams(start_lat=float(graph.node_y[0]), start_lon=float(graph.node_x[0]),
+                             end_lat=float(graph.node_y[-1]), end_lon=float(graph.node_x[-1]),
+                             constraint_mode=ConstraintMode.SHORTEST_PATH,
+                             preference_mode=PreferenceMode.COMPREHENSIVE)
+        result = planner.plan_route(params)
+    finally:
+        route_cache.max_entries, routeplanning.get_route_archive = saved
+
+    stages = [span['stage'] for span in result.timings['spans']]
+    for stage in ['snap', 'cache_lookup', 'shortest_path', 'trace_path', 'edge_details', 'geojson']:
+        assert stage in stages, stage
+    assert result.timings['total_ms'] >= sum(span['ms'] for span in result.timings['spans']
+                                             if 'parent' not in span)
+    assert planner.timer is None
+    assert routeplanning.route_result_to_dict(result)['timings'] == result.timings
+    print("✓ plan_route返回各阶段耗时")
+
+
+if __name__ == "__main__":
+    test_nested_spans()
+    test_render()
+    test_plan_route_timings()
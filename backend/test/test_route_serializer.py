@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+接口JSON序列化测试（无需数据库）
+验证各序列化后端结果一致、NumPy类型直接序列化，以及坐标截断
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+
+import numpy as np
+
+from routes.route_serializer import SERIALIZERS, get_serializer, round_coordinates, round_geometry
+
+
+def test_backends_agree():
+    payload = {
+        'path_nodes': np.array([3, 1, 2], dtype=np.int64),
+        'total_distance': np.float64(1234.5),
+        'segments': np.int32(7),
+        'geojson': {'coordinates': np.array([[120.1234567, 30.7654321]]), 'name': '滨水路线'},
+        'edge_details': {'score': [1.5, None]}
+    }
+    expected = {
+        'path_nodes': [3, 1, 2],
+        'total_distance': 1234.5,
+        'segments': 7,
+        'geojson': {'coordinates': [[120.1234567, 30.7654321]], 'name': '滨水路线'},
+        'edge_details': {'score': [1.5, None]}
+    }
+    for backend in list(SERIALIZERS) + ['auto']:
+        assert json.loads(get_serializer(backend)(payload)) == expected, backend
+    try:
+        get_serializer('pickle')
+        assert False, "未知后端应报错"
+    except ValueError:
+        pass
+    print(f"✓ 序列化后端 {'、'.join(SERIALIZERS)} 结果一致")
+
+
+def test_non_finite_values_become_null():
+    payload = {
+        'optimization_ratio': float('nan'),
+        'bounds': (float('-inf'), 1.0),
+        'scores': np.array([1.5, np.inf, np.nan]),
+        'score_per_meter': np.float32('nan'),
+        'edge_details': [{'slope': float('inf')}]
+    }
+    outputs = {backend: get_serializer(backend)(payload) for backend in SERIALIZERS}
+    assert len(set(outputs.values())) == 1, outputs
+    for backend, output in outputs.items():
+        assert b'NaN' not in output and b'Infinity' not in output, backend
+        assert json.loads(output) == {'optimization_ratio': None, 'bounds': [None, 1.0], 'scores': [1.5, None, None],
+                                      'score_per_meter': None, 'edge_details': [{'slope': None}]}, backend
+    print("✓ 非有限值在各序列化后端中均输出为null")
+
+
+def test_round_coordinates():
+    assert round_coordinates([(120.12345678, 30.98765432)], None) == [(120.12345678, 30.98765432)]
+    assert round_coordinates([(120.12345678, 30.98765432)], 6) == [[120.123457, 30.987654]]
+    assert round_coordinates([120.12345678, 30.98765432], 3) == [120.123, 30.988]
+
+    multi = {'type': 'MultiLineString', 'coordinates': [[[1.23456, 2.0], [3.0, 4.0]], [[5.55555, 6.0]]]}
+    rounded = round_geometry(multi, 2)
+    assert rounded['coordinates'] == [[[1.23, 2.0], [3.0, 4.0]], [[5.56, 6.0]]]
+    assert multi['coordinates'][0][0][0] == 1.23456   # 不修改原几何
+    print("✓ 坐标按小数位数截断")
+
+
+if __name__ == "__main__":
+    test_backends_agree()
+    test_non_finite_values_become_null()
+    test_round_coordinates()